@@ -1,19 +1,139 @@
 import base64
+import math
 import streamlit as st
 import pandas as pd
 import os
-
-
-def scan_directory(path):
-    from parse_files import parse_files
-    from results_builder import build_summary_df_from_results
-
-    is_directory = os.path.isdir(path)
-    if not is_directory:
-        return (False, False)
-    results = parse_files(path)
-    df_summary = build_summary_df_from_results(results)
-    return (results, df_summary)
+import time
+
+from pii_scores import get_pii_count, get_pii_values
+
+CACHE_PATH = '.pii_detector_cache.sqlite'
+
+# choices of files shown per page of detailed results
+PAGE_SIZES = [10, 25, 50, 100]
+
+# seconds between refreshes of progress and summary while a scan runs
+REFRESH_SECONDS = 1.0
+
+
+# the scan runs in a thread kept in the session, so widget clicks rerun
+# the script without rescanning, or hashing results, while it goes on.
+# The on-disk cache makes rescanning the same folder later cheap
+def get_scan(path, restart=False):
+    """
+    Returns background scan of path for this session, starting one if
+    no scan of path was started yet
+
+    Args:
+        path (str): folder path
+        restart (bool): start a new scan even if path was scanned
+
+    Returns:
+        BackgroundScan:
+    """
+    from background_scan import BackgroundScan
+
+    scan = st.session_state.get('scan')
+    if scan is not None and scan.path == path and not restart:
+        return scan
+    if scan is not None:
+        scan.stop()
+        # files already handed to the scan are finished first
+        with st.spinner('Stopping previous scan...'):
+            scan.join()
+    scan = BackgroundScan(path, cache_path=CACHE_PATH)
+    scan.start()
+    st.session_state['scan'] = scan
+    return scan
+
+
+def format_progress(progress):
+    if progress['waiting']:
+        return 'Waiting for another scan to finish...'
+    if progress['total'] is None:
+        return 'Listing files...'
+    return (f'Checked {progress["checked"]} of {progress["total"]} files, '
+            f'scanned {progress["scanned"]} in {progress["seconds"]:.0f}s '
+            f'({progress["files_per_second"]:.1f} files/s)')
+
+
+def get_display_df(df_summary):
+    # convert filepath in df_summary to file name so it can be displayed
+    df = df_summary.copy(deep=True)
+    if len(df) > 0:
+        df.insert(0, 'filename', df['filepath'].apply(os.path.basename))
+        df.drop(['filepath'], axis=1, inplace=True)
+    return df
+
+
+def show_file_details(filepath, result, pii_score):
+    """
+    Writes detailed results of a file, found values are only
+    written once their checkbox is ticked
+
+    Args:
+        filepath (str):
+        result (dict):
+        pii_score (float): None if unknown
+    """
+    st.subheader(os.path.basename(filepath))
+
+    # summary of file
+    st.write(f'**Path**: {filepath}')
+    if pii_score is not None:
+        st.write(f'**PII Score**: {pii_score:2f}')
+
+    metadata = result['metadata']
+    st.write(f'**Size**: {metadata["size_bytes"]} bytes')
+    st.write(f'**User**: {metadata["owner"]}')
+    st.write(f'**Group**: {metadata["group"]}')
+
+    pii = result['pii']
+
+    if 'pdf_pages' in pii:
+        pdf_pages = pii['pdf_pages']
+        if pdf_pages['truncated']:
+            st.write(
+                f'**Pages**: scanned {pdf_pages["pages_scanned"]} of {pdf_pages["page_count"]}')
+        if len(pdf_pages['needs_ocr']) > 0:
+            st.warning(
+                f'Pages without text, need OCR: {pdf_pages["needs_ocr"]}')
+
+    if 'pii_analyzer' in pii:
+        piianalyzer_pii = pii['pii_analyzer']
+        if st.checkbox('Show PIIAnalyzer Results', key=f'{filepath}_piianalyzer'):
+            for pii_type in piianalyzer_pii:
+                values = get_pii_values(piianalyzer_pii[pii_type])
+                count = get_pii_count(piianalyzer_pii[pii_type])
+                if count > 0:
+                    st.write(
+                        f'#### PIIAnalyzer {pii_type} Results ({count}):')
+                    st.write(values)
+
+    if 'pii_catcher' in pii:
+        piicatcher_pii = pii['pii_catcher']
+        if st.checkbox('Show PIICatcher Results', key=f'{filepath}_piicatcher'):
+            for pii_type in piicatcher_pii:
+                value_count = piicatcher_pii[pii_type]
+                if value_count > 0:
+                    st.write(
+                        f'PIICatcher {pii_type} count: {value_count}')
+
+    if 'presidio' in pii:
+        presidio_pii = pii['presidio']
+        if st.checkbox('Show Presidio Results', key=f'{filepath}_presidio'):
+            for pii_type in presidio_pii:
+                if pii_type == 'df_pii':
+                    # handle presidio df
+                    if st.checkbox('Show dataframe with PII filled in', key=f'{filepath}_presidio_df_pii'):
+                        st.dataframe(presidio_pii[pii_type])
+                else:
+                    values = presidio_pii[pii_type]['values']
+                    count = presidio_pii[pii_type]['count']
+                    if count > 0:
+                        st.write(
+                            f'#### Presidio {pii_type} Results ({count}):')
+                        st.write(values)
 
 
 def get_html_for_dataframe(df, filename, label):
@@ -30,15 +150,13 @@ folder_path = st.text_input('Folder path to scan for PII')
 st.image('images/app_header.jpg')
 
 if folder_path:
-    results, df_summary = scan_directory(folder_path)
+    if os.path.isdir(folder_path):
+        rescan = st.button('Rescan folder')
+        scan = get_scan(folder_path, restart=rescan)
+        was_running = not scan.done
 
-    if results:
-        st.success(f'Folder {folder_path} was successfully scanned!')
-
-        # convert filepath in df_summary to file name so it can be displayed
-        df = df_summary.copy(deep=True)
-        df.insert(0, 'filename', df['filepath'].apply(os.path.basename))
-        df.drop(['filepath'], axis=1, inplace=True)
+        progress_bar = st.progress(0)
+        progress_text = st.empty()
 
         # show summary
         st.header('Results Summary')
@@ -51,68 +169,65 @@ if folder_path:
             'Colums starting with **pc_** indicate that the pii was detected by the **PIICatcher** detector')
         st.write(
             'Colums starting with **pa_** indicate that the pii was detected by the **PIIAnalyzer** detector')
-
-        st.dataframe(df)
-        st.markdown(
-            get_html_for_dataframe(
-                df, 'results.csv', 'Download summary in csv format'),
-            unsafe_allow_html=True
-        )
-
+        summary_table = st.empty()
+        download_link = st.empty()
+
+        def show_progress():
+            """
+            Updates progress and summary of the scan
+
+            Returns:
+                pd.DataFrame: summary of files scanned so far
+            """
+            progress = scan.get_progress()
+            if progress['total']:
+                progress_bar.progress(progress['checked'] / progress['total'])
+            elif scan.done:
+                progress_bar.progress(1.0)
+            progress_text.write(format_progress(progress))
+
+            df_summary = scan.get_summary_df()
+            df = get_display_df(df_summary)
+            summary_table.dataframe(df)
+            download_link.markdown(
+                get_html_for_dataframe(
+                    df, 'results.csv', 'Download summary in csv format'),
+                unsafe_allow_html=True
+            )
+            return df_summary
+
+        df_summary = show_progress()
+        if scan.error is not None:
+            st.error(f'Error while scanning {folder_path}: {scan.error}')
+        elif scan.done:
+            st.success(f'Folder {folder_path} was successfully scanned!')
+
+        # details of files scanned so far, one page at a time
         st.header('Detailed Results')
-        for filepath in results:
-            filename = os.path.basename(filepath)
-            st.subheader(filename)
-
-            # summary of file
-            st.write(f'**Path**: {filepath}')
-
-            pii_score_list = df.loc[df['filename']
-                                    == filename]['pii_score'].tolist()
-            if len(pii_score_list) > 0:
-                st.write(f'**PII Score**: {pii_score_list[0]:2f}')
-
-            metadata = results[filepath]['metadata']
-            st.write(f'**Size**: {metadata["size_bytes"]} bytes')
-            st.write(f'**User**: {metadata["owner"]}')
-            st.write(f'**Group**: {metadata["group"]}')
-
-            pii = results[filepath]['pii']
-
-            if 'pii_analyzer' in pii:
-                piianalyzer_pii = pii['pii_analyzer']
-                if st.checkbox('Show PIIAnalyzer Results', key=f'{filepath}_piianalyzer'):
-                    for pii_type in piianalyzer_pii:
-                        values = piianalyzer_pii[pii_type]
-                        count = len(values)
-                        if count > 0:
-                            st.write(
-                                f'#### PIIAnalyzer {pii_type} Results ({count}):')
-                            st.write(values)
-
-            if 'pii_catcher' in pii:
-                piicatcher_pii = pii['pii_catcher']
-                if st.checkbox('Show PIICatcher Results', key=f'{filepath}_piicatcher'):
-                    for pii_type in piicatcher_pii:
-                        value_count = piicatcher_pii[pii_type]
-                        if value_count > 0:
-                            st.write(
-                                f'PIICatcher {pii_type} count: {value_count}')
-
-            if 'presidio' in pii:
-                presidio_pii = pii['presidio']
-                if st.checkbox('Show Presidio Results', key=f'{filepath}_presidio'):
-                    for pii_type in presidio_pii:
-                        if pii_type == 'df_pii':
-                            # handle presidio df
-                            if st.checkbox('Show dataframe with PII filled in', key=f'{filepath}_presidio_df_pii'):
-                                st.dataframe(presidio_pii[pii_type])
-                        else:
-                            values = presidio_pii[pii_type]['values']
-                            count = len(values)
-                            if count > 0:
-                                st.write(
-                                    f'#### Presidio {pii_type} Results ({count}):')
-                                st.write(values)
+        results = scan.get_results()
+        pii_scores = {}
+        if len(df_summary) > 0:
+            pii_scores = dict(zip(df_summary['filepath'], df_summary['pii_score']))
+        filepaths = list(results)
+        only_pii = st.checkbox('Only show files with PII', key=f'{id(scan)}_only_pii')
+        if only_pii:
+            filepaths = [filepath for filepath in filepaths if pii_scores.get(filepath, 0) > 0]
+
+        page_size = st.selectbox('Files per page', PAGE_SIZES)
+        page_count = max(1, math.ceil(len(filepaths) / page_size))
+        # keyed by scan and filter so a new scan or filter starts at the first page
+        page = st.number_input(
+            f'Page (of {page_count})', min_value=1, max_value=page_count, value=1, step=1,
+            key=f'{id(scan)}_{only_pii}_page')
+        for filepath in filepaths[(page - 1) * page_size:page * page_size]:
+            show_file_details(filepath, results[filepath], pii_scores.get(filepath))
+
+        # widget clicks interrupt this loop and rerun the script
+        while not scan.done:
+            time.sleep(REFRESH_SECONDS)
+            show_progress()
+        if was_running:
+            # render details of every file
+            st.experimental_rerun()
     else:
         st.error(f'Error: {folder_path} does not exist!')
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pandas as pd
+
+from parse_files import iter_parse_filepaths, list_filepaths
+from result_cache import ResultCache
+from results_builder import build_summary_df_from_results, build_summary_row
+
+# parsers and detectors are shared by the whole process and aren't
+# thread safe, so scans of every session run one at a time
+scan_lock = threading.Lock()
+
+
+class BackgroundScan(threading.Thread):
+    """
+    Scans a folder in a thread so a UI can keep rendering: results and
+    summary rows are added as soon as each file is done, and progress
+    can be read at any time from another thread.
+
+    The result cache is opened in the thread since sqlite connections
+    can't be shared between threads. Scans started while another one
+    runs wait for it to finish, see scan_lock.
+    """
+
+    def __init__(self, path, cache_path=None, workers=1):
+        super().__init__(daemon=True)
+        self.path = path
+        self.cache_path = cache_path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        # True until scan_lock is acquired
+        self.waiting = True
+        # filepath -> results, see parse_files
+        self.results = {}
+        # summary row of each scanned file, see build_summary_row
+        self.rows = []
+        # number of files in folder, None until the folder is listed
+        self.total = None
+        # files handed to the scan so far, including skipped files
+        self.checked = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.error = None
+        self._summary_df = None
+
+    def iter_checked(self, filepaths):
+        """
+        Yields filepaths, counting them, until the scan is stopped
+
+        Args:
+            filepaths (List[str]):
+
+        Yields:
+            Generator[str, None, None]:
+        """
+        for filepath in filepaths:
+            if self.stopped.is_set():
+                return
+            self.checked += 1
+            yield filepath
+
+    def run(self):
+        with scan_lock:
+            self.waiting = False
+            # time spent waiting isn't part of the scan
+            self.started_at = time.monotonic()
+            if not self.stopped.is_set():
+                self.scan()
+            self.finished_at = time.monotonic()
+
+    def scan(self):
+        cache = None
+        try:
+            filepaths = list(list_filepaths(self.path))
+            self.total = len(filepaths)
+            if self.cache_path is not None:
+                cache = ResultCache(self.cache_path)
+            for filepath, result in iter_parse_filepaths(
+                    self.iter_checked(filepaths), workers=self.workers, cache=cache):
+                row = build_summary_row(filepath, result)
+                with self.lock:
+                    self.results[filepath] = result
+                    self.rows.append(row)
+        except Exception as e:
+            print(f'Error while scanning {self.path}: {e}')
+            self.error = str(e)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def stop(self):
+        self.stopped.set()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def get_progress(self):
+        """
+        Returns progress of the scan
+
+        Returns:
+            dict: whether the scan waits for another one, total and
+            checked files (total is None while listing the folder),
+            scanned files, seconds since start and scanned files per second
+        """
+        seconds = (self.finished_at or time.monotonic()) - self.started_at
+        scanned = len(self.rows)
+        return {
+            'waiting': self.waiting,
+            'total': self.total,
+            'checked': self.checked,
+            'scanned': scanned,
+            'seconds': seconds,
+            'files_per_second': scanned / seconds if seconds > 0 else 0.0,
+        }
+
+    def get_results(self):
+        """
+        Returns copy of results of files scanned so far
+
+        Returns:
+            dict: filepath -> results
+        """
+        with self.lock:
+            return dict(self.results)
+
+    def get_summary_df(self):
+        """
+        Returns summary of files scanned so far. Once the scan is done the
+        summary is built once, with every column, and kept
+
+        Returns:
+            pd.DataFrame:
+        """
+        if self.done:
+            if self._summary_df is None:
+                self._summary_df = build_summary_df_from_results(self.results)
+            return self._summary_df
+
+        with self.lock:
+            rows = list(self.rows)
+        df = pd.DataFrame(rows)
+        # counts of pii only found in some files
+        df.fillna(0, inplace=True)
+        return df
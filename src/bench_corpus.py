@@ -0,0 +1,474 @@
+# Generates a synthetic corpus of files holding seeded fake pii, laid out
+# like sample_data: nested folders of txt, csv, xlsx, pdf and image files.
+# The same seed always generates the same corpus, and <folder>.manifest.json
+# lists the pii seeded in every file. It is written next to the corpus
+# folder so it isn't scanned with it.
+#
+# Run from the project root:
+#   python src/bench_corpus.py bench_data --files 200 --mix txt=4,csv=2,xlsx=1,pdf=2,image=1
+
+import argparse
+import json
+import os
+import pathlib
+import random
+
+import pandas as pd
+
+first_names = [
+    'Helen', 'James', 'Maria', 'Robert', 'Linda', 'Michael', 'Patricia', 'David',
+    'Jennifer', 'William', 'Elizabeth', 'Richard', 'Susan', 'Joseph', 'Jessica',
+    'Thomas', 'Sarah', 'Charles', 'Karen', 'Daniel', 'Nancy', 'Matthew', 'Lisa',
+]
+
+last_names = [
+    'Therres', 'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller',
+    'Davis', 'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson',
+    'Anderson', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Thompson', 'White',
+]
+
+streets = [
+    'Main Street', 'Oak Avenue', 'Maple Road', 'Cedar Drive', 'Pine Court',
+    'Elm Street', 'Washington Avenue', 'Lake Road', 'Hill Drive', 'Park Avenue',
+]
+
+cities = [
+    ('Baltimore', 'MD'), ('Boston', 'MA'), ('Chicago', 'IL'), ('Denver', 'CO'),
+    ('Houston', 'TX'), ('Newark', 'NJ'), ('Phoenix', 'AZ'), ('Seattle', 'WA'),
+]
+
+email_domains = ['example.com', 'mail.com', 'company.org', 'school.edu']
+
+# sentences without pii, mixed with pii so detectors see realistic text
+filler_sentences = [
+    'The quarterly report was reviewed by the committee.',
+    'Please find the attached documents for your records.',
+    'The meeting has been moved to the second floor conference room.',
+    'All invoices must be submitted before the end of the month.',
+    'Thank you for your patience while we process your request.',
+    'The project timeline was updated to reflect the new scope.',
+    'Our office will be closed for the holiday next week.',
+    'The inventory count matched the numbers in the system.',
+]
+
+# pii seeded by each kind of value, see fake_person
+value_pii_types = {
+    'name': 'PERSON',
+    'email': 'EMAIL_ADDRESS',
+    'phone': 'PHONE_NUMBER',
+    'ssn': 'US_SSN',
+    'credit_card': 'CREDIT_CARD',
+    'address': 'ADDRESS',
+    'ip': 'IP_ADDRESS',
+}
+
+file_kinds = ['txt', 'csv', 'xlsx', 'pdf', 'image']
+
+
+def luhn_complete(digits):
+    """
+    Appends the Luhn check digit to digits
+
+    Args:
+        digits (str):
+
+    Returns:
+        str:
+    """
+    checksum = 0
+    for index, digit in enumerate(reversed(digits)):
+        digit = int(digit)
+        if index % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        checksum += digit
+    return digits + str((10 - checksum % 10) % 10)
+
+
+def fake_person(rng):
+    """
+    Returns fake pii of a person
+
+    Args:
+        rng (random.Random):
+
+    Returns:
+        dict:
+    """
+    first_name = rng.choice(first_names)
+    last_name = rng.choice(last_names)
+    city, state = rng.choice(cities)
+    card = luhn_complete('4' + ''.join([str(rng.randint(0, 9)) for _ in range(14)]))
+    return {
+        'first_name': first_name,
+        'last_name': last_name,
+        'name': f'{first_name} {last_name}',
+        'email': f'{first_name.lower()}.{last_name.lower()}{rng.randint(1, 99)}@{rng.choice(email_domains)}',
+        'phone': f'{rng.randint(201, 989)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}',
+        'ssn': f'{rng.randint(100, 665)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}',
+        'dob': f'{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(1940, 2005)}',
+        'credit_card': ' '.join([card[i:i + 4] for i in range(0, 16, 4)]),
+        'address': f'{rng.randint(1, 9999)} {rng.choice(streets)}',
+        'city': city,
+        'state': state,
+        'zip': f'{rng.randint(10000, 99999)}',
+        'ip': f'{rng.randint(11, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+    }
+
+
+def fake_lines(rng, count, pii_density):
+    """
+    Returns lines of text, each holding a pii with probability pii_density
+
+    Args:
+        rng (random.Random):
+        count (int): number of lines
+        pii_density (float): 0 to 1
+
+    Returns:
+        Tuple[List[str], dict]: lines and pii type -> number seeded
+    """
+    lines = []
+    seeded = {}
+    for _ in range(count):
+        line = rng.choice(filler_sentences)
+        if rng.random() < pii_density:
+            person = fake_person(rng)
+            kind = rng.choice(list(value_pii_types))
+            line = f'{line} Contact {kind.replace("_", " ")}: {person[kind]}.'
+            pii_type = value_pii_types[kind]
+            seeded[pii_type] = seeded.get(pii_type, 0) + 1
+        lines.append(line)
+    return lines, seeded
+
+
+def fake_records_df(rng, rows):
+    """
+    Returns dataframe of people laid out like sample_data/dir_1/dir_2/PII_df.csv
+
+    Args:
+        rng (random.Random):
+        rows (int):
+
+    Returns:
+        Tuple[pd.DataFrame, dict]: dataframe and pii type -> number seeded
+    """
+    records = []
+    for index in range(rows):
+        person = fake_person(rng)
+        records.append({
+            'ID': index + 1,
+            'CREATED_BY': 'gladmin',
+            'USERNAME': f'{person["first_name"][0]}{person["last_name"]}'.upper(),
+            'FIRST_NAME': person['first_name'],
+            'LAST_NAME': person['last_name'],
+            'phone numbers': person['phone'],
+            'Social Security number': person['ssn'],
+            'DOB': person['dob'],
+            'email': person['email'],
+            'address': person['address'],
+            'city': person['city'],
+            'state': person['state'],
+            'zip': person['zip'],
+        })
+    seeded = {
+        'PERSON': rows * 2,
+        'PHONE_NUMBER': rows,
+        'US_SSN': rows,
+        'DATE_TIME': rows,
+        'EMAIL_ADDRESS': rows,
+        'ADDRESS': rows,
+        'LOCATION': rows,
+    }
+    return pd.DataFrame(records), seeded
+
+
+def escape_pdf_text(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(pages):
+    """
+    Builds a minimal pdf with one Helvetica text line per line of each page,
+    so no pdf library is needed
+
+    Args:
+        pages (List[List[str]]): lines of each page
+
+    Returns:
+        bytes:
+    """
+    # 1 is the catalog, 2 the page tree and 3 the font
+    objects = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        stream = 'BT /F1 10 Tf 13 TL 40 800 Td ' + ''.join(
+            [f'({escape_pdf_text(line)}) Tj T* ' for line in lines]) + 'ET'
+        stream = stream.encode('latin-1', errors='replace')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        content_id = len(objects)
+        objects.append((
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode())
+        kids.append(len(objects))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = (
+        f'<< /Type /Pages /Kids [{" ".join([f"{kid} 0 R" for kid in kids])}] '
+        f'/Count {len(kids)} >>'
+    ).encode()
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for object_id, obj in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % object_id + obj + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+def draw_id_card(person, path):
+    """
+    Draws an ID card like sample_data/dir_1/sample_id.jpeg
+
+    Args:
+        person (dict): see fake_person
+        path (str): jpeg or png file path
+
+    Returns:
+        dict: pii type -> number seeded
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    lines = [
+        'IDENTIFICATION CARD',
+        f'NAME {person["name"].upper()}',
+        f'DOB {person["dob"]}',
+        f'ADDRESS {person["address"]}',
+        f'{person["city"]}, {person["state"]} {person["zip"]}',
+        f'PHONE {person["phone"]}',
+    ]
+    try:
+        font = ImageFont.truetype('DejaVuSans.ttf', 32)
+        scale = 1
+    except OSError:
+        # bitmap font is tiny, drawn small and upscaled
+        font = ImageFont.load_default()
+        scale = 3
+
+    width, line_height = 1000 // scale, 48 // scale
+    im = Image.new('RGB', (width, line_height * (len(lines) + 2)), (235, 240, 250))
+    draw = ImageDraw.Draw(im)
+    for index, line in enumerate(lines):
+        draw.text((20 // scale, line_height * (index + 1)), line, fill=(20, 20, 60), font=font)
+    if scale > 1:
+        im = im.resize((im.size[0] * scale, im.size[1] * scale))
+    im.save(path)
+    return {'PERSON': 1, 'DATE_TIME': 1, 'ADDRESS': 1, 'LOCATION': 1, 'PHONE_NUMBER': 1}
+
+
+def write_file(kind, path, rng, rows, pages, lines, pii_density):
+    """
+    Writes a file of some kind holding fake pii
+
+    Args:
+        kind (str): one of file_kinds
+        path (str): file path without extension
+        rng (random.Random):
+        rows (int): rows of csv and xlsx files
+        pages (int): pages of pdf files
+        lines (int): lines of txt files and of each pdf page
+        pii_density (float): share of txt and pdf lines holding pii
+
+    Returns:
+        Tuple[str, dict]: file path and pii type -> number seeded
+    """
+    if kind == 'txt':
+        text_lines, seeded = fake_lines(rng, lines, pii_density)
+        path += '.txt'
+        pathlib.Path(path).write_text('\n'.join(text_lines))
+    elif kind in ['csv', 'xlsx']:
+        df, seeded = fake_records_df(rng, rows)
+        path += f'.{kind}'
+        if kind == 'csv':
+            df.to_csv(path)
+        else:
+            df.to_excel(path)
+    elif kind == 'pdf':
+        seeded = {}
+        pdf_pages = []
+        for _ in range(pages):
+            page_lines, page_seeded = fake_lines(rng, lines, pii_density)
+            pdf_pages.append(page_lines)
+            for pii_type in page_seeded:
+                seeded[pii_type] = seeded.get(pii_type, 0) + page_seeded[pii_type]
+        path += '.pdf'
+        pathlib.Path(path).write_bytes(build_pdf(pdf_pages))
+    elif kind == 'image':
+        path += '.jpeg'
+        seeded = draw_id_card(fake_person(rng), path)
+    else:
+        raise ValueError(f'Unknown file kind {kind}')
+    return path, seeded
+
+
+def get_manifest_path(path):
+    """
+    Returns path of manifest of a corpus
+
+    Args:
+        path (str): corpus folder
+
+    Returns:
+        str:
+    """
+    return os.path.normpath(str(path)) + '.manifest.json'
+
+
+def parse_mix(value):
+    """
+    Parses file kinds mix, e.g. txt=4,csv=2
+
+    Args:
+        value (str):
+
+    Returns:
+        dict: kind -> weight
+    """
+    mix = {}
+    for item in value.split(','):
+        kind, weight = item.split('=')
+        if kind not in file_kinds:
+            raise argparse.ArgumentTypeError(
+                f'Unknown file kind {kind}, choose from {", ".join(file_kinds)}')
+        mix[kind] = int(weight)
+    return mix
+
+
+def generate_corpus(path, files=100, mix=None, seed=0, rows=100, pages=3, lines=40,
+                    pii_density=0.3, files_per_dir=50):
+    """
+    Generates corpus of files holding fake pii, the same
+    arguments always generate the same corpus
+
+    Args:
+        path (str): folder to write files to
+        files (int): number of files
+        mix (dict): file kind -> weight, defaults to every kind once
+        seed (int): random seed
+        rows (int): rows of csv and xlsx files
+        pages (int): pages of pdf files
+        lines (int): lines of txt files and of each pdf page
+        pii_density (float): share of txt and pdf lines holding pii
+        files_per_dir (int): files per folder, folders are nested two levels
+
+    Returns:
+        dict: manifest, also written to get_manifest_path(path)
+    """
+    if mix is None:
+        mix = {kind: 1 for kind in file_kinds}
+    # kinds repeated by weight, files take turns so the mix is exact
+    kinds = [kind for kind in mix for _ in range(mix[kind])]
+    rng = random.Random(seed)
+
+    manifest = {
+        'seed': seed,
+        'files': files,
+        'mix': mix,
+        'rows': rows,
+        'pages': pages,
+        'lines': lines,
+        'pii_density': pii_density,
+        'contents': {},
+    }
+
+    for index in range(files):
+        kind = kinds[index % len(kinds)]
+        dir_index = index // files_per_dir
+        folder = os.path.join(path, f'dir_{dir_index // 10}', f'dir_{dir_index % 10}')
+        os.makedirs(folder, exist_ok=True)
+        filepath, seeded = write_file(
+            kind, os.path.join(folder, f'{kind}_{index}'), rng, rows, pages, lines, pii_density)
+        manifest['contents'][os.path.relpath(filepath, path)] = {
+            'kind': kind,
+            'pii': seeded,
+        }
+
+    with open(get_manifest_path(path), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic corpus of files holding fake PII'
+    )
+    parser.add_argument(
+        'path',
+        type=pathlib.Path,
+        help='folder to write files to'
+    )
+    parser.add_argument(
+        '--files',
+        type=int,
+        default=100,
+        help='number of files (default: 100)'
+    )
+    parser.add_argument(
+        '--mix',
+        type=parse_mix,
+        help=f'weights of file kinds, e.g. txt=4,csv=2 (default: one of each of {",".join(file_kinds)})'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed, the same seed generates the same corpus (default: 0)'
+    )
+    parser.add_argument(
+        '--rows',
+        type=int,
+        default=100,
+        help='rows of csv and xlsx files (default: 100)'
+    )
+    parser.add_argument(
+        '--pages',
+        type=int,
+        default=3,
+        help='pages of pdf files (default: 3)'
+    )
+    parser.add_argument(
+        '--lines',
+        type=int,
+        default=40,
+        help='lines of txt files and of each pdf page (default: 40)'
+    )
+    parser.add_argument(
+        '--pii-density',
+        type=float,
+        default=0.3,
+        help='share of txt and pdf lines holding pii (default: 0.3)'
+    )
+    args = parser.parse_args()
+
+    manifest = generate_corpus(
+        args.path,
+        files=args.files,
+        mix=args.mix,
+        seed=args.seed,
+        rows=args.rows,
+        pages=args.pages,
+        lines=args.lines,
+        pii_density=args.pii_density,
+    )
+    print(f'Generated {len(manifest["contents"])} files in {args.path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Compares per-file Stanford NER cost of nltk's StanfordNERTagger
+# (new java process per call) against the long-lived StanfordNERService
+#
+# Run from the project root:
+#   python src/bench_ner.py sample_data
+
+import argparse
+import pathlib
+import time
+
+from nltk.tag.stanford import StanfordNERTagger
+
+from parse_files import get_parser, list_files_to_parse
+from parsers.detectors.StanfordNERService import STANFORD_NER_CLASSIFIER, STANFORD_NER_JAR, StanfordNERService
+
+
+def load_documents(path):
+    """
+    Extracts the tokens PiiAnalyzer would send to NER for every file
+
+    Args:
+        path (str): folder path
+
+    Returns:
+        dict: file path -> tokens
+    """
+    documents = {}
+    for filepath, file_extension in list_files_to_parse(path):
+        parser = get_parser(file_extension)
+        try:
+            if file_extension in ['.csv', '.xls', '.xlsx']:
+                df = parser.load_csv(filepath) if file_extension == '.csv' else parser.load_excel(filepath)
+                text = df.to_string()
+            else:
+                text = parser.extract_text(filepath)
+        except Exception as e:
+            print(f'Error while extracting {filepath}: {e}. Skipping!')
+            continue
+        documents[filepath] = set(parser.clean_text(text).split())
+    return documents
+
+
+def time_per_file(tagger, documents):
+    timings = {}
+    for filepath, tokens in documents.items():
+        start = time.perf_counter()
+        tagger.tag(tokens)
+        timings[filepath] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark Stanford NER tagging per file'
+    )
+    parser.add_argument(
+        'path',
+        type=pathlib.Path,
+        help='folder path with sample files'
+    )
+    args = parser.parse_args()
+
+    documents = load_documents(args.path)
+    print(f'Loaded {len(documents)} files\n')
+
+    before = time_per_file(
+        StanfordNERTagger(STANFORD_NER_CLASSIFIER, STANFORD_NER_JAR), documents)
+
+    with StanfordNERService() as service:
+        start = time.perf_counter()
+        service.tag(['warmup'])
+        startup = time.perf_counter() - start
+        after = time_per_file(service, documents)
+
+        start = time.perf_counter()
+        service.tag_documents(list(documents.values()))
+        batched = time.perf_counter() - start
+
+    print(f'{"file":60} {"before (s)":>12} {"after (s)":>12}')
+    for filepath in documents:
+        print(f'{str(filepath)[-60:]:60} {before[filepath]:12.3f} {after[filepath]:12.3f}')
+
+    count = max(len(documents), 1)
+    print()
+    print(f'server startup (once): {startup:.3f}s')
+    print(f'mean per file before:  {sum(before.values()) / count:.3f}s')
+    print(f'mean per file after:   {sum(after.values()) / count:.3f}s')
+    print(f'mean per file batched: {batched / count:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
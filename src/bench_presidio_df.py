@@ -0,0 +1,100 @@
+# Compares Presidio analysis of a spreadsheet cell by cell (one
+# AnalyzerEngine.analyze call per cell, like applymap used to do)
+# against the batched, deduplicated PresidioDetector.extract_pii_from_df
+#
+# Run from the project root:
+#   python src/bench_presidio_df.py sample_data/file_example_XLSX_1000.xlsx --scale 10
+
+import argparse
+import pathlib
+import time
+
+import pandas as pd
+
+from parsers.detectors.PresidioDetector import PresidioDetector
+
+
+def extract_pii_from_df_per_cell(detector, df):
+    summary = {}
+
+    def analyze_cell(t):
+        result_list = detector.analyzer.analyze(
+            text=str(t),
+            entities=detector.get_pii_entities(),
+            language='en',
+        )
+        for result in result_list:
+            if result.entity_type not in summary:
+                summary[result.entity_type] = {
+                    'count': 0,
+                    'score': result.score,
+                    'values': [],
+                }
+            summary[result.entity_type]['count'] += 1
+            summary[result.entity_type]['values'].append(t)
+        return ','.join([result.entity_type for result in result_list])
+
+    summary['df_pii'] = df.copy(deep=True).applymap(analyze_cell)
+    return summary
+
+
+def get_counts(summary):
+    return {
+        pii_name: summary[pii_name]['count']
+        for pii_name in summary
+        if pii_name != 'df_pii'
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark Presidio spreadsheet analysis'
+    )
+    parser.add_argument(
+        'path',
+        type=pathlib.Path,
+        help='csv or excel file'
+    )
+    parser.add_argument(
+        '--scale',
+        type=int,
+        default=10,
+        help='number of times rows are repeated (default: 10)'
+    )
+    parser.add_argument(
+        '--skip-per-cell',
+        action='store_true',
+        help='only time the batched version, per cell takes hours on big sheets'
+    )
+    args = parser.parse_args()
+
+    if args.path.suffix == '.csv':
+        df = pd.read_csv(args.path)
+    else:
+        df = pd.DataFrame(pd.read_excel(args.path))
+    df = pd.concat([df] * args.scale, ignore_index=True)
+    print(f'{df.shape[0]} rows x {df.shape[1]} columns = {df.size} cells\n')
+
+    detector = PresidioDetector()
+    # load spaCy and recognizers before timing
+    detector.analyzer.analyze(text='warmup', language='en')
+
+    start = time.perf_counter()
+    batched = detector.extract_pii_from_df(df)
+    batched_seconds = time.perf_counter() - start
+    print(f'batched:  {batched_seconds:.2f}s')
+
+    if not args.skip_per_cell:
+        start = time.perf_counter()
+        per_cell = extract_pii_from_df_per_cell(detector, df)
+        per_cell_seconds = time.perf_counter() - start
+        print(f'per cell: {per_cell_seconds:.2f}s')
+        print(f'speedup:  {per_cell_seconds / batched_seconds:.1f}x')
+
+        same_counts = get_counts(per_cell) == get_counts(batched)
+        same_df = per_cell['df_pii'].equals(batched['df_pii'])
+        print(f'same counts: {same_counts}, same df_pii: {same_df}')
+
+
+if __name__ == '__main__':
+    main()
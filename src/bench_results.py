@@ -0,0 +1,210 @@
+# Times building the summary from results of a scan, on synthetic results
+# of many files, without running any parser or detector:
+# - row_by_row: one flatten_result dict per file turned into a dataframe,
+#   the way summaries were built before (and rows are still streamed)
+# - vectorized: build_summary_df_from_results, a findings table scored
+#   with a join against pii weights and pivoted to the wide summary
+#
+# Run from the project root:
+#   python src/bench_results.py --files 1000000
+#   python src/bench_results.py --files 1000000 --output bench_results.json
+
+import argparse
+import json
+import pathlib
+import random
+import time
+
+import pandas as pd
+
+from results_builder import (build_results_tables, build_summary_df_from_tables, detector_pii_names,
+                             flatten_result, pivot_findings, score_findings, summary_base_columns)
+
+owners = ['alice', 'bob', 'carol', 'dave', 'erin', 'frank', 'grace', 'heidi']
+
+groups = ['staff', 'finance', 'hr', 'it']
+
+
+def generate_results(files, seed=0, pii_density=0.3):
+    """
+    Generates results of a scan with every detector, in the format each
+    detector reports: presidio a dict with a count, pii_analyzer a list
+    of values and pii_catcher a number
+
+    Metadata and values are shared between files so a million files
+    fit in memory, building the summary only reads them
+
+    Args:
+        files (int): number of files
+        seed (int): random seed, the same seed generates the same results
+        pii_density (float): share of files holding pii
+
+    Returns:
+        dict: filepath -> result, see parse_files
+    """
+    rng = random.Random(seed)
+    metadata = [
+        {'size_bytes': 1024 * (index + 1), 'owner': owner, 'group': group}
+        for index, (owner, group) in enumerate([(owner, group) for owner in owners for group in groups])
+    ]
+    # pii_analyzer reports values, lists of a given length are shared
+    values = [['value'] * count for count in range(20)]
+    no_pii = {'presidio': {}, 'pii_analyzer': {}, 'pii_catcher': {}}
+
+    results = {}
+    for file_index in range(files):
+        filepath = f'share/dir_{file_index % 1000}/file_{file_index}.txt'
+        if rng.random() >= pii_density:
+            results[filepath] = {'pii': no_pii, 'metadata': rng.choice(metadata)}
+            continue
+
+        pii = {}
+        for detector_name in ['presidio', 'pii_analyzer', 'pii_catcher']:
+            detector_results = {}
+            for pii_name in rng.sample(detector_pii_names[detector_name], rng.randint(1, 3)):
+                count = rng.randint(1, 19)
+                if detector_name == 'presidio':
+                    detector_results[pii_name] = {'count': count, 'values': values[count]}
+                elif detector_name == 'pii_analyzer':
+                    detector_results[pii_name] = values[count]
+                else:
+                    detector_results[pii_name] = count
+            pii[detector_name] = detector_results
+        results[filepath] = {'pii': pii, 'metadata': rng.choice(metadata)}
+    return results
+
+
+def build_summary_row_by_row(results):
+    """
+    Builds summary from one dict per file, see flatten_result
+
+    Args:
+        results (dict):
+
+    Returns:
+        pd.DataFrame:
+    """
+    df = pd.DataFrame([flatten_result(filepath, results[filepath]) for filepath in results])
+    df.fillna(0, inplace=True)
+    return df
+
+
+def time_call(function, *args):
+    """
+    Returns result of a call and its wall time
+
+    Returns:
+        Tuple[Any, float]:
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(files, seed=0, pii_density=0.3, skip_row_by_row=False):
+    """
+    Times every way of building the summary on synthetic results
+
+    Args:
+        files (int): number of files
+        seed (int): random seed
+        pii_density (float): share of files holding pii
+        skip_row_by_row (bool): don't time the row by row summary
+
+    Returns:
+        dict: seconds of every step, and sizes of the tables
+    """
+    results, generate_seconds = time_call(generate_results, files, seed, pii_density)
+
+    (files_df, findings_df), tables_seconds = time_call(build_results_tables, results)
+    _, score_seconds = time_call(score_findings, findings_df, len(files_df))
+    _, pivot_seconds = time_call(pivot_findings, findings_df, len(files_df))
+    df, summary_seconds = time_call(build_summary_df_from_tables, files_df, findings_df)
+
+    benchmark = {
+        'files': files,
+        'findings': len(findings_df),
+        'summary_columns': len(df.columns),
+        'generate_seconds': generate_seconds,
+        'vectorized': {
+            'tables_seconds': tables_seconds,
+            'score_seconds': score_seconds,
+            'pivot_seconds': pivot_seconds,
+            # score and pivot are run again by build_summary_df_from_tables
+            'total_seconds': tables_seconds + summary_seconds,
+            'memory_mb': (df.memory_usage(deep=True).sum()
+                          + findings_df.memory_usage(deep=True).sum()) / 1024 / 1024,
+        },
+    }
+
+    if not skip_row_by_row:
+        row_df, row_seconds = time_call(build_summary_row_by_row, results)
+        benchmark['row_by_row'] = {
+            'total_seconds': row_seconds,
+            'memory_mb': row_df.memory_usage(deep=True).sum() / 1024 / 1024,
+        }
+        benchmark['speedup'] = row_seconds / benchmark['vectorized']['total_seconds']
+
+        # both ways give the same scores and counts
+        row_df = row_df.reindex(columns=df.columns, fill_value=0)
+        pd.testing.assert_series_equal(
+            df['pii_score'], row_df['pii_score'], check_names=False, check_exact=False)
+        count_columns = list(df.columns[len(summary_base_columns):])
+        assert (df[count_columns].to_numpy() == row_df[count_columns].to_numpy()).all()
+
+    return benchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark building the summary from synthetic results'
+    )
+    parser.add_argument(
+        '--files',
+        type=int,
+        default=1000000,
+        help='number of files (default: 1000000)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed, the same seed generates the same results (default: 0)'
+    )
+    parser.add_argument(
+        '--pii-density',
+        type=float,
+        default=0.3,
+        help='share of files holding pii (default: 0.3)'
+    )
+    parser.add_argument(
+        '--skip-row-by-row',
+        action='store_true',
+        help="don't time building the summary one row at a time"
+    )
+    parser.add_argument(
+        '--output',
+        type=pathlib.Path,
+        help='json file to write results to'
+    )
+    args = parser.parse_args()
+
+    benchmark = run_benchmark(args.files, args.seed, args.pii_density, args.skip_row_by_row)
+    print(f'{benchmark["files"]} files, {benchmark["findings"]} findings, '
+          f'{benchmark["summary_columns"]} columns (generated in {benchmark["generate_seconds"]:.2f}s)')
+    vectorized = benchmark['vectorized']
+    print(f'vectorized: {vectorized["total_seconds"]:.2f}s (tables {vectorized["tables_seconds"]:.2f}s, '
+          f'score {vectorized["score_seconds"]:.2f}s, pivot {vectorized["pivot_seconds"]:.2f}s), '
+          f'{vectorized["memory_mb"]:.0f} MB')
+    if 'row_by_row' in benchmark:
+        row_by_row = benchmark['row_by_row']
+        print(f'row by row: {row_by_row["total_seconds"]:.2f}s, {row_by_row["memory_mb"]:.0f} MB '
+              f'({benchmark["speedup"]:.1f}x slower)')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(benchmark, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
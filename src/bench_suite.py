@@ -0,0 +1,411 @@
+# Times every stage of a scan on a corpus (see bench_corpus.py) and writes
+# machine readable results which can be compared across runs:
+# - extract: each parser extracting text from its files (loading sheets)
+# - detect: each detector on the extracted text or sheets
+# - end_to_end: cli.py on the whole corpus in a new process
+# The first call of every stage is reported on its own since it loads models.
+#
+# Run from the project root:
+#   python src/bench_corpus.py bench_data --files 200
+#   python src/bench_suite.py run bench_data --output bench_before.json
+#   python src/bench_suite.py run bench_data --output bench_after.json
+#   python src/bench_suite.py compare bench_before.json bench_after.json
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_corpus import get_manifest_path
+from cli import parse_names
+from parse_files import configure_parsers, get_parser, get_parser_name, list_files_to_parse
+from parsers.registry import detector_registry, parser_registry
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+
+def summarize_timings(seconds):
+    """
+    Summarizes timings of calls, the first call is kept apart
+    since it includes loading models
+
+    Args:
+        seconds (List[float]):
+
+    Returns:
+        dict:
+    """
+    summary = {
+        'calls': len(seconds),
+        'first_seconds': seconds[0] if len(seconds) > 0 else None,
+    }
+    rest = seconds[1:] if len(seconds) > 1 else seconds
+    if len(rest) > 0:
+        summary.update({
+            'total_seconds': sum(rest),
+            'mean_seconds': statistics.mean(rest),
+            'median_seconds': statistics.median(rest),
+            'max_seconds': max(rest),
+        })
+    return summary
+
+
+def extract_corpus(path):
+    """
+    Extracts text of every file with its parser, sheets are loaded
+    into dataframes like SheetParser does before detection
+
+    Args:
+        path (str): corpus folder
+
+    Returns:
+        Tuple[list, dict]: (parser name, filepath, text or dataframe) of every
+        file, and metric name -> timings
+    """
+    documents = []
+    seconds = {}
+    chars = {}
+
+    for filepath, file_extension in list_files_to_parse(path):
+        parser_name = get_parser_name(file_extension)
+        parser = get_parser(file_extension)
+        start = time.perf_counter()
+        try:
+            if parser_name == 'sheet':
+                if file_extension == '.csv':
+                    document = parser.load_csv(filepath)
+                else:
+                    document = parser.load_excel(filepath)
+                size = document.size
+            else:
+                document = parser.clean_text(parser.extract_text(filepath))
+                size = len(document)
+        except Exception as e:
+            print(f'Error while extracting {filepath}: {e}. Skipping!')
+            continue
+        seconds.setdefault(parser_name, []).append(time.perf_counter() - start)
+        chars[parser_name] = chars.get(parser_name, 0) + size
+        documents.append((parser_name, filepath, document))
+
+    metrics = {}
+    for parser_name in seconds:
+        metrics[f'extract.{parser_name}'] = summarize_timings(seconds[parser_name])
+        # characters of text, or cells of sheets
+        metrics[f'extract.{parser_name}']['size'] = chars[parser_name]
+    return documents, metrics
+
+
+def detect_corpus(documents):
+    """
+    Runs every detector on every extracted document
+
+    Args:
+        documents (list): see extract_corpus
+
+    Returns:
+        dict: metric name -> timings
+    """
+    metrics = {}
+    for detector_name in detector_registry:
+        start = time.perf_counter()
+        detector = detector_registry[detector_name]
+        metrics[f'detect.{detector_name}.create'] = {
+            'calls': 1,
+            'first_seconds': time.perf_counter() - start,
+        }
+
+        seconds = {}
+        errors = {}
+        for parser_name, filepath, document in documents:
+            if parser_name == 'sheet':
+                method = 'extract_pii_from_df'
+            else:
+                if len(document) == 0:
+                    continue
+                method = 'extract_pii_from_text'
+            start = time.perf_counter()
+            try:
+                getattr(detector, method)(document)
+            except Exception as e:
+                print(f'Error while running {detector_name} on {filepath}: {e}')
+                errors[method] = errors.get(method, 0) + 1
+                continue
+            seconds.setdefault(method, []).append(time.perf_counter() - start)
+
+        for method in seconds:
+            metric = summarize_timings(seconds[method])
+            metric['errors'] = errors.get(method, 0)
+            metrics[f'detect.{detector_name}.{method}'] = metric
+    return metrics
+
+
+def run_cli(args, repeat):
+    """
+    Times cli.py in a new process, like a user running it
+
+    Args:
+        args (List[str]): command line arguments
+        repeat (int): number of runs
+
+    Returns:
+        dict: timings, first run included in the stats
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, CLI_PATH] + args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            print(f'Error while running cli.py {" ".join(args)}: {completed.stderr[-2000:]}')
+            return {'calls': len(seconds), 'errors': 1}
+        seconds.append(elapsed)
+
+    return {
+        'calls': len(seconds),
+        'total_seconds': sum(seconds),
+        'mean_seconds': statistics.mean(seconds),
+        'median_seconds': statistics.median(seconds),
+        'max_seconds': max(seconds),
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(CLI_PATH),
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmark(path, detectors=None, parsers=None, workers=1, repeat=3,
+                  skip_stages=False, skip_cli=False):
+    """
+    Runs every benchmark on a corpus
+
+    Args:
+        path (str): corpus folder
+        detectors (List[str]): detectors to run, None for all
+        parsers (List[str]): parsers to use, None for all
+        workers (int): worker processes of end to end runs
+        repeat (int): number of end to end runs
+        skip_stages (bool): don't time parsers and detectors one by one
+        skip_cli (bool): don't time end to end runs
+
+    Returns:
+        dict: results, see compare_results
+    """
+    configure_parsers({'detectors': detectors, 'parsers': parsers})
+
+    manifest = None
+    if os.path.exists(get_manifest_path(path)):
+        with open(get_manifest_path(path)) as f:
+            manifest = json.load(f)
+        manifest.pop('contents')
+
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'corpus': str(path),
+            'manifest': manifest,
+            'detectors': list(detector_registry),
+            'parsers': list(parser_registry),
+            'workers': workers,
+            'repeat': repeat,
+        },
+        'metrics': {},
+    }
+    metrics = results['metrics']
+
+    if not skip_stages:
+        documents, extract_metrics = extract_corpus(path)
+        metrics.update(extract_metrics)
+        metrics.update(detect_corpus(documents))
+
+    if not skip_cli:
+        selection = []
+        if detectors is not None:
+            selection += ['--detectors', ','.join(detectors)]
+        if parsers is not None:
+            selection += ['--parsers', ','.join(parsers)]
+
+        metrics['end_to_end.startup'] = run_cli(['-h'], repeat)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metrics['end_to_end.scan'] = run_cli(
+                [str(path), os.path.join(tmp_dir, 'results.csv'),
+                 '--workers', str(workers)] + selection,
+                repeat
+            )
+
+    return results
+
+
+def compare_results(base, new, threshold=0.1):
+    """
+    Compares median seconds of every metric of two runs
+
+    Args:
+        base (dict): results of run_benchmark
+        new (dict): results of run_benchmark
+        threshold (float): relative slowdown reported as a regression
+
+    Returns:
+        Tuple[List[dict], List[str]]: comparison of every metric and
+        names of metrics which regressed
+    """
+    def get_seconds(metric):
+        if metric is None:
+            return None
+        if metric.get('median_seconds') is not None:
+            return metric['median_seconds']
+        return metric.get('first_seconds')
+
+    rows = []
+    regressions = []
+    for name in sorted(set(base['metrics']) | set(new['metrics'])):
+        base_seconds = get_seconds(base['metrics'].get(name))
+        new_seconds = get_seconds(new['metrics'].get(name))
+        ratio = None
+        if base_seconds and new_seconds is not None:
+            ratio = new_seconds / base_seconds
+            if ratio > 1 + threshold:
+                regressions.append(name)
+        rows.append({
+            'metric': name,
+            'base_seconds': base_seconds,
+            'new_seconds': new_seconds,
+            'ratio': ratio,
+        })
+    return rows, regressions
+
+
+def format_seconds(seconds):
+    return '-' if seconds is None else f'{seconds:.4f}s'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsers, detectors and cli.py on a corpus'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run benchmarks on a corpus')
+    run_parser.add_argument(
+        'path',
+        type=pathlib.Path,
+        help='corpus folder, see bench_corpus.py'
+    )
+    run_parser.add_argument(
+        '--output',
+        type=pathlib.Path,
+        required=True,
+        help='json file to write results to'
+    )
+    run_parser.add_argument(
+        '--detectors',
+        type=parse_names,
+        help='comma separated detectors to benchmark (default: all)'
+    )
+    run_parser.add_argument(
+        '--parsers',
+        type=parse_names,
+        help='comma separated parsers to benchmark (default: all)'
+    )
+    run_parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='worker processes of end to end runs (default: 1)'
+    )
+    run_parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='number of end to end runs (default: 3)'
+    )
+    run_parser.add_argument(
+        '--skip-stages',
+        action='store_true',
+        help="don't time parsers and detectors one by one"
+    )
+    run_parser.add_argument(
+        '--skip-cli',
+        action='store_true',
+        help="don't time end to end runs of cli.py"
+    )
+
+    compare_parser = subparsers.add_parser('compare', help='compare results of two runs')
+    compare_parser.add_argument(
+        'base',
+        type=pathlib.Path,
+        help='results of the reference run'
+    )
+    compare_parser.add_argument(
+        'new',
+        type=pathlib.Path,
+        help='results of the run to check'
+    )
+    compare_parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='relative slowdown reported as a regression (default: 0.1)'
+    )
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        try:
+            results = run_benchmark(
+                args.path,
+                detectors=args.detectors,
+                parsers=args.parsers,
+                workers=args.workers,
+                repeat=args.repeat,
+                skip_stages=args.skip_stages,
+                skip_cli=args.skip_cli,
+            )
+        except ValueError as e:
+            run_parser.error(str(e))
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        for name, metric in results['metrics'].items():
+            print(f'{name:<50} median {format_seconds(metric.get("median_seconds"))} '
+                  f'first {format_seconds(metric.get("first_seconds"))}')
+        return
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows, regressions = compare_results(base, new, args.threshold)
+    print(f'{"metric":<50} {"base":>10} {"new":>10} {"ratio":>7}')
+    for row in rows:
+        ratio = '-' if row['ratio'] is None else f'{row["ratio"]:.2f}x'
+        flag = ' REGRESSION' if row['metric'] in regressions else ''
+        print(f'{row["metric"]:<50} {format_seconds(row["base_seconds"]):>10} '
+              f'{format_seconds(row["new_seconds"]):>10} {ratio:>7}{flag}')
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
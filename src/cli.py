@@ -1,30 +1,484 @@
-from results_builder import build_summary_df_from_results
-from parse_files import parse_files
+from parse_files import configure_parsers, iter_parse_files, parse_files
+from result_cache import ResultCache
+from summary_writer import (get_findings_path, is_columnar, merge_findings, merge_summaries,
+                            open_summary_writer, write_results, write_summary_df, write_table)
+from watcher import FolderWatcher
+from metrics import format_summary, recorder
+from parsers.registry import detector_registry, parser_registry
+from walker import noise_dirs, symlink_policies
 import argparse
+import importlib.util
 import pathlib
+import sys
 
-parser = argparse.ArgumentParser(
-    description='Scan a folder for PII'
-)
 
-parser.add_argument(
-    'path',
-    type=pathlib.Path,
-    help='folder path to scan'
-)
+def parse_names(value):
+    """
+    Splits comma separated names of a command line option
 
-parser.add_argument(
-    'results',
-    type=pathlib.Path,
-    help='where to place results'
-)
+    Args:
+        value (str): e.g. presidio,pii_catcher
 
-args = vars(parser.parse_args())
-folder_path = args['path']
-results_path = args['results']
+    Returns:
+        List[str]:
+    """
+    return [name.strip() for name in value.split(',') if len(name.strip()) > 0]
 
 
-raw_results = parse_files(folder_path)
-df_results = build_summary_df_from_results(raw_results)
+def parse_shard(value):
+    """
+    Parses shard of a command line option
 
-df_results.to_csv(results_path)
+    Args:
+        value (str): e.g. 3/16 for the third of 16 shards
+
+    Returns:
+        Tuple[int, int]: shard index from 1 and shard count
+    """
+    try:
+        shard_index, shard_count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected INDEX/COUNT, e.g. 3/16, got {value}')
+    if shard_count < 1 or not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(
+            f'shard index must be between 1 and the shard count, got {value}')
+    return shard_index, shard_count
+
+
+def report_metrics(profile_stage, profile_output):
+    """
+    Prints totals per stage and profile stats, and writes them out
+
+    Args:
+        profile_stage (str): stage profiled, None if none was
+        profile_output (str): file profile stats are dumped to
+    """
+    if recorder.enabled:
+        print(format_summary(recorder.get_summary()))
+    if profile_stage is not None:
+        print(recorder.get_profile_stats())
+        recorder.close(profile_output)
+    else:
+        recorder.close()
+
+
+def merge(argv):
+    """
+    Merges partial summaries of shards into one summary
+
+    Args:
+        argv (List[str]): command line arguments after merge
+    """
+    parser = argparse.ArgumentParser(
+        prog='cli.py merge',
+        description='Merge summaries of shards scanned with --shard into one summary'
+    )
+
+    parser.add_argument(
+        'partials',
+        type=pathlib.Path,
+        nargs='+',
+        help='summaries of shards, csv or json lines'
+    )
+
+    parser.add_argument(
+        'results',
+        type=pathlib.Path,
+        help='where to place merged results, see results of `cli.py -h`'
+    )
+
+    args = parser.parse_args(argv)
+
+    if is_columnar(args.results) and importlib.util.find_spec('pyarrow') is None:
+        parser.error(f'writing {args.results.suffix} results needs pyarrow, pip install pyarrow')
+
+    df_results = merge_summaries(args.partials)
+    write_summary_df(df_results, args.results)
+    if is_columnar(args.results):
+        df_findings = merge_findings(args.partials, df_results)
+        if df_findings is not None:
+            write_table(df_findings, get_findings_path(args.results))
+    print(f'Merged {len(args.partials)} summaries of {len(df_results)} file(s) into {args.results}')
+
+
+def main():
+    # merge is checked by hand so `cli.py path results` keeps working,
+    # scan a folder named merge as ./merge
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        merge(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description='Scan a folder for PII. Run `cli.py merge -h` to merge summaries of shards'
+    )
+
+    parser.add_argument(
+        'path',
+        type=pathlib.Path,
+        help='folder path to scan'
+    )
+
+    parser.add_argument(
+        'results',
+        type=pathlib.Path,
+        help='where to place results: csv, json lines (.jsonl, with --stream), or parquet/arrow '
+        '(.parquet, .arrow, .feather) with a typed schema and a findings table next to it, '
+        'e.g. results.findings.parquet'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='number of worker processes scanning files in parallel (default: 1)'
+    )
+
+    parser.add_argument(
+        '--cache',
+        type=pathlib.Path,
+        help='sqlite file used to cache results between runs, only new or changed files are scanned again'
+    )
+
+    parser.add_argument(
+        '--cache-max-mb',
+        type=int,
+        default=1024,
+        help='maximum size of cached results in MB, least recently used results are evicted first (default: 1024)'
+    )
+
+    parser.add_argument(
+        '--include',
+        action='append',
+        metavar='GLOB',
+        help='only scan files matching a glob, can be repeated. Globs without a slash match '
+        'file names, e.g. *.pdf, others paths relative to the folder, e.g. hr/*/*.xlsx'
+    )
+
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        metavar='GLOB',
+        help='skip files and folders matching a glob, can be repeated, see --include'
+    )
+
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        help='levels of subfolders scanned, 0 only scans files directly in the folder (default: no limit)'
+    )
+
+    parser.add_argument(
+        '--min-size',
+        type=int,
+        metavar='BYTES',
+        help='skip files smaller than this many bytes'
+    )
+
+    parser.add_argument(
+        '--max-size',
+        type=int,
+        metavar='BYTES',
+        help='skip files larger than this many bytes'
+    )
+
+    parser.add_argument(
+        '--symlinks',
+        choices=symlink_policies,
+        default='files',
+        help='skip symbolic links, follow links to files only, or follow links to files and '
+        'folders, each folder is walked once (default: files)'
+    )
+
+    parser.add_argument(
+        '--prune-dirs',
+        type=parse_names,
+        default=noise_dirs,
+        metavar='NAMES',
+        help='comma separated names of folders skipped with everything in them, an empty string '
+        f'to walk every folder (default: {",".join(noise_dirs)})'
+    )
+
+    parser.add_argument(
+        '--prefetch-threads',
+        type=int,
+        default=4,
+        help='threads sniffing and reading files and their metadata ahead of the scan, so reads '
+        'stalled on network shares overlap with scanning, 0 reads each file when it is scanned. '
+        'Not used with --metrics or --profile (default: 4)'
+    )
+
+    parser.add_argument(
+        '--prefetch-depth',
+        type=int,
+        default=16,
+        help='most files read ahead of the scan (default: 16)'
+    )
+
+    parser.add_argument(
+        '--prefetch-max-mb',
+        type=int,
+        default=16,
+        help='largest file read ahead in MB, larger files are read by their parser when scanned. '
+        'Memory of files read ahead is bounded by --prefetch-depth times this (default: 16)'
+    )
+
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        metavar='INDEX/COUNT',
+        help='only scan files of one shard, e.g. 3/16, picked from a hash of their path '
+        'relative to the folder so shards are disjoint on every machine. Merge summaries '
+        'of every shard with `cli.py merge`'
+    )
+
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='only scan one file of each group of files with identical contents, found by size, '
+        'then a hash of their ends, then a hash of their contents. Copies get the results of the '
+        'scanned file and the summary holds their duplicate_group'
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='write a summary row as soon as each file is scanned instead of at the end, '
+        'uses json lines if results ends with .jsonl, parquet row groups for .parquet and csv otherwise'
+    )
+
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='keep running after the scan, rescanning created and modified files and dropping '
+        'deleted ones. The summary is rewritten on SIGUSR1 and on exit'
+    )
+
+    parser.add_argument(
+        '--watch-debounce',
+        type=float,
+        default=2.0,
+        help='seconds a file must go without changes before --watch rescans it (default: 2.0)'
+    )
+
+    parser.add_argument(
+        '--watch-poll',
+        type=float,
+        metavar='SECONDS',
+        help='poll the folder for changes every SECONDS instead of using filesystem events, '
+        'used anyway when watchdog is not installed (default: 5.0 when polling)'
+    )
+
+    parser.add_argument(
+        '--column-profile',
+        action='store_true',
+        help='detect pii in csv/excel files column by column from samples of values '
+        'and estimate counts, instead of analyzing every cell'
+    )
+
+    parser.add_argument(
+        '--sample-size',
+        type=int,
+        help='most values sampled per column with --column-profile (default: 100)'
+    )
+
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        help='analyze documents longer than this many characters with presidio in '
+        'overlapping windows to bound memory, more than the 200 characters windows '
+        'overlap by (default: only documents too long for spaCy)'
+    )
+
+    parser.add_argument(
+        '--pdf-max-pages',
+        type=int,
+        help='most pages scanned per pdf (default: all)'
+    )
+
+    parser.add_argument(
+        '--pdf-max-bytes',
+        type=int,
+        help='most bytes of text scanned per pdf (default: no limit)'
+    )
+
+    parser.add_argument(
+        '--pdf-page-workers',
+        type=int,
+        help='processes extracting pages of pdfs with 50 pages or more in parallel (default: 1)'
+    )
+
+    parser.add_argument(
+        '--ocr-max-dimension',
+        type=int,
+        help='longest side in pixels of images sent to OCR, larger images are downscaled (default: 1600)'
+    )
+
+    parser.add_argument(
+        '--ocr-batch-size',
+        type=int,
+        help='images sent to OCR at once (default: 8)'
+    )
+
+    parser.add_argument(
+        '--detectors',
+        type=parse_names,
+        help='comma separated detectors to run, models of other detectors are never loaded '
+        f'(default: {",".join(detector_registry.defaults)}, '
+        f'available: {",".join(detector_registry.classes)})'
+    )
+
+    parser.add_argument(
+        '--parsers',
+        type=parse_names,
+        help='comma separated parsers to use, files needing other parsers are skipped '
+        f'(default: all of {",".join(parser_registry.classes)})'
+    )
+
+    parser.add_argument(
+        '--cascade',
+        action='store_true',
+        help='run detectors in tiers, cheapest first: regex, then presidio and pii_catcher, '
+        'then pii_analyzer. Later tiers only run while the pii score of a file is below '
+        '--cascade-threshold. The summary records which tier decided each file'
+    )
+
+    parser.add_argument(
+        '--cascade-threshold',
+        type=float,
+        default=1.0,
+        help='pii score at which --cascade stops running detectors on a file (default: 1.0)'
+    )
+
+    parser.add_argument(
+        '--metrics',
+        type=pathlib.Path,
+        help='write wall time, cpu time, peak memory growth, bytes and characters of every '
+        'stage of every file as json lines, and print totals per stage at the end'
+    )
+
+    parser.add_argument(
+        '--profile',
+        metavar='STAGE',
+        help='run a stage under cProfile and print its slowest functions at the end, '
+        'e.g. extract, nlp, detect.presidio or score (needs --workers 1)'
+    )
+
+    parser.add_argument(
+        '--profile-output',
+        type=pathlib.Path,
+        default='profile.pstats',
+        help='file profile stats of --profile are dumped to (default: profile.pstats)'
+    )
+
+    args = vars(parser.parse_args())
+    folder_path = args['path']
+    results_path = args['results']
+    workers = args['workers']
+
+    if is_columnar(results_path) and importlib.util.find_spec('pyarrow') is None:
+        parser.error(f'writing {results_path.suffix} results needs pyarrow, pip install pyarrow')
+
+    if args['stream'] and is_columnar(results_path) and results_path.suffix != '.parquet':
+        parser.error('--stream writes columnar results as .parquet only')
+
+    if args['watch'] and args['stream']:
+        parser.error('--watch keeps results to rewrite the summary, it can\'t be used with --stream')
+
+    if args['watch'] and args['shard']:
+        parser.error('--watch scans the whole folder, it can\'t be used with --shard')
+
+    if args['prefetch_depth'] < 1:
+        parser.error('--prefetch-depth must be at least 1')
+
+    if args['chunk_size'] is not None and args['chunk_size'] < 1:
+        parser.error('--chunk-size must be at least 1')
+
+    if args['sample_size'] is not None and args['sample_size'] < 1:
+        parser.error('--sample-size must be at least 1')
+
+    if args['profile'] and workers > 1:
+        parser.error('--profile needs --workers 1, stages of workers are not profiled')
+
+    try:
+        configure_parsers({
+            'column_profile': args['column_profile'],
+            'sample_size': args['sample_size'],
+            'chunk_size': args['chunk_size'],
+            'pdf_max_pages': args['pdf_max_pages'],
+            'pdf_max_bytes': args['pdf_max_bytes'],
+            'pdf_page_workers': args['pdf_page_workers'],
+            'ocr_max_dimension': args['ocr_max_dimension'],
+            'ocr_batch_size': args['ocr_batch_size'],
+            'detectors': args['detectors'],
+            'parsers': args['parsers'],
+            'cascade': args['cascade'],
+            'cascade_threshold': args['cascade_threshold'],
+            'metrics': args['metrics'] is not None,
+            # peak rss is per process, so growth of prefetch threads would be
+            # added to the stage measured meanwhile, and they can't be profiled
+            'prefetch_threads': (
+                0 if args['profile'] or args['metrics'] is not None else args['prefetch_threads']),
+            'prefetch_depth': args['prefetch_depth'],
+            'prefetch_max_bytes': args['prefetch_max_mb'] * 1024 * 1024,
+            'include': args['include'],
+            'exclude': args['exclude'],
+            'max_depth': args['max_depth'],
+            'min_size': args['min_size'],
+            'max_size': args['max_size'],
+            'symlinks': args['symlinks'],
+            'prune': args['prune_dirs'],
+        })
+    except ValueError as e:
+        parser.error(str(e))
+
+    recorder.configure(
+        enabled=args['metrics'] is not None,
+        path=args['metrics'],
+        profile_stage=args['profile'],
+    )
+
+    cache = None
+    if args['cache']:
+        cache = ResultCache(
+            args['cache'], max_size_bytes=args['cache_max_mb'] * 1024 * 1024)
+
+    try:
+        if args['watch']:
+            FolderWatcher(
+                folder_path,
+                results_path,
+                workers=workers,
+                cache=cache,
+                dedup=args['dedup'],
+                debounce=args['watch_debounce'],
+                poll_interval=args['watch_poll'],
+                ignored=[
+                    path for path in [
+                        results_path, get_findings_path(results_path), args['cache'], args['metrics']]
+                    if path
+                ],
+            ).run()
+        elif args['stream']:
+            # detailed results are dropped once their row is written
+            # so memory doesn't grow with the number of files
+            with open_summary_writer(results_path) as writer:
+                for filepath, result in iter_parse_files(
+                        folder_path, workers=workers, cache=cache, shard=args['shard'],
+                        dedup=args['dedup']):
+                    writer.write_result(filepath, result)
+        else:
+            raw_results = parse_files(
+                folder_path, workers=workers, cache=cache, shard=args['shard'], dedup=args['dedup'])
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if not args['stream'] and not args['watch']:
+        write_results(raw_results, results_path)
+
+    report_metrics(args['profile'], args['profile_output'])
+
+
+# guard is needed so worker processes can import this module
+if __name__ == '__main__':
+    main()
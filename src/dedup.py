@@ -0,0 +1,109 @@
+import hashlib
+import os
+
+from metrics import measure_stage, recorder
+from result_cache import hash_file
+
+# bytes hashed at the start and at the end of files of the same size
+PARTIAL_HASH_SIZE = 64 * 1024
+
+
+def hash_file_ends(filepath, size, chunk_size=PARTIAL_HASH_SIZE):
+    """
+    Returns hash of the first and last chunk_size bytes of a file, cheap
+    to compute and enough to tell apart most files of the same size
+
+    Args:
+        filepath (str):
+        size (int): file size
+        chunk_size (int):
+
+    Returns:
+        str:
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        sha.update(f.read(chunk_size))
+        if size > chunk_size * 2:
+            f.seek(size - chunk_size)
+            sha.update(f.read(chunk_size))
+    return sha.hexdigest()
+
+
+def split_group(filepaths, get_key):
+    """
+    Splits files by key, keeping their order
+
+    Args:
+        filepaths (List[str]): files in one group
+        get_key (Callable[[str], str]): key of a file, files which
+            can't be read are left out
+
+    Returns:
+        dict: key -> files, only groups holding more than one file
+    """
+    groups = {}
+    for filepath in filepaths:
+        try:
+            with measure_stage('dedup', filepath):
+                key = get_key(filepath)
+        except Exception as e:
+            print(f'Error while hashing {filepath}: {e}. Scanning it on its own!')
+            continue
+        groups.setdefault(key, []).append(filepath)
+    return {key: group for key, group in groups.items() if len(group) > 1}
+
+
+def find_duplicates(files, cache=None):
+    """
+    Finds files with identical contents: files are grouped by type and size,
+    then by a hash of their ends, then by a hash of their whole contents.
+    Only files still sharing a group are read, and only as far as needed
+
+    Args:
+        files (Iterable[Tuple[str, str, os.DirEntry]]): (filepath, file_type, entry),
+            see filter_files_to_parse
+        cache (ResultCache): re-uses its content hashes of unchanged files, None to hash
+
+    Returns:
+        Tuple[List[Tuple[str, str, os.DirEntry]], dict]: files to scan, in order, one per group
+        of duplicates, and representative filepath -> (duplicate group id, paths
+        of its copies). Group ids are the start of the content hash, the same
+        on every run
+    """
+    files = list(files)
+    stats = {}
+    by_size = {}
+    for filepath, file_type, entry in files:
+        try:
+            with measure_stage('dedup', filepath):
+                # the walk's stat if it took one
+                stats[filepath] = entry.stat() if entry is not None else os.stat(filepath)
+        except OSError as e:
+            print(f'Error while reading size of {filepath}: {e}. Scanning it on its own!')
+            continue
+        # copies sniffed as different types are scanned by different parsers
+        by_size.setdefault((file_type, stats[filepath].st_size), []).append(filepath)
+
+    def get_content_hash(filepath):
+        if cache is not None:
+            return cache.get_content_hash(filepath, stats[filepath])
+        return hash_file(filepath)
+
+    duplicates = {}
+    for group in by_size.values():
+        if len(group) == 1:
+            continue
+        partial_groups = split_group(
+            group, lambda filepath: hash_file_ends(filepath, stats[filepath].st_size))
+        for partial_group in partial_groups.values():
+            for content_hash, content_group in split_group(partial_group, get_content_hash).items():
+                duplicates[content_group[0]] = (content_hash[:16], content_group[1:])
+
+    for filepath, _, _ in files:
+        recorder.flush(filepath)
+
+    copies = set([
+        filepath for _, group_copies in duplicates.values() for filepath in group_copies])
+    files_to_scan = [file for file in files if file[0] not in copies]
+    return files_to_scan, duplicates
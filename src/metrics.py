@@ -0,0 +1,270 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak rss isn't measured there
+    resource = None
+
+
+def get_peak_rss_kb():
+    """
+    Returns peak resident memory of this process in KB
+
+    Returns:
+        int: None if it can't be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+class MetricsRecorder:
+    """
+    Records wall time, cpu time, peak rss growth, input bytes and extracted
+    characters of every stage of the scan of every file.
+
+    Stages measured more than once for a file (e.g. pages of a pdf) are
+    added up. Worker processes only collect records of their files, which
+    are sent back with results and written by the main process as JSON
+    lines, along with an aggregate per stage and file type at the end.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output = None
+        # filepath -> stage -> record of stage not written yet
+        self.pending = {}
+        # (stage, file type) -> totals
+        self.summary = {}
+        self.profile_stage = None
+        self.profiler = None
+
+    def configure(self, enabled=False, path=None, profile_stage=None):
+        """
+        Enables recording
+
+        Args:
+            enabled (bool): record stages
+            path (str): JSON lines file records are written to, None to
+                only keep the aggregate
+            profile_stage (str): stage run under cProfile, None to not profile
+        """
+        self.close()
+        self.enabled = enabled or path is not None
+        if path is not None:
+            self.output = open(path, 'w')
+        self.profile_stage = profile_stage
+        if profile_stage is not None:
+            self.profiler = cProfile.Profile()
+
+    @contextmanager
+    def measure(self, stage, filepath=None):
+        """
+        Measures a stage, set input_bytes and chars on the yielded dict
+        to record them
+
+        Args:
+            stage (str): e.g. extract or detect.presidio
+            filepath (str|List[str]): file the stage ran for, a list
+                shares the stage evenly between files (e.g. batched OCR)
+
+        Yields:
+            dict:
+        """
+        measure = {'input_bytes': 0, 'chars': 0}
+        profile = self.profiler is not None and stage == self.profile_stage
+        if not self.enabled and not profile:
+            yield measure
+            return
+
+        rss_before = get_peak_rss_kb()
+        # cpu of this thread only, prefetch threads may be reading meanwhile
+        cpu_before = time.thread_time()
+        wall_before = time.perf_counter()
+        if profile:
+            self.profiler.enable()
+        try:
+            yield measure
+        finally:
+            if profile:
+                self.profiler.disable()
+            if self.enabled:
+                rss_after = get_peak_rss_kb()
+                filepaths = filepath if isinstance(filepath, list) else [filepath]
+                share = 1 / max(len(filepaths), 1)
+                for path in filepaths:
+                    self.add(path, stage, {
+                        'calls': 1,
+                        'wall_seconds': (time.perf_counter() - wall_before) * share,
+                        'cpu_seconds': (time.thread_time() - cpu_before) * share,
+                        'rss_peak_delta_kb': (
+                            rss_after - rss_before if rss_before is not None else None),
+                        'input_bytes': measure['input_bytes'] * share,
+                        'chars': measure['chars'] * share,
+                    })
+
+    def add(self, filepath, stage, values):
+        """
+        Adds values measured for a stage of a file to its pending record
+
+        Args:
+            filepath (str):
+            stage (str):
+            values (dict):
+        """
+        stages = self.pending.setdefault(filepath, {})
+        if stage not in stages:
+            stages[stage] = dict(values)
+            return
+        record = stages[stage]
+        for name in values:
+            if name == 'rss_peak_delta_kb':
+                if values[name] is not None:
+                    record[name] = max(record[name] or 0, values[name])
+            else:
+                record[name] += values[name]
+
+    def pop(self, filepath):
+        """
+        Returns pending records of a file, removing them
+
+        Args:
+            filepath (str):
+
+        Returns:
+            List[dict]:
+        """
+        records = []
+        for stage, record in self.pending.pop(filepath, {}).items():
+            record['filepath'] = filepath
+            record['stage'] = stage
+            records.append(record)
+        return records
+
+    def emit(self, records):
+        """
+        Writes records as JSON lines and adds them to the aggregate
+
+        Args:
+            records (List[dict]): see pop
+        """
+        if not self.enabled:
+            return
+        for record in records:
+            file_type = os.path.splitext(record['filepath'] or '')[1]
+            record['file_type'] = file_type
+            if self.output is not None:
+                self.output.write(json.dumps({'type': 'stage', **record}) + '\n')
+
+            totals = self.summary.setdefault((record['stage'], file_type), {
+                'stage': record['stage'],
+                'file_type': file_type,
+                'files': 0,
+                'calls': 0,
+                'wall_seconds': 0,
+                'cpu_seconds': 0,
+                'rss_peak_delta_kb': 0,
+                'input_bytes': 0,
+                'chars': 0,
+            })
+            totals['files'] += 1
+            for name in ['calls', 'wall_seconds', 'cpu_seconds', 'input_bytes', 'chars']:
+                totals[name] += record[name]
+            if record['rss_peak_delta_kb'] is not None:
+                totals['rss_peak_delta_kb'] = max(
+                    totals['rss_peak_delta_kb'], record['rss_peak_delta_kb'])
+
+    def flush(self, filepath):
+        """
+        Writes pending records of a file measured in this process
+
+        Args:
+            filepath (str):
+        """
+        self.emit(self.pop(filepath))
+
+    def get_summary(self):
+        """
+        Returns totals per stage and file type, slowest first
+
+        Returns:
+            List[dict]:
+        """
+        return sorted(self.summary.values(), key=lambda totals: -totals['wall_seconds'])
+
+    def get_profile_stats(self, limit=20):
+        """
+        Returns top functions of the profiled stage by cumulative time
+
+        Args:
+            limit (int): number of functions
+
+        Returns:
+            str:
+        """
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+
+    def close(self, profile_path=None):
+        """
+        Writes the aggregate summary and closes the JSON lines file
+
+        Args:
+            profile_path (str): file profile stats are dumped to, None to skip
+        """
+        if self.output is not None:
+            self.output.write(json.dumps({'type': 'summary', 'stages': self.get_summary()}) + '\n')
+            self.output.close()
+            self.output = None
+        if self.profiler is not None and profile_path is not None:
+            self.profiler.dump_stats(profile_path)
+
+
+# global recorder, configured by cli.py and scan workers
+recorder = MetricsRecorder()
+
+
+def measure_stage(stage, filepath=None):
+    """
+    Measures a stage with the global recorder, see MetricsRecorder.measure
+    """
+    return recorder.measure(stage, filepath)
+
+
+def format_summary(summary):
+    """
+    Formats aggregate summary as a table
+
+    Args:
+        summary (List[dict]): see MetricsRecorder.get_summary
+
+    Returns:
+        str:
+    """
+    lines = [
+        f'{"stage":<24} {"type":<8} {"files":>7} {"wall s":>10} {"cpu s":>10} '
+        f'{"rss+ MB":>8} {"in MB":>9} {"chars":>12}'
+    ]
+    for totals in summary:
+        lines.append(
+            f'{totals["stage"]:<24} {totals["file_type"] or "-":<8} {totals["files"]:>7} '
+            f'{totals["wall_seconds"]:>10.3f} {totals["cpu_seconds"]:>10.3f} '
+            f'{totals["rss_peak_delta_kb"] / 1024:>8.1f} {totals["input_bytes"] / 1024 / 1024:>9.2f} '
+            f'{int(totals["chars"]):>12}'
+        )
+    return '\n'.join(lines)
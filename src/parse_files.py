@@ -1,25 +1,103 @@
+import hashlib
+import multiprocessing
 import os
 
-from pathlib import Path
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import lru_cache
 
-from parsers.DefaultParser import DefaultParser
-from parsers.ImageParser import ImageParser
-from parsers.PdfParser import PdfParser
-from parsers.SheetParser import SheetParser
+from dedup import find_duplicates
+from metrics import measure_stage, recorder
+from parsers.registry import SNIFF_SIZE, detector_registry, parser_extensions, parser_registry, sniff_file_type
+from result_cache import hash_bytes, hash_file
+from walker import symlink_policies, walk_files, walk_options
 
-import streamlit as st
+# options parsers were configured with, see configure_parsers
+parser_options = {}
 
-from copy import deepcopy
+# reading ahead of the scan, see prefetch_files: threads reading files
+# (0 reads files when they are scanned), files read ahead at most and
+# size of the largest file read ahead, larger files are read by parsers.
+# Memory held by files read ahead is bounded by depth * max_bytes
+prefetch_options = {
+    'threads': 4,
+    'depth': 16,
+    'max_bytes': 16 * 1024 * 1024,
+}
 
-default_parser = DefaultParser()
-pdf_parser = PdfParser()
-image_parser = ImageParser()
-sheet_parser = SheetParser()
+
+def configure_parsers(options):
+    """
+    Selects parsers and detectors and sets their scan options, e.g. from
+    command line. Options which are not given keep their default value.
+    Parsers and detectors are only created when first used
+
+    Args:
+        options (dict): detectors and parsers hold lists of names to
+            enable, None enables defaults. cascade adds regex to detectors
+
+    Raises:
+        ValueError: if a detector or parser name or the symlink policy is unknown
+    """
+    if options.get('symlinks') is not None and options['symlinks'] not in symlink_policies:
+        raise ValueError(
+            f'Unknown symlink policy {options["symlinks"]}, choose from {", ".join(symlink_policies)}')
+
+    sheet_options = {}
+    for key in ['column_profile', 'sample_size']:
+        if options.get(key) is not None:
+            sheet_options[key] = options[key]
+
+    pdf_options = {}
+    for key in ['max_pages', 'max_bytes', 'page_workers']:
+        if options.get(f'pdf_{key}') is not None:
+            pdf_options[key] = options[f'pdf_{key}']
+
+    image_options = {}
+    for key in ['max_dimension', 'batch_size']:
+        if options.get(f'ocr_{key}') is not None:
+            image_options[key] = options[f'ocr_{key}']
+
+    presidio_options = {}
+    if options.get('chunk_size') is not None:
+        presidio_options['chunk_size'] = options['chunk_size']
+
+    detectors = options.get('detectors')
+    default_options = {}
+    if options.get('cascade'):
+        # cascade starts with the cheap regex tier
+        detectors = list(detectors if detectors is not None else detector_registry.defaults)
+        if 'regex' not in detectors:
+            detectors.insert(0, 'regex')
+        threshold = options.get('cascade_threshold')
+        default_options['cascade_threshold'] = 1.0 if threshold is None else threshold
+
+    parser_registry.configure(
+        options.get('parsers'),
+        {
+            'sheet': {**default_options, **sheet_options},
+            'pdf': {**default_options, **pdf_options},
+            'image': {**default_options, **image_options},
+            'default': default_options,
+        }
+    )
+    detector_registry.configure(detectors, {'presidio': presidio_options})
+
+    for key in ['threads', 'depth', 'max_bytes']:
+        if options.get(f'prefetch_{key}') is not None:
+            prefetch_options[key] = options[f'prefetch_{key}']
+
+    for key in walk_options:
+        if options.get(key) is not None:
+            walk_options[key] = options[key]
+
+    parser_options.clear()
+    parser_options.update(options)
 
 
 def list_filepaths(path):
     """
-    Yields file paths in folder
+    Yields file paths in folder, filtered by walk_options, see walk_files
 
     Args:
         path (str): folder path
@@ -27,11 +105,44 @@ def list_filepaths(path):
     Yields:
         Generator[str, None, None]: file path
     """
-    for root, dirs, files in os.walk(path):
-        for filename in files:
-            yield os.path.join(root, filename)
-        for dirname in dirs:
-            yield os.path.join(root, dirname)
+    for filepath, _ in walk_files(path, **walk_options):
+        yield filepath
+
+
+def get_shard_index(relative_path, shard_count):
+    """
+    Returns shard of a file from a hash of its path relative to the scanned
+    folder. Unlike hash(), the hash is the same in every process and on
+    every machine, wherever the folder is mounted
+
+    Args:
+        relative_path (str):
+        shard_count (int):
+
+    Returns:
+        int: from 1 to shard_count
+    """
+    normalized_path = relative_path.replace(os.sep, '/')
+    digest = hashlib.md5(normalized_path.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count + 1
+
+
+def filter_shard(entries, path, shard):
+    """
+    Yields files of a shard, see get_shard_index
+
+    Args:
+        entries (Iterable[Tuple[str, os.DirEntry]]): files in folder, see walk_files
+        path (str): folder path
+        shard (Tuple[int, int]): shard index from 1 and shard count
+
+    Yields:
+        Generator[Tuple[str, os.DirEntry], None, None]: file path and its entry
+    """
+    shard_index, shard_count = shard
+    for filepath, entry in entries:
+        if get_shard_index(os.path.relpath(filepath, path), shard_count) == shard_index:
+            yield filepath, entry
 
 
 def get_file_extension(filepath):
@@ -48,6 +159,40 @@ def get_file_extension(filepath):
     return filepath_tup[1]
 
 
+def sniff_file(filepath, file_extension):
+    """
+    Returns file type deciding which parser reads the file, using
+    only its first bytes. Empty files can't hold pii
+
+    Args:
+        filepath (str):
+        file_extension (str):
+
+    Returns:
+        str: see sniff_file_type, None if file should be skipped
+    """
+    with measure_stage('walk', filepath) as measure:
+        with open(filepath, 'rb') as f:
+            header = f.read(SNIFF_SIZE)
+        measure['input_bytes'] = len(header)
+        if len(header) == 0:
+            return None
+        return sniff_file_type(header, file_extension)
+
+
+def get_parser_name(file_extension):
+    """
+    Returns name of parser for file extension in parser registry
+
+    Args:
+        file_extension (str):
+
+    Returns:
+        str:
+    """
+    return parser_extensions.get(file_extension, 'default')
+
+
 def get_parser(file_extension):
     """
     Returns correct parser for file extension
@@ -56,30 +201,67 @@ def get_parser(file_extension):
         file_extension (str):
 
     Returns:
-        DefaultParser: parser of type DefaultParser or inheriting type DefaultParser
-    """
-    if file_extension in ['.csv', '.xls', '.xlsx']:
-        return sheet_parser
-    elif file_extension in ['.pdf']:
-        return pdf_parser
-    elif file_extension in ['.jpeg', '.png', '.jpg']:
-        return image_parser
-    else:
-        return default_parser
+        DefaultParser: parser of type DefaultParser or inheriting type DefaultParser,
+        None if the parser was not selected
+    """
+    parser_name = get_parser_name(file_extension)
+    if parser_name not in parser_registry:
+        return None
+    return parser_registry[parser_name]
+
+
+@lru_cache(maxsize=None)
+def get_user_name(uid):
+    """
+    Returns name of a user id. Memoized since every lookup may go through
+    nss to ldap, and a few owners own millions of files
+
+    Args:
+        uid (int):
+
+    Returns:
+        str: None if no user has the id
+    """
+    # only available on unix
+    import pwd
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_group_name(gid):
+    """
+    Returns name of a group id, memoized like get_user_name
 
+    Args:
+        gid (int):
 
-def get_file_metadata(filepath):
+    Returns:
+        str: None if no group has the id
+    """
+    # only available on unix
+    import grp
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return None
+
+
+def get_file_metadata(filepath, stat_info=None):
     """
     Return user, group, and size metadata
 
     Args:
         filepath (str):
+        stat_info (os.stat_result): stat of file if already taken, None to take it
 
     Returns:
         dict:
     """
-    path_obj = Path(filepath)
-    stat_info = os.stat(filepath)
+    if stat_info is None:
+        stat_info = os.stat(filepath)
 
     def is_running_on_windows():
         return os.name == 'nt'
@@ -87,30 +269,26 @@ def get_file_metadata(filepath):
     def get_owner():
         try:
             if is_running_on_windows():
-                # hack for @st.cache to work properly on macOS
-                # because this import tries to get cached 
-                # crashing the app on macOS
+                # imported here since it only works on windows
                 from get_file_metadata_windows import get_file_security
                 pSD = get_file_security(filepath)
                 owner_name, _, _ = pSD.get_owner()
                 return owner_name
             else:
-                return path_obj.owner()
+                return get_user_name(stat_info.st_uid) or 'unsupported'
         except:
             return 'unsupported'
 
     def get_group():
         try:
             if is_running_on_windows():
-                # hack for @st.cache to work properly on macOS
-                # because this import tries to get cached 
-                # crashing the app on macOS
+                # imported here since it only works on windows
                 from get_file_metadata_windows import get_file_security
                 pSD = get_file_security(filepath)
                 _, owner_domain, _ = pSD.get_owner()
                 return owner_domain
             else:
-                return path_obj.group()
+                return get_group_name(stat_info.st_gid) or 'unsupported'
         except:
             return 'unsupported'
 
@@ -121,50 +299,647 @@ def get_file_metadata(filepath):
         'last_modified': stat_info.st_mtime,
     }
 
-@st.cache
-def parse_file(filepath, file_extension):
+
+def parse_file(filepath, file_extension, data=None):
     """
     Parse file using right parser and detect piis
 
     Args:
         filepath (str):
         file_extension (str):
+        data (bytes): contents of file read ahead, None to read filepath
 
     Returns:
         dict: results
     """
     parser = get_parser(file_extension)
-    pii = parser.detect_pii(filepath, file_extension)
+    pii = parser.detect_pii(filepath, file_extension, data)
     return {
         'pii': pii,
     }
 
 
-def parse_files(path):
+def scan_file(filepath, file_extension, prefetched=None):
     """
-    Helper to run parse_file on every file
-    in a folder
+    Parse file and add its metadata.
+    Errors are printed and the file is skipped
 
     Args:
-        path (str): folder path
+        filepath (str):
+        file_extension (str):
+        prefetched (dict): contents and metadata read ahead, see read_ahead
 
     Returns:
-        dict: results
+        dict: results, None if file couldn't be parsed
     """
-    results = {}
-    for filepath in list_filepaths(path):
-        file_extension = get_file_extension(filepath)
-        # ignore directories
-        if len(file_extension) == 0:
+    prefetched = prefetched or {}
+    try:
+        result = parse_file(filepath, file_extension, prefetched.get('data'))
+        result['metadata'] = prefetched.get('metadata')
+        if result['metadata'] is None:
+            with measure_stage('metadata', filepath):
+                result['metadata'] = get_file_metadata(filepath)
+        # sent back with results when scanned in a worker
+        result['metrics'] = recorder.pop(filepath)
+        return result
+    except Exception as e:
+        print(f'Error while parsing {filepath}: {e}. Skipping!')
+        recorder.pop(filepath)
+        return None
+
+
+def init_worker(options):
+    """
+    Initializer for scan worker processes
+
+    Parsers and detectors are created on first use, this makes sure
+    models of selected detectors are loaded once here and kept warm
+    for every file of the worker
+
+    Args:
+        options (dict): parser options of main process, see configure_parsers
+    """
+    from parsers.detectors.StanfordNERService import get_ner_service
+
+    configure_parsers(options)
+    recorder.configure(enabled=options.get('metrics', False))
+
+    for detector_name in detector_registry:
+        detector_registry[detector_name]
+        print('Loaded', detector_name, 'in worker', os.getpid())
+    if 'pii_analyzer' in detector_registry:
+        get_ner_service()
+
+
+def scan_files(files):
+    """
+    Runs scan_file on a batch of files of the same parser,
+    parsers with a batch_size above 1 scan them at once
+
+    Args:
+        files (List[Tuple[str, str, dict]]): (filepath, file_extension,
+            contents and metadata read ahead or None, see read_ahead)
+
+    Returns:
+        List[Tuple[str, str, dict]]: filepath, file_extension and
+        results, None if the file couldn't be parsed
+    """
+    if len(files) == 1:
+        filepath, file_extension, prefetched = files[0]
+        return [(filepath, file_extension, scan_file(filepath, file_extension, prefetched))]
+
+    prefetched_files = [prefetched or {} for _, _, prefetched in files]
+    try:
+        parser = get_parser(files[0][1])
+        batch_pii = parser.detect_pii_batch(
+            [filepath for filepath, _, _ in files],
+            [file_extension for _, file_extension, _ in files],
+            [prefetched.get('data') for prefetched in prefetched_files]
+        )
+    except Exception as e:
+        print(f'Error while parsing batch of {len(files)} files: {e}. Scanning them one by one!')
+        return [
+            (filepath, file_extension, scan_file(filepath, file_extension, prefetched))
+            for filepath, file_extension, prefetched in files
+        ]
+
+    scanned = []
+    for (filepath, file_extension, _), prefetched, pii in zip(files, prefetched_files, batch_pii):
+        if pii is None:
+            # couldn't be read, the parser printed why
+            recorder.pop(filepath)
+            scanned.append((filepath, file_extension, None))
             continue
         try:
-            result = parse_file(filepath, file_extension)
-            result_copy = deepcopy(result)
-            
-            results[filepath] = result_copy
-            metadata = get_file_metadata(filepath)
-            results[filepath]['metadata'] = metadata
+            metadata = prefetched.get('metadata')
+            if metadata is None:
+                with measure_stage('metadata', filepath):
+                    metadata = get_file_metadata(filepath)
+            result = {
+                'pii': pii,
+                'metadata': metadata,
+                'metrics': recorder.pop(filepath),
+            }
         except Exception as e:
             print(f'Error while parsing {filepath}: {e}. Skipping!')
+            recorder.pop(filepath)
+            result = None
+        scanned.append((filepath, file_extension, result))
+    return scanned
+
+
+def list_files_to_parse(path):
+    """
+    Yields (filepath, file_type) for files in folder which should be parsed,
+    see filter_files_to_parse
+
+    Args:
+        path (str): folder path
+
+    Yields:
+        Generator[Tuple[str, str], None, None]:
+    """
+    for filepath, file_type, _ in filter_files_to_parse(walk_files(path, **walk_options)):
+        yield filepath, file_type
+
+
+def map_ahead(function, items, threads, depth):
+    """
+    Runs function on items in a pool of threads, up to depth items ahead
+    of the caller, so e.g. reads stalled on a network share overlap with
+    work on items already read. Items are pulled in the caller's thread,
+    and nothing more is run while the caller doesn't ask for results
+
+    Args:
+        function (Callable[[Any], Any]):
+        items (Iterable[Any]):
+        threads (int): 0 runs function in the caller's thread when asked
+        depth (int): most items run ahead of the caller
+
+    Yields:
+        Generator[Tuple[Any, Any, Exception], None, None]: item, result
+        and error raised by function (None if it returned), in order of items
+    """
+    if threads <= 0:
+        for item in items:
+            try:
+                result, error = function(item), None
+            except Exception as e:
+                result, error = None, e
+            yield item, result, error
+        return
+
+    def get_result(item, future):
+        error = future.exception()
+        return item, None if error is not None else future.result(), error
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append((item, executor.submit(function, item)))
+            if len(pending) >= depth:
+                yield get_result(*pending.popleft())
+        while pending:
+            yield get_result(*pending.popleft())
+    finally:
+        # caller stopped early, don't run items nobody reads
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def filter_files_to_parse(entries):
+    """
+    Yields (filepath, file_type, entry) for files which should be parsed.
+    Empty, binary and unsupported files are skipped before being read,
+    and so are files of parsers which can't be loaded, e.g. because a
+    dependency is missing. Files are sniffed by the prefetch threads,
+    see prefetch_options
+
+    Args:
+        entries (Iterable[Tuple[str, os.DirEntry]]): file paths and their
+            entries, see walk_files. Entry is None for files which weren't walked
+
+    Yields:
+        Generator[Tuple[str, str, os.DirEntry], None, None]: file type is the
+        extension of the parser to use, see sniff_file
+    """
+    sniffed = map_ahead(
+        lambda file: sniff_file(file[0], get_file_extension(file[0])),
+        entries,
+        prefetch_options['threads'],
+        prefetch_options['depth'],
+    )
+    # parser name -> error raised loading it, None if it loaded
+    load_errors = {}
+    for (filepath, entry), file_type, error in sniffed:
+        # records of the sniff threads are written by this thread
+        recorder.flush(filepath)
+        if error is not None:
+            print(f'Error while reading {filepath}: {error}. Skipping!')
+            continue
+        if file_type is None:
+            print('Skipping unsupported file', filepath)
+            continue
+        # ignore files of parsers which weren't selected
+        parser_name = get_parser_name(file_type)
+        if parser_name not in parser_registry:
+            continue
+        if parser_name not in load_errors:
+            try:
+                get_parser(file_type)
+                load_errors[parser_name] = None
+            except Exception as e:
+                print(f'Error while loading {parser_name} parser: {e}. Skipping its files!')
+                load_errors[parser_name] = e
+        if load_errors[parser_name] is not None:
+            print(f'Skipping {filepath}, its {parser_name} parser could not be loaded')
+            continue
+        yield filepath, file_type, entry
 
+
+def look_up_cache(files, cache):
+    """
+    Looks up files in result cache by the content hash it last saw for
+    them, in the scanning thread since sqlite connections can't be shared
+    between threads. Whether files changed since is checked by read_ahead
+
+    Args:
+        files (Iterable[Tuple[str, str, os.DirEntry]]): see filter_files_to_parse
+        cache (ResultCache): cache to look up, None to skip lookups
+
+    Yields:
+        Generator[Tuple[str, str, os.DirEntry, tuple, dict], None, None]: filepath,
+        file_extension, entry, size, mtime and content hash last seen, see
+        ResultCache.get_hashed_file, and result cached for that content hash,
+        None if unknown
+    """
+    for filepath, file_extension, entry in files:
+        hashed_file = None
+        cached = None
+        if cache is not None:
+            try:
+                with measure_stage('cache', filepath):
+                    hashed_file = cache.get_hashed_file(filepath)
+                    if hashed_file is not None:
+                        cached = cache.get(
+                            hashed_file[2], get_parser(file_extension).get_version())
+            except Exception as e:
+                print(f'Error while looking up {filepath} in cache: {e}')
+        yield filepath, file_extension, entry, hashed_file, cached
+
+
+def is_unchanged(hashed_file, metadata):
+    """
+    Returns whether a file has the size and mtime it was hashed with
+
+    Args:
+        hashed_file (tuple): see ResultCache.get_hashed_file, None if never hashed
+        metadata (dict): see get_file_metadata
+
+    Returns:
+        bool:
+    """
+    return hashed_file is not None and hashed_file[:2] == (
+        metadata['size_bytes'], metadata['last_modified'])
+
+
+def store_in_cache(cache, filepath, file_extension, result, content_hash=None):
+    """
+    Stores result of scan_file in result cache,
+    metadata is left out since it belongs to the path, not the contents
+
+    Args:
+        cache (ResultCache): None to skip
+        filepath (str):
+        file_extension (str):
+        result (dict): result of scan_file
+        content_hash (str): hash of contents computed ahead, see read_ahead,
+            None to get it from the cache
+    """
+    if cache is None or result is None:
+        return
+    try:
+        if content_hash is None:
+            content_hash = cache.get_content_hash(filepath)
+        cache.put(
+            content_hash,
+            get_parser(file_extension).get_version(),
+            {key: result[key] for key in result if key != 'metadata'}
+        )
+    except Exception as e:
+        print(f'Error while caching {filepath}: {e}')
+
+
+def read_ahead(filepath, entry=None, hashed_file=None, cached=None, hash_contents=False):
+    """
+    Reads metadata of a file, and its contents if it isn't larger than
+    prefetch_options max_bytes, ahead of the scan. With a result cache,
+    contents are hashed unless the file didn't change since it was last
+    hashed, and aren't read at all if a result is cached for them
+
+    Args:
+        filepath (str):
+        entry (os.DirEntry): entry the file was walked with, its stat is
+            re-used if the walk took it, None to stat the file
+        hashed_file (tuple): see look_up_cache
+        cached (dict): see look_up_cache
+        hash_contents (bool): hash contents for the result cache
+
+    Returns:
+        dict: data, None if the file is too large or cached, metadata
+        and content_hash, None without a cache
+    """
+    with measure_stage('metadata', filepath):
+        metadata = get_file_metadata(filepath, entry.stat() if entry is not None else None)
+    prefetched = {
+        'data': None,
+        'metadata': metadata,
+        'content_hash': None,
+    }
+    unchanged = is_unchanged(hashed_file, metadata)
+    if unchanged:
+        prefetched['content_hash'] = hashed_file[2]
+        if cached is not None:
+            return prefetched
+
+    if metadata['size_bytes'] <= prefetch_options['max_bytes']:
+        with measure_stage('read', filepath) as measure:
+            with open(filepath, 'rb') as f:
+                prefetched['data'] = f.read()
+            measure['input_bytes'] = len(prefetched['data'])
+    if hash_contents and not unchanged:
+        with measure_stage('cache', filepath):
+            if prefetched['data'] is not None:
+                prefetched['content_hash'] = hash_bytes(prefetched['data'])
+            else:
+                prefetched['content_hash'] = hash_file(filepath)
+    return prefetched
+
+
+def prefetch_files(files, cache=None, content_hashes=None):
+    """
+    Reads files to scan in the prefetch threads, up to prefetch_options
+    depth files ahead of the scan, so the scan works on files in memory
+    while the next ones are read.
+
+    With a result cache, the prefetch threads also stat and hash files,
+    only sqlite reads and writes run in the scanning thread, see
+    look_up_cache. Cached files which didn't change aren't read
+
+    Args:
+        files (Iterable[Tuple[str, str, os.DirEntry]]): see filter_files_to_parse
+        cache (ResultCache): result cache, None to always scan
+        content_hashes (dict): filled with filepath -> content hash of files
+            to scan, to store their results with, see store_in_cache
+
+    Yields:
+        Generator[Tuple[str, str, dict, dict], None, None]: filepath, file_extension,
+        cached result with fresh metadata, or None if the file needs to be scanned,
+        and contents and metadata read ahead, see read_ahead, None if the file is
+        cached or wasn't read ahead
+    """
+    def read(file):
+        filepath, _, entry, hashed_file, cached = file
+        return read_ahead(filepath, entry, hashed_file, cached, cache is not None)
+
+    prefetched_files = map_ahead(
+        read, look_up_cache(files, cache), prefetch_options['threads'], prefetch_options['depth'])
+    for (filepath, file_extension, _, hashed_file, cached), prefetched, error in prefetched_files:
+        if error is not None:
+            recorder.flush(filepath)
+            # parser reads the file itself, and reports errors
+            print(f'Error while reading {filepath} ahead: {error}')
+            yield filepath, file_extension, None, None
+            continue
+
+        metadata = prefetched['metadata']
+        content_hash = prefetched['content_hash']
+        if not is_unchanged(hashed_file, metadata):
+            # new or changed file, hashed by read_ahead
+            cached = None
+            if content_hash is not None:
+                try:
+                    with measure_stage('cache', filepath):
+                        cache.set_content_hash(
+                            filepath, metadata['size_bytes'], metadata['last_modified'], content_hash)
+                        cached = cache.get(
+                            content_hash, get_parser(file_extension).get_version())
+                except Exception as e:
+                    print(f'Error while looking up {filepath} in cache: {e}')
+        # records of the prefetch threads are written by this thread
+        recorder.flush(filepath)
+
+        if cached is not None:
+            cached['metadata'] = metadata
+            yield filepath, file_extension, cached, None
+            continue
+        if content_hash is not None and content_hashes is not None:
+            content_hashes[filepath] = content_hash
+        yield filepath, file_extension, None, prefetched
+
+
+def batch_files(files):
+    """
+    Groups files to scan in batches of their parser's batch_size,
+    so e.g. images are sent to OCR together
+
+    Args:
+        files (Iterable[Tuple[str, str, dict, dict]]): see prefetch_files
+
+    Yields:
+        Generator[List[Tuple[str, str, dict, dict]], None, None]: files of the same
+        parser, cached files are yielded alone
+    """
+    batches = {}
+    for filepath, file_extension, cached, prefetched in files:
+        batch_size = 1
+        if cached is None:
+            batch_size = get_parser(file_extension).batch_size
+        if batch_size <= 1:
+            yield [(filepath, file_extension, cached, prefetched)]
+            continue
+
+        parser_name = get_parser_name(file_extension)
+        batch = batches.setdefault(parser_name, [])
+        batch.append((filepath, file_extension, cached, prefetched))
+        if len(batch) >= batch_size:
+            yield batches.pop(parser_name)
+
+    for parser_name in batches:
+        yield batches[parser_name]
+
+
+def parse_files_in_pool(batches, workers):
+    """
+    Runs scan_files on batches of files using a pool of worker processes
+
+    Args:
+        batches (Iterable[List[Tuple[str, str, dict, dict]]]): see batch_files
+        workers (int): number of worker processes
+
+    Yields:
+        Generator[Tuple[str, str, dict, bool], None, None]: filepath, file_extension,
+        results and whether results came from cache
+    """
+    # spawn instead of fork because torch (easyocr) and
+    # open sockets (Stanford NER) are not fork safe
+    context = multiprocessing.get_context('spawn')
+    # bound number of queued batches so huge folders don't
+    # create millions of futures up front
+    max_pending = workers * 4
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(dict(parser_options),)) as executor:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                files = pending.pop(future)
+                try:
+                    scanned = future.result()
+                except Exception as e:
+                    print(f'Error while parsing {len(files)} file(s): {e}. Skipping!')
+                    scanned = [
+                        (filepath, file_extension, None)
+                        for filepath, file_extension in files
+                    ]
+                for filepath, file_extension, result in scanned:
+                    yield filepath, file_extension, result, False
+
+        for batch in batches:
+            filepath, file_extension, cached, _ = batch[0]
+            if cached is not None:
+                yield filepath, file_extension, cached, True
+                continue
+
+            files = [(filepath, file_extension, prefetched)
+                     for filepath, file_extension, _, prefetched in batch]
+            future = executor.submit(scan_files, files)
+            # contents read ahead aren't kept once sent
+            pending[future] = [(filepath, file_extension) for filepath, file_extension, _ in files]
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+
+def iter_scan_batches(batches):
+    """
+    Runs scan_files on batches of files in this process
+
+    Args:
+        batches (Iterable[List[Tuple[str, str, dict, dict]]]): see batch_files
+
+    Yields:
+        Generator[Tuple[str, str, dict, bool], None, None]: filepath, file_extension,
+        results and whether results came from cache
+    """
+    for batch in batches:
+        filepath, file_extension, cached, _ = batch[0]
+        if cached is not None:
+            yield filepath, file_extension, cached, True
+            continue
+
+        files = [(filepath, file_extension, prefetched)
+                 for filepath, file_extension, _, prefetched in batch]
+        for filepath, file_extension, result in scan_files(files):
+            yield filepath, file_extension, result, False
+
+
+def iter_parse_files(path, workers=1, cache=None, shard=None, dedup=False):
+    """
+    Runs scan_file on every file in a folder,
+    yielding results as soon as each file is done
+
+    Args:
+        path (str): folder path
+        workers (int): number of worker processes, 1 scans in this process
+        cache (ResultCache): result cache, None to always scan
+        shard (Tuple[int, int]): only scan files of this shard, see filter_shard
+        dedup (bool): scan one file of each group of identical files, see iter_parse_entries
+
+    Yields:
+        Generator[Tuple[str, dict], None, None]: filepath and results
+    """
+    entries = walk_files(path, **walk_options)
+    if shard is not None:
+        # before sniffing so files of other shards are never opened
+        entries = filter_shard(entries, path, shard)
+    yield from iter_parse_entries(entries, workers, cache, dedup)
+
+
+def iter_parse_filepaths(filepaths, workers=1, cache=None, dedup=False):
+    """
+    Runs scan_file on given files, see iter_parse_entries
+
+    Args:
+        filepaths (Iterable[str]):
+        workers (int): number of worker processes, 1 scans in this process
+        cache (ResultCache): result cache, None to always scan
+        dedup (bool): see iter_parse_entries
+
+    Yields:
+        Generator[Tuple[str, dict], None, None]: filepath and results
+    """
+    yield from iter_parse_entries(((filepath, None) for filepath in filepaths), workers, cache, dedup)
+
+
+def iter_parse_entries(entries, workers=1, cache=None, dedup=False):
+    """
+    Runs scan_file on given files, see iter_parse_files. Stats taken by the
+    walk, e.g. to filter files by size, are re-used for their metadata
+
+    Args:
+        entries (Iterable[Tuple[str, os.DirEntry]]): file paths and their
+            entries, see walk_files, None for files which weren't walked
+        workers (int): number of worker processes, 1 scans in this process
+        cache (ResultCache): result cache, None to always scan
+        dedup (bool): only scan the first file of each group of files with identical
+            contents, its results are given to the other files with their own metadata.
+            Results of files with copies hold the id of their duplicate_group
+
+    Yields:
+        Generator[Tuple[str, dict], None, None]: filepath and results
+    """
+    files = filter_files_to_parse(entries)
+    duplicates = {}
+    if dedup:
+        # needs every file before the first one is scanned
+        files, duplicates = find_duplicates(files, cache)
+    # filepath -> content hash of files to scan, computed ahead
+    content_hashes = {}
+    batches = batch_files(prefetch_files(files, cache, content_hashes))
+
+    if workers > 1:
+        scanned = parse_files_in_pool(batches, workers)
+    else:
+        scanned = iter_scan_batches(batches)
+
+    for filepath, file_extension, result, from_cache in scanned:
+        if result is not None:
+            recorder.emit(result.pop('metrics', []))
+        if not from_cache:
+            store_in_cache(cache, filepath, file_extension, result, content_hashes.pop(filepath, None))
+        if result is None:
+            continue
+        if filepath not in duplicates:
+            yield filepath, result
+            continue
+
+        duplicate_group, copies = duplicates[filepath]
+        result['duplicate_group'] = duplicate_group
+        yield filepath, result
+        for copy in copies:
+            try:
+                with measure_stage('metadata', copy):
+                    metadata = get_file_metadata(copy)
+            except Exception as e:
+                print(f'Error while reading metadata of {copy}: {e}. Skipping!')
+                continue
+            finally:
+                recorder.flush(copy)
+            yield copy, {**result, 'metadata': metadata}
+
+
+def parse_files(path, workers=1, cache=None, shard=None, dedup=False):
+    """
+    Helper to run parse_file on every file
+    in a folder
+
+    Args:
+        path (str): folder path
+        workers (int): number of worker processes, 1 scans in this process
+        cache (ResultCache): result cache, None to always scan
+        shard (Tuple[int, int]): only scan files of this shard, see filter_shard
+        dedup (bool): scan one file of each group of identical files, see iter_parse_entries
+
+    Returns:
+        dict: results
+    """
+    results = {}
+    for filepath, result in iter_parse_files(path, workers, cache, shard, dedup):
+        results[filepath] = result
     return results
@@ -1,9 +1,46 @@
-from parsers.detectors.PIIAnalyzerDetector import PIIAnalyzerDetector
-from parsers.detectors.PIICatcherDetector import PIICatcherDetector
-from parsers.detectors.PresidioDetector import PresidioDetector
+import io
+import os
+import re
+
 from pathlib import Path
 
+from metrics import measure_stage
 from parsers.detectors.DetectorInterface import DetectorInterface
+from parsers.detectors.SharedNlp import parse_doc
+from parsers.registry import cascade_tiers, detector_registry
+from pii_scores import calculate_overall_pii_score
+
+
+def open_file(path, data=None):
+    """
+    Opens file for reading bytes, from its contents if they were read ahead
+
+    Args:
+        path (str): file path
+        data (bytes): contents of file, None to read them from path
+
+    Returns:
+        BinaryIO:
+    """
+    if data is not None:
+        return io.BytesIO(data)
+    return open(path, 'rb')
+
+
+def get_input_bytes(path, data=None):
+    """
+    Returns size of file, without a stat if its contents were read ahead
+
+    Args:
+        path (str): file path
+        data (bytes): contents of file, None if not read
+
+    Returns:
+        int:
+    """
+    if data is not None:
+        return len(data)
+    return os.path.getsize(path)
 
 
 class DefaultParser():
@@ -25,25 +62,132 @@ class DefaultParser():
         unrtf poppler-utils pstotext tesseract-ocr flac ffmpeg lame  \
         libmad0 libsox-fmt-mp3 sox libjpeg-dev swig
     """
-    detectors = {
-        'pii_analyzer': PIIAnalyzerDetector(),
-        'pii_catcher': PIICatcherDetector(),
-        'presidio': PresidioDetector(),
-    }
+    # selected detectors, each is loaded on first use
+    detectors = detector_registry
+
+    # bump when a change to the parser changes its results
+    # so cached results are invalidated
+    version = '1'
+
+    # files scanned at once, see detect_pii_batch
+    batch_size = 1
+
+    def __init__(self, cascade_threshold=None):
+        # pii score at which the cascade stops running detectors,
+        # None runs every detector, see get_detector_tiers
+        self.cascade_threshold = cascade_threshold
 
-    def extract_text(self, path):
+    def get_version(self):
+        """
+        Returns string identifying parser, detectors and their
+        versions. Used to key cached results
+
+        Returns:
+            str:
+        """
+        # version is read from the class so detectors aren't loaded
+        detector_versions = ','.join([
+            self.get_detector_version(detector_name) for detector_name in sorted(self.detectors)
+        ])
+        version = f'{type(self).__name__}:{self.version};{detector_versions}'
+        if self.cascade_threshold is not None:
+            version += f';cascade:{self.cascade_threshold}'
+        return version
+
+    def get_detector_version(self, detector_name):
+        """
+        Returns string identifying a detector, its version and the options
+        it is created with, e.g. presidio:1(chunk_size=2000)
+
+        Args:
+            detector_name (str):
+
+        Returns:
+            str:
+        """
+        version = f'{detector_name}:{self.detectors.get_class(detector_name).version}'
+        options = self.detectors.options.get(detector_name, {})
+        if len(options) > 0:
+            version += '(' + ','.join([f'{key}={options[key]}' for key in sorted(options)]) + ')'
+        return version
+
+    def get_detector_tiers(self):
+        """
+        Returns selected detectors grouped in tiers run in order,
+        cheapest first. Without cascade all detectors are one tier
+
+        Returns:
+            List[List[str]]: detector names of each tier
+        """
+        if self.cascade_threshold is None:
+            return [list(self.detectors)]
+
+        tiers = [
+            [detector_name for detector_name in tier if detector_name in self.detectors]
+            for tier in cascade_tiers
+        ]
+        # selected detectors missing from cascade_tiers run last
+        tiered = [detector_name for tier in cascade_tiers for detector_name in tier]
+        tiers.append([
+            detector_name for detector_name in self.detectors if detector_name not in tiered])
+        return [tier for tier in tiers if len(tier) > 0]
+
+    def check_cascade(self, results, tiers, tier_index, text=None):
+        """
+        Decides whether the cascade stops after a tier: once the pii score
+        reaches cascade_threshold, or when text has no letters for NER
+        detectors of later tiers to find names in
+
+        Args:
+            results (dict): results of detectors run so far
+            tiers (List[List[str]]): see get_detector_tiers
+            tier_index (int): index of tier which just ran
+            text (str): text detectors ran on, None for sheets
+
+        Returns:
+            dict: tier which decided the file, None to run the next tier
+        """
+        if self.cascade_threshold is None:
+            return None
+
+        score = calculate_overall_pii_score({'pii': results})
+        if score >= self.cascade_threshold:
+            reason = 'threshold'
+        elif tier_index == len(tiers) - 1:
+            reason = 'last_tier'
+        elif text is not None and re.search('[a-zA-Z]', text) is None:
+            reason = 'no_letters'
+        else:
+            return None
+
+        return {
+            'tier': tier_index,
+            'detectors': tiers[tier_index],
+            'score': score,
+            'reason': reason,
+            # detectors which never ran
+            'skipped': [
+                detector_name for tier in tiers[tier_index + 1:] for detector_name in tier],
+        }
+
+    def extract_text(self, path, data=None):
         """
         Extract text from path
 
         Args:
             path (str): file path
+            data (bytes): contents of file read ahead, None to read path
 
         Returns:
             str: string contents of file
         """
         try:
+            if data is not None:
+                # decoded like read_text: locale encoding, universal newlines
+                return io.TextIOWrapper(io.BytesIO(data)).read()
             return Path(path).read_text()
         except Exception as e:
+            print(f'Error while reading text of {path}: {e}')
             return ''
 
     def clean_text(self, text):
@@ -61,31 +205,102 @@ class DefaultParser():
         # cleaning the text to remove extra whitespace
         return ' '.join([word for word in text_decode.split()])
 
-    def detect_pii(self, path, extension):
+    def detect_pii(self, path, extension, data=None):
         """
         Run pii detection using all detectors
 
         Args:
             path (str): file path
             extension (str): file extension
+            data (bytes): contents of file read ahead, None to read path
 
         Returns:
             dict: results
         """
         print('Running parser on', path)
 
-        text = self.extract_text(path)
-        text = self.clean_text(text)
+        with measure_stage('extract', path) as measure:
+            measure['input_bytes'] = get_input_bytes(path, data)
+            text = self.extract_text(path, data)
+            text = self.clean_text(text)
+            measure['chars'] = len(text)
+
+        # nothing to detect, don't pay for detectors
+        if len(text) == 0:
+            print('No text in', path)
+            return {}
 
+        return self.detect_pii_in_text(text, path)
+
+    def detect_pii_batch(self, paths, extensions, datas=None):
+        """
+        Run pii detection on several files at once,
+        parsers which can share work between files override it
+
+        Args:
+            paths (List[str]): file paths
+            extensions (List[str]): file extensions
+            datas (List[bytes]): contents of files read ahead, None
+                (or None items) to read paths
+
+        Returns:
+            List[dict]: results of each file, None for files which
+            couldn't be read
+        """
+        datas = datas or [None] * len(paths)
+        return [
+            self.detect_pii(path, extension, data)
+            for path, extension, data in zip(paths, extensions, datas)
+        ]
+
+    def detect_pii_in_text(self, text, path, page_number=None):
+        """
+        Run pii detection on cleaned text using all detectors
+
+        Args:
+            text (str): cleaned text, see clean_text
+            path (str): file path
+            page_number (int): page of the file text is from, used in logs
+
+        Returns:
+            dict: results, with the tier which decided the file
+            under cascade if the cascade is enabled
+        """
+        location = path if page_number is None else f'{path} page {page_number}'
         results = {}
 
-        for detector_name in self.detectors:
-            print('Running', detector_name, 'on', path)
-            try:
-                detector = self.detectors[detector_name]
-                results[detector_name] = detector.extract_pii_from_text(text)
-            except Exception as e:
-                print(
-                    f'Error while running {detector_name} on {path}: {e}. Skipping!')
+        doc = None
+        parsed = False
+        tiers = self.get_detector_tiers()
+        for tier_index, tier in enumerate(tiers):
+            # parse text once for every detector which can use a spaCy Doc,
+            # only when a tier needing it is reached
+            if not parsed and any([self.detectors[detector_name].uses_doc for detector_name in tier]):
+                parsed = True
+                try:
+                    with measure_stage('nlp', path) as measure:
+                        measure['chars'] = len(text)
+                        doc = parse_doc(text)
+                except Exception as e:
+                    print(f'Error while parsing text of {location}: {e}')
+
+            for detector_name in tier:
+                print('Running', detector_name, 'on', location)
+                try:
+                    with measure_stage(f'detect.{detector_name}', path) as measure:
+                        measure['chars'] = len(text)
+                        detector = self.detectors[detector_name]
+                        if doc is not None and detector.uses_doc:
+                            results[detector_name] = detector.extract_pii_from_doc(doc)
+                        else:
+                            results[detector_name] = detector.extract_pii_from_text(text)
+                except Exception as e:
+                    print(
+                        f'Error while running {detector_name} on {location}: {e}. Skipping!')
+
+            cascade = self.check_cascade(results, tiers, tier_index, text)
+            if cascade is not None:
+                results['cascade'] = cascade
+                break
 
         return results
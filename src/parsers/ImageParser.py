@@ -1,9 +1,9 @@
 # Notebook: https://colab.research.google.com/drive/1ueNhEeQvaZLNusZeyniCHW2zFHY1v4y_
 
-import easyocr
-import io
+import numpy as np
 
-from parsers.DefaultParser import DefaultParser
+from metrics import measure_stage
+from parsers.DefaultParser import DefaultParser, get_input_bytes, open_file
 
 from PIL import Image, ImageOps, ImageEnhance
 
@@ -11,26 +11,197 @@ from PIL import Image, ImageOps, ImageEnhance
 class ImageParser(DefaultParser):
     """
     Adds supports for extracting text from image
+
+    Images are converted to grayscale, contrast enhanced and downscaled
+    to max_dimension before OCR. Up to batch_size images are read at once,
+    images of similar sizes are sent to easyocr together, padded to the
+    size of the largest one.
     """
 
-    # global reader to be re-used
-    ocr_reader = easyocr.Reader(['en'])
+    # results changed to OCR of the preprocessed image, then images
+    # which couldn't be read stopped being cached as empty results
+    version = '3'
+
+    # global reader to be re-used, loaded on first use
+    _ocr_reader = None
+
+    def __init__(self, max_dimension=1600, batch_size=8, max_padding=1.5, cascade_threshold=None):
+        super().__init__(cascade_threshold)
+        # longest side of images sent to OCR, larger images are downscaled
+        self.max_dimension = max_dimension
+        # images read at once, see detect_pii_batch
+        self.batch_size = batch_size
+        # most pixels OCR runs on for an image padded in a batch, relative
+        # to its own size, see group_by_size
+        self.max_padding = max_padding
+
+    @property
+    def ocr_reader(self):
+        if ImageParser._ocr_reader is None:
+            import easyocr
+            ImageParser._ocr_reader = easyocr.Reader(['en'])
+        return ImageParser._ocr_reader
+
+    def get_version(self):
+        return super().get_version() + f';max_dimension:{self.max_dimension}'
+
+    def preprocess_image(self, path, data=None):
+        """
+        Loads image as grayscale, enhances contrast and
+        downscales it to max_dimension
+
+        Args:
+            path (str): file path
+            data (bytes): contents of file read ahead, None to read path
 
-    def extract_text(self, path):
-        im = Image.open(path)
+        Returns:
+            PIL.Image.Image:
+        """
+        with open_file(path, data) as f:
+            im = Image.open(f)
+            # decoded before the file is closed
+            im.load()
         # convert image to grayscale
         im = ImageOps.grayscale(im)
         # increase image contrast 2x
         im = ImageEnhance.Contrast(im).enhance(2)
-        # save imag to byte buffer
-        img_byte_arr = io.BytesIO()
-        im.save(img_byte_arr, format='PNG')
-        # extract text from image
-        img_byte_arr = img_byte_arr.getvalue()
-        ocr_output = self.ocr_reader.readtext(
-            path,
-            detail=0,
-            paragraph=True,
-        )
-        # convert array of text to string
-        return '\n'.join(ocr_output)
+        # OCR time grows with pixels, text stays readable when downscaled
+        if max(im.size) > self.max_dimension:
+            im.thumbnail((self.max_dimension, self.max_dimension))
+        return im
+
+    def pad_images(self, images):
+        """
+        Pads images with white to the size of the largest one,
+        easyocr needs images of a batch to have the same size
+
+        Args:
+            images (List[PIL.Image.Image]):
+
+        Returns:
+            List[np.ndarray]:
+        """
+        width = max([im.size[0] for im in images])
+        height = max([im.size[1] for im in images])
+        padded = []
+        for im in images:
+            if im.size != (width, height):
+                background = Image.new('L', (width, height), 255)
+                background.paste(im, (0, 0))
+                im = background
+            padded.append(np.asarray(im))
+        return padded
+
+    def group_by_size(self, images):
+        """
+        Groups images which can be padded to the same size without growing
+        any of them more than max_padding times, so a large image doesn't
+        make OCR run on a large canvas for every small image of its batch
+
+        Args:
+            images (List[PIL.Image.Image]):
+
+        Returns:
+            List[List[int]]: indexes of images of each group
+        """
+        def get_area(size):
+            return size[0] * size[1]
+
+        groups = []
+        width, height = 0, 0
+        # largest first, each image is the smallest of its group when added
+        for index in sorted(range(len(images)), key=lambda index: -get_area(images[index].size)):
+            im_width, im_height = images[index].size
+            canvas = (max(width, im_width), max(height, im_height))
+            if len(groups) > 0 and get_area(canvas) <= self.max_padding * get_area(images[index].size):
+                groups[-1].append(index)
+                width, height = canvas
+            else:
+                groups.append([index])
+                width, height = im_width, im_height
+        return groups
+
+    def extract_texts(self, paths, datas=None):
+        """
+        Extracts text from images with one OCR call per group of images
+        of similar sizes, see group_by_size. Preprocessing is measured
+        per image and OCR shared evenly between the images of a group
+
+        Args:
+            paths (List[str]): file paths
+            datas (List[bytes]): contents of files read ahead, None
+                (or None items) to read paths
+
+        Returns:
+            List[str]: text of each image, None for images which couldn't be read
+        """
+        texts = [None] * len(paths)
+        datas = datas or [None] * len(paths)
+
+        images = []
+        indexes = []
+        for index, (path, data) in enumerate(zip(paths, datas)):
+            try:
+                with measure_stage('preprocess', path) as measure:
+                    measure['input_bytes'] = get_input_bytes(path, data)
+                    images.append(self.preprocess_image(path, data))
+                indexes.append(index)
+            except Exception as e:
+                print(f'Error while reading image {path}: {e}. Skipping!')
+
+        if len(images) == 0:
+            return texts
+
+        for group in self.group_by_size(images):
+            group_images = [images[position] for position in group]
+            group_indexes = [indexes[position] for position in group]
+            with measure_stage('ocr', [paths[index] for index in group_indexes]) as measure:
+                if len(group_images) == 1:
+                    ocr_outputs = [self.ocr_reader.readtext(
+                        np.asarray(group_images[0]),
+                        detail=0,
+                        paragraph=True,
+                    )]
+                else:
+                    ocr_outputs = self.ocr_reader.readtext_batched(
+                        self.pad_images(group_images),
+                        detail=0,
+                        paragraph=True,
+                        batch_size=len(group_images),
+                    )
+                for index, ocr_output in zip(group_indexes, ocr_outputs):
+                    # convert array of text to string
+                    texts[index] = '\n'.join(ocr_output)
+                measure['chars'] = sum([len(texts[index]) for index in group_indexes])
+
+        return texts
+
+    def extract_text(self, path, data=None):
+        text = self.extract_texts([path], [data])[0]
+        if text is None:
+            raise ValueError(f'Could not read image {path}')
+        return text
+
+    def detect_pii(self, path, extension, data=None):
+        results = self.detect_pii_batch([path], [extension], [data])[0]
+        if results is None:
+            raise ValueError(f'Could not read image {path}')
+        return results
+
+    def detect_pii_batch(self, paths, extensions, datas=None):
+        print('Running image parser on', len(paths), 'image(s)')
+
+        texts = self.extract_texts(paths, datas)
+        batch_results = []
+        for path, text in zip(paths, texts):
+            if text is None:
+                # not cached, read again on the next scan
+                batch_results.append(None)
+                continue
+            text = self.clean_text(text)
+            if len(text) == 0:
+                print('No text in', path)
+                batch_results.append({})
+            else:
+                batch_results.append(self.detect_pii_in_text(text, path))
+        return batch_results
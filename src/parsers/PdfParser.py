@@ -1,8 +1,15 @@
 # Adapter from https://pdfminersix.readthedocs.io/en/latest/tutorial/composable.html
 
+import atexit
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
 from io import StringIO
+from itertools import islice
 
-from parsers.DefaultParser import DefaultParser
+from metrics import measure_stage
+from parsers.DefaultParser import DefaultParser, get_input_bytes, open_file
+from pii_scores import calculate_overall_pii_score, get_pii_count
 
 from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
@@ -10,21 +17,324 @@ from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+
+
+def get_page_count(doc, path):
+    """
+    Returns number of pages from document catalog
+
+    Args:
+        doc (PDFDocument):
+        path (str): file path, for error messages
+
+    Returns:
+        int: None if the catalog doesn't hold it
+    """
+    try:
+        return int(resolve1(doc.catalog['Pages'])['Count'])
+    except Exception as e:
+        print(f'Error while counting pages of {path}: {e}')
+        return None
+
+
+def iter_document_pages(doc, start=0, end=None):
+    """
+    Extracts text of pages of an open pdf one page at a time
+
+    Args:
+        doc (PDFDocument):
+        start (int): index of first page
+        end (int): index after last page, None for last page of document
+
+    Yields:
+        Generator[Tuple[int, str, bool], None, None]: page number (from 1),
+        text of page and whether page holds images or other objects
+    """
+    output_string = StringIO()
+    rsrcmgr = PDFResourceManager()
+    device = TextConverter(rsrcmgr, output_string, laparams=LAParams())
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    pages = islice(PDFPage.create_pages(doc), start, end)
+    for page_index, page in enumerate(pages, start):
+        interpreter.process_page(page)
+        text = output_string.getvalue()
+        # only one page of text is held at a time
+        output_string.seek(0)
+        output_string.truncate(0)
+
+        xobjects = resolve1((page.resources or {}).get('XObject')) or {}
+        yield page_index + 1, text, len(xobjects) > 0
+
+
+def iter_page_range(path, start=0, end=None, data=None):
+    """
+    Opens a pdf and extracts text of its pages one page at a time
+
+    Args:
+        path (str): file path
+        start, end: see iter_document_pages
+        data (bytes): contents of file read ahead, None to read path
+
+    Yields:
+        Generator[Tuple[int, str, bool], None, None]: see iter_document_pages
+    """
+    with open_file(path, data) as in_file:
+        yield from iter_document_pages(PDFDocument(PDFParser(in_file)), start, end)
+
+
+def extract_page_range(path, start, end):
+    """
+    Same as iter_page_range returning a list, runs in page worker processes
+    """
+    return list(iter_page_range(path, start, end))
 
 
 class PdfParser(DefaultParser):
     """
     Adds supports for extracting text from pdf
+
+    Pages are extracted and sent to detectors one at a time, so memory
+    doesn't grow with the size of the document. Findings are tagged with
+    the pages they were found on and pages without a text layer (e.g.
+    scans) are flagged as needing OCR. With the cascade enabled, pages
+    stop being scanned once the score of the document reaches the threshold.
     """
 
-    def extract_text(self, path):
-        output_string = StringIO()
-        with open(path, 'rb') as in_file:
-            parser = PDFParser(in_file)
-            doc = PDFDocument(parser)
-            rsrcmgr = PDFResourceManager()
-            device = TextConverter(rsrcmgr, output_string, laparams=LAParams())
-            interpreter = PDFPageInterpreter(rsrcmgr, device)
-            for page in PDFPage.create_pages(doc):
-                interpreter.process_page(page)
-        return output_string.getvalue()
+    # results changed to page by page detection
+    version = '2'
+
+    def __init__(self, max_pages=None, max_bytes=None, page_workers=1,
+                 pages_per_task=10, parallel_min_pages=50, cascade_threshold=None):
+        super().__init__(cascade_threshold)
+        # most pages scanned per document, None for every page
+        self.max_pages = max_pages
+        # most bytes of text scanned per document, None for no limit
+        self.max_bytes = max_bytes
+        # processes extracting pages of large documents in parallel
+        self.page_workers = page_workers
+        # pages extracted by a page worker at once
+        self.pages_per_task = pages_per_task
+        # documents with fewer pages are extracted in this process
+        self.parallel_min_pages = parallel_min_pages
+        # page worker processes, started on first large document
+        # and kept for the next ones
+        self._page_pool = None
+
+    def get_version(self):
+        version = super().get_version()
+        if self.max_pages is not None or self.max_bytes is not None:
+            version += f';budget:{self.max_pages},{self.max_bytes}'
+        return version
+
+    def get_page_pool(self):
+        """
+        Returns pool of page worker processes, started on first call
+        and shut down when the scan exits, see close
+
+        Returns:
+            ProcessPoolExecutor:
+        """
+        if self._page_pool is None:
+            # spawn for the same reasons as the file worker pool
+            context = multiprocessing.get_context('spawn')
+            self._page_pool = ProcessPoolExecutor(max_workers=self.page_workers, mp_context=context)
+            atexit.register(self.close)
+        return self._page_pool
+
+    def close(self):
+        """
+        Shuts down page worker processes, a later large document starts them again
+        """
+        if self._page_pool is None:
+            return
+        self._page_pool.shutdown(wait=True, cancel_futures=True)
+        self._page_pool = None
+        atexit.unregister(self.close)
+
+    def iter_pages_in_pool(self, path, page_count):
+        """
+        Extracts pages with a pool of page worker processes,
+        yielding them in order
+
+        Args:
+            path (str): file path
+            page_count (int): number of pages to extract
+
+        Yields:
+            Generator[Tuple[int, str, bool], None, None]: see iter_page_range
+        """
+        executor = self.get_page_pool()
+        starts = range(0, page_count, self.pages_per_task)
+        # bound extracted pages waiting to be scanned
+        max_pending = self.page_workers * 2
+
+        pending = []
+        try:
+            for start in starts:
+                end = min(start + self.pages_per_task, page_count)
+                pending.append(executor.submit(
+                    extract_page_range, path, start, end))
+                if len(pending) >= max_pending:
+                    yield from pending.pop(0).result()
+            while pending:
+                yield from pending.pop(0).result()
+        finally:
+            # budget reached or error, don't extract pages nobody reads
+            for future in pending:
+                future.cancel()
+
+    def iter_pages(self, path, data=None, document=None):
+        """
+        Yields pages of a pdf until max_pages is reached, extracting them
+        in parallel if the document is large and page_workers is set
+
+        Args:
+            path (str): file path
+            data (bytes): contents of file read ahead, None to read path.
+                Page workers read path themselves
+            document (dict): page_count of the document is set in it
+                once the document is open, see get_page_count
+
+        Yields:
+            Generator[Tuple[int, str, bool], None, None]: see iter_document_pages
+        """
+        with open_file(path, data) as in_file:
+            doc = PDFDocument(PDFParser(in_file))
+            page_count = get_page_count(doc, path)
+            if document is not None:
+                document['page_count'] = page_count
+
+            if self.page_workers > 1 and page_count is not None:
+                if self.max_pages is not None:
+                    page_count = min(page_count, self.max_pages)
+                if page_count >= self.parallel_min_pages:
+                    yield from self.iter_pages_in_pool(path, page_count)
+                    return
+
+            yield from iter_document_pages(doc, 0, self.max_pages)
+
+    def extract_text(self, path, data=None):
+        texts = []
+        text_bytes = 0
+        for _, text, _ in self.iter_pages(path, data):
+            texts.append(text)
+            text_bytes += len(text.encode())
+            if self.max_bytes is not None and text_bytes >= self.max_bytes:
+                break
+        return ''.join(texts)
+
+    def merge_page_results(self, results, page_results):
+        """
+        Adds results of a page to results of the document
+
+        Args:
+            results (dict): results of document so far, updated in place
+            page_results (dict): results of detect_pii_in_text for a page
+        """
+        for detector_name in page_results:
+            detector_results = results.setdefault(detector_name, {})
+            for pii_name, value in page_results[detector_name].items():
+                if pii_name not in detector_results:
+                    detector_results[pii_name] = value
+                elif isinstance(value, dict):
+                    detector_results[pii_name]['count'] += value['count']
+                    detector_results[pii_name]['values'].extend(value['values'])
+                elif isinstance(value, list):
+                    detector_results[pii_name].extend(value)
+                # other detectors only report which pii was found
+
+    def detect_pii(self, path, extension, data=None):
+        print('Running pdf parser on', path)
+
+        results = {}
+        # detector -> pii -> page numbers it was found on
+        findings = {}
+        needs_ocr = []
+        pages_scanned = 0
+        text_bytes = 0
+        truncated = False
+        tiers = self.get_detector_tiers()
+        # highest tier run on any page
+        last_tier = -1
+        score = 0
+
+        document = {'page_count': None}
+        pages = self.iter_pages(path, data, document)
+        input_bytes = get_input_bytes(path, data)
+        while True:
+            with measure_stage('extract', path) as measure:
+                page = next(pages, None)
+                if page is not None:
+                    measure['chars'] = len(page[1])
+                # size of the file counted once
+                measure['input_bytes'] = input_bytes
+                input_bytes = 0
+            if page is None:
+                break
+
+            page_number, text, has_objects = page
+            if self.max_bytes is not None and text_bytes >= self.max_bytes:
+                truncated = True
+                break
+            pages_scanned += 1
+            text = self.clean_text(text)
+
+            if len(text) == 0:
+                # page with images but no text layer, e.g. a scan
+                if has_objects:
+                    needs_ocr.append(page_number)
+                continue
+            text_bytes += len(text.encode())
+
+            page_results = self.detect_pii_in_text(text, path, page_number)
+            page_cascade = page_results.pop('cascade', None)
+            if page_cascade is not None:
+                last_tier = max(last_tier, page_cascade['tier'])
+            for detector_name in page_results:
+                for pii_name, value in page_results[detector_name].items():
+                    if get_pii_count(value) > 0:
+                        findings.setdefault(detector_name, {}).setdefault(
+                            pii_name, []).append(page_number)
+            self.merge_page_results(results, page_results)
+
+            if self.cascade_threshold is not None:
+                score = calculate_overall_pii_score({'pii': results})
+                if score >= self.cascade_threshold:
+                    break
+
+        # cancels pending page tasks if the budget or cascade threshold was reached
+        pages.close()
+
+        page_count = document['page_count']
+        decided = self.cascade_threshold is not None and score >= self.cascade_threshold
+        if page_count is not None and pages_scanned < page_count and not decided:
+            truncated = True
+
+        if self.cascade_threshold is not None and last_tier >= 0:
+            if decided:
+                reason = 'threshold'
+            elif last_tier == len(tiers) - 1:
+                reason = 'last_tier'
+            else:
+                reason = 'no_letters'
+            results['cascade'] = {
+                'tier': last_tier,
+                'detectors': tiers[last_tier],
+                'score': score,
+                'reason': reason,
+                'skipped': [
+                    detector_name for tier in tiers[last_tier + 1:] for detector_name in tier],
+            }
+
+        if len(needs_ocr) > 0:
+            print(f'{len(needs_ocr)} page(s) of {path} need OCR: no text layer')
+
+        results['pdf_pages'] = {
+            'page_count': page_count,
+            'pages_scanned': pages_scanned,
+            'truncated': truncated,
+            'needs_ocr': needs_ocr,
+            'findings': findings,
+        }
+        return results
@@ -1,54 +1,289 @@
+import re
+
 import pandas as pd
 
-from parsers.DefaultParser import DefaultParser
+from metrics import measure_stage
+from parsers.DefaultParser import DefaultParser, get_input_bytes, open_file
+from pii_scores import get_pii_count, get_pii_values
 
 
 class SheetParser(DefaultParser):
     """
     Adds supports for detecting PII from excel files
+
+    With column_profile enabled, PII is detected per column from a sample
+    of its values instead of sending every cell to every detector.
+    Sampling stops early once a column is classified and counts are
+    estimated for the full column, so scan time depends on the number
+    of columns and not on the number of cells. Column profiling samples
+    every detector, the cascade only applies to whole sheets.
     """
 
-    def load_csv(self, path):
+    # words in column headers hinting at which pii a column holds
+    header_pii_keywords = {
+        'name': ['PERSON'],
+        'first name': ['PERSON'],
+        'last name': ['PERSON'],
+        'full name': ['PERSON'],
+        'surname': ['PERSON'],
+        'email': ['EMAIL_ADDRESS'],
+        'e mail': ['EMAIL_ADDRESS'],
+        'phone': ['PHONE_NUMBER'],
+        'mobile': ['PHONE_NUMBER'],
+        'telephone': ['PHONE_NUMBER'],
+        'ssn': ['US_SSN'],
+        'social security': ['US_SSN'],
+        'address': ['LOCATION', 'ADDRESS'],
+        'street': ['LOCATION', 'ADDRESS'],
+        'city': ['LOCATION'],
+        'country': ['LOCATION'],
+        'birth': ['DATE_TIME', 'BIRTH_DATE'],
+        'dob': ['DATE_TIME', 'BIRTH_DATE'],
+        'date': ['DATE_TIME'],
+        'gender': ['GENDER'],
+        'nationality': ['NRP', 'NATIONALITY'],
+        'ip': ['IP_ADDRESS'],
+        'credit card': ['CREDIT_CARD'],
+        'card number': ['CREDIT_CARD'],
+        'iban': ['IBAN_CODE'],
+        'passport': ['US_PASSPORT'],
+        'license': ['US_DRIVER_LICENSE'],
+        'username': ['USER_NAME'],
+        'password': ['PASSWORD'],
+    }
+
+    # bump when a change to column profiling changes its results,
+    # only profiled results are invalidated
+    profile_version = '2'
+
+    def __init__(self, column_profile=False, sample_size=100, sample_batch_size=20,
+                 min_samples=20, confidence=0.8, random_state=0, cascade_threshold=None):
+        super().__init__(cascade_threshold)
+        self.column_profile = column_profile
+        # most values sampled per column
+        self.sample_size = sample_size
+        # values sent to detectors at once, classification is checked after each batch
+        self.sample_batch_size = sample_batch_size
+        # values sampled before a column can be classified
+        self.min_samples = min_samples
+        # share of sampled values which need to hold a pii to classify a column
+        self.confidence = confidence
+        self.random_state = random_state
+
+    def get_version(self):
+        version = super().get_version()
+        if self.column_profile:
+            version += (f';profile{self.profile_version}:{self.sample_size},{self.sample_batch_size},'
+                        f'{self.min_samples},{self.confidence},{self.random_state}')
+        return version
+
+    def load_csv(self, path, data=None):
         """
         Loads csv file into dataframe
 
         Args:
             path (str): filepath
+            data (bytes): contents of file read ahead, None to read path
 
         Returns:
             pd.DataFrame:
         """
-        return pd.read_csv(path)
+        with open_file(path, data) as f:
+            return pd.read_csv(f)
 
-    def load_excel(self, path):
+    def load_excel(self, path, data=None):
         """
         Loads excel file into dataframe
 
         Args:
             path (str): filepath
+            data (bytes): contents of file read ahead, None to read path
 
         Returns:
             pd.DataFrame:
         """
-        return pd.DataFrame(pd.read_excel(path))
+        with open_file(path, data) as f:
+            return pd.DataFrame(pd.read_excel(f))
+
+    def get_header_pii_types(self, header):
+        """
+        Returns pii types hinted by a column header
+
+        Args:
+            header (str):
+
+        Returns:
+            set:
+        """
+        words = ' '.join(re.split(r'[^a-z0-9]+', str(header).lower())).strip()
+        pii_types = set()
+        for keyword in self.header_pii_keywords:
+            if re.search(rf'\b{keyword}\b', words):
+                pii_types.update(self.header_pii_keywords[keyword])
+        return pii_types
+
+    def classify_column(self, column_counts, sampled, header_pii_types):
+        """
+        Classifies a column from the pii counted in its sampled values
+
+        Args:
+            column_counts (dict): detector name -> pii name -> count
+            sampled (int): number of values sampled so far
+            header_pii_types (set): see get_header_pii_types
+
+        Returns:
+            Tuple[str, float, bool]: pii type (None for no pii), confidence and
+            whether sampling can stop
+        """
+        rates = {}
+        for detector_name in column_counts:
+            for pii_name in column_counts[detector_name]:
+                rate = min(column_counts[detector_name][pii_name] / sampled, 1)
+                rates[pii_name] = max(rates.get(pii_name, 0), rate)
+
+        enough_samples = sampled >= self.min_samples
+
+        if len(rates) == 0:
+            return None, 1.0, enough_samples
+
+        # a pii hinted by the header needs less evidence
+        header_rates = {
+            pii_name: rates[pii_name]
+            for pii_name in rates
+            if pii_name in header_pii_types
+        }
+        if len(header_rates) > 0:
+            pii_type = max(header_rates, key=header_rates.get)
+            if header_rates[pii_type] >= 0.5:
+                return pii_type, header_rates[pii_type], enough_samples
+
+        pii_type = max(rates, key=rates.get)
+        return pii_type, rates[pii_type], enough_samples and rates[pii_type] >= self.confidence
 
-    def detect_pii(self, path, extension):
+    def profile_columns(self, df, path=''):
+        """
+        Detects pii column by column from samples of non null values
+
+        Args:
+            df (pd.DataFrame):
+            path (str): file path, used in logs
+
+        Returns:
+            dict: results with estimated counts per detector and column_profile,
+            profiles keyed by column position since headers can repeat
+        """
+        results = {}
+        column_profile = {}
+
+        for column_index in range(df.shape[1]):
+            header = str(df.columns[column_index])
+            values = df.iloc[:, column_index].dropna()
+            non_null = len(values)
+            header_pii_types = self.get_header_pii_types(header)
+
+            sample = values.sample(
+                n=min(self.sample_size, non_null), random_state=self.random_state)
+
+            column_counts = {}
+            column_values = {}
+            sampled = 0
+            pii_type, confidence = None, 1.0
+
+            for start in range(0, len(sample), self.sample_batch_size):
+                batch = sample.iloc[start:start + self.sample_batch_size].to_frame(header)
+
+                for detector_name in self.detectors:
+                    try:
+                        with measure_stage(f'detect.{detector_name}', path):
+                            detector = self.detectors[detector_name]
+                            pii = detector.extract_pii_from_df(batch)
+                    except Exception as e:
+                        print(
+                            f'Error while running {detector_name} on {path} column {header}: {e}. Skipping!')
+                        continue
+
+                    if not detector.reports_counts:
+                        # nothing to extrapolate, keep what was found as is
+                        found = results.setdefault(detector_name, {})
+                        for pii_name in pii:
+                            found.setdefault(pii_name, pii[pii_name])
+                        continue
+
+                    counts = column_counts.setdefault(detector_name, {})
+                    found_values = column_values.setdefault(detector_name, {})
+                    for pii_name in pii:
+                        if pii_name == 'df_pii':
+                            continue
+                        counts[pii_name] = counts.get(
+                            pii_name, 0) + get_pii_count(pii[pii_name])
+                        found_values.setdefault(pii_name, []).extend(
+                            get_pii_values(pii[pii_name]))
+
+                sampled += len(batch)
+                pii_type, confidence, done = self.classify_column(
+                    column_counts, sampled, header_pii_types)
+                if done:
+                    break
+
+            column_profile[column_index] = {
+                'header': header,
+                'pii_type': pii_type,
+                'confidence': confidence,
+                'header_pii_types': sorted(header_pii_types),
+                'sampled': sampled,
+                'non_null': non_null,
+            }
+
+            # extrapolate counts in sample to the whole column
+            scale = non_null / sampled if sampled > 0 else 0
+            for detector_name in column_counts:
+                detector_results = results.setdefault(detector_name, {})
+                for pii_name in column_counts[detector_name]:
+                    estimate = detector_results.setdefault(
+                        pii_name, {'count': 0, 'values': []})
+                    estimate['count'] += round(
+                        column_counts[detector_name][pii_name] * scale)
+                    estimate['values'].extend(
+                        column_values[detector_name][pii_name])
+
+        results['column_profile'] = column_profile
+        return results
+
+    def detect_pii(self, path, extension, data=None):
         print('Running sheet parser on', path)
 
-        if extension == '.csv':
-            df = self.load_csv(path)
-        else:
-            df = self.load_excel(path)
+        # cells aren't counted as characters
+        with measure_stage('extract', path) as measure:
+            measure['input_bytes'] = get_input_bytes(path, data)
+            if extension == '.csv':
+                df = self.load_csv(path, data)
+            else:
+                df = self.load_excel(path, data)
+
+        if df.size == 0:
+            print('No cells in', path)
+            return {}
+
+        if self.column_profile:
+            return self.profile_columns(df, path)
 
         results = {}
 
-        for detector_name in self.detectors:
-            print('Running', detector_name, 'on', path)
-            try:
-                detector = self.detectors[detector_name]
-                results[detector_name] = detector.extract_pii_from_df(df)
-            except Exception as e:
-                print(
-                    f'Error while running {detector_name} on {path}: {e}. Skipping!')
+        tiers = self.get_detector_tiers()
+        for tier_index, tier in enumerate(tiers):
+            for detector_name in tier:
+                print('Running', detector_name, 'on', path)
+                try:
+                    with measure_stage(f'detect.{detector_name}', path):
+                        detector = self.detectors[detector_name]
+                        results[detector_name] = detector.extract_pii_from_df(df)
+                except Exception as e:
+                    print(
+                        f'Error while running {detector_name} on {path}: {e}. Skipping!')
+
+            cascade = self.check_cascade(results, tiers, tier_index)
+            if cascade is not None:
+                results['cascade'] = cascade
+                break
 
         return results
@@ -6,6 +6,18 @@ class DetectorInterface():
     Interface used by other dectector classes
     """
 
+    # bump when a change to the detector changes its results
+    # so cached results are invalidated
+    version = '1'
+
+    # False if the detector only reports which pii were found
+    # and not how many times
+    reports_counts = True
+
+    # True if extract_pii_from_doc uses the shared spaCy Doc
+    # instead of analyzing the text again
+    uses_doc = False
+
     def extract_pii_from_text(self, text):
         """
         Returns pii dictionary for text string
@@ -18,6 +30,22 @@ class DetectorInterface():
         """
         pass
 
+    def extract_pii_from_doc(self, doc):
+        """
+        Returns pii dictionary for text already parsed by the
+        shared spaCy model, see parsers.detectors.SharedNlp
+
+        Falls back to extract_pii_from_text for detectors
+        which can't use a spaCy Doc
+
+        Args:
+            doc (spacy.tokens.Doc): parsed text to be analyzed
+
+        Returns:
+            dict: pii
+        """
+        return self.extract_pii_from_text(doc.text)
+
     def extract_pii_from_df(self, df):
         """
         Returns pii dictionary for pandas dataframe
@@ -4,12 +4,12 @@ import pandas as pd
 import tempfile
 import sys
 
-from commonregex import CommonRegex
 from nltk.tag.stanford import StanfordNERTagger
 
 from parsers.detectors.DetectorInterface import DetectorInterface
+from parsers.detectors.RegexEngine import scan_structured_pii
+from parsers.detectors.StanfordNERService import STANFORD_NER_CLASSIFIER, STANFORD_NER_JAR, get_ner_service
 
-import streamlit as st
 
 # to analyze big fields
 csv.field_size_limit(min(sys.maxsize, 2147483646))
@@ -19,12 +19,15 @@ class PIIAnalyzerDetector(DetectorInterface):
     """
     Detector for PIIAnalyzer
     """
-    @st.cache
+
+    # structured pii are found by RegexEngine, bumped
+    # when its matching changes, see DetectorInterface
+    version = '3'
+
     def extract_pii_from_text(self, text):
-        piianalyzer = PiiAnalyzer(text)
+        piianalyzer = PiiAnalyzer(text, ner_tagger=get_ner_service())
         return piianalyzer.text_analysis()
     
-    @st.cache
     def extract_pii_from_df(self, df):
         return self.extract_pii_from_text(df.to_string())
 
@@ -34,14 +37,17 @@ class PiiAnalyzer(object):
     in the library and it wouldn't work on python 3.7
     Adapted from https://gitlab.math.ubc.ca/tomyerex/piianalyzer/-/blob/master/piianalyzer/analyzer.py
     """
-    def __init__(self, text):
+    def __init__(self, text, ner_tagger=None):
         self.text = text
-        self.parser = CommonRegex()
         # change 2: i changed the filepaths down here to reflect the installation path in colab
-        self.standford_ner = StanfordNERTagger(
-            'stanford-ner-2020-11-17/classifiers/english.conll.4class.distsim.crf.ser.gz',
-            'stanford-ner-2020-11-17/stanford-ner.jar'
-        )
+        # change 3: a long-lived tagger (see StanfordNERService) can be passed in so
+        # the model isn't reloaded in a new java process for every file
+        if ner_tagger is None:
+            ner_tagger = StanfordNERTagger(
+                STANFORD_NER_CLASSIFIER,
+                STANFORD_NER_JAR
+            )
+        self.standford_ner = ner_tagger
 
     def text_analysis(self):
         people = []
@@ -55,11 +61,20 @@ class PiiAnalyzer(object):
         data = []
 
         # using regex
-        emails.extend(self.parser.emails(self.text))
-        phone_numbers.extend(self.parser.phones("".join(self.text.split())))
-        street_addresses.extend(self.parser.street_addresses(self.text))
-        credit_cards.extend(self.parser.credit_cards(self.text))
-        ips.extend(self.parser.ips(self.text))
+        # change 4: one pass of the shared regex engine instead of one
+        # CommonRegex pass per pii, phones are matched on the text as is
+        # rather than on a copy with all whitespace removed
+        for span in scan_structured_pii(self.text):
+            if span.pii_type == 'EMAIL_ADDRESS':
+                emails.append(span.value)
+            elif span.pii_type == 'PHONE_NUMBER':
+                phone_numbers.append(span.value)
+            elif span.pii_type == 'ADDRESS':
+                street_addresses.append(span.value)
+            elif span.pii_type == 'CREDIT_CARD':
+                credit_cards.append(span.value)
+            elif span.pii_type == 'IP_ADDRESS':
+                ips.append(span.value)
 
         # using stanford ner
         data = self.text.split()
@@ -3,40 +3,159 @@
 # python -m spacy download en_core_web_sm
 # brew install libmagic
 
-import os
 import pandas as pd
-import tempfile
 
 from typing import Any, Dict, Optional, TextIO
 from piicatcher.explorer.metadata import NamedObject
 from piicatcher.piitypes import PiiTypes
-from piicatcher.scanner import NERScanner, RegexScanner
-from spacy.lang.en import English
+from piicatcher.scanner import NERScanner
 
 from parsers.detectors.DetectorInterface import DetectorInterface
+from parsers.detectors.RegexEngine import scan_structured_pii
 
-import streamlit as st
 
 class PIICatcherDetector(DetectorInterface):
     """
     Detector for PIICatcher
     """
 
-    @st.cache
+    # entities come from the shared spaCy model, text is scanned in
+    # chunks and structured pii by RegexEngine, bumped when its
+    # matching changes, see DetectorInterface
+    version = '5'
+
+    # piicatcher only reports which pii types were found
+    reports_counts = False
+    uses_doc = True
+
+    # spaCy entity labels NERScanner reports as pii
+    ner_label_to_pii_type = {
+        'PERSON': PiiTypes.PERSON,
+        'GPE': PiiTypes.LOCATION,
+        'DATE': PiiTypes.BIRTH_DATE,
+    }
+
+    def __init__(self, chunk_size=100000, chunk_rows=1000):
+        # characters scanned at once, bounds memory used by spaCy
+        self.chunk_size = chunk_size
+        # dataframe rows serialized to csv at once
+        self.chunk_rows = chunk_rows
+        self.regex = StructuredRegexScanner()
+        self._context = None
+
+    def get_context(self):
+        """
+        Returns scanning context, created on first call and re-used
+        so spaCy models aren't loaded again for every file
+
+        Returns:
+            dict:
+        """
+        if self._context is None:
+            self._context = {
+                "regex": self.regex,
+                "ner": NERScanner(),
+            }
+        return self._context
+
+    def iter_text_chunks(self, text):
+        """
+        Yields pieces of text of about chunk_size characters,
+        cut on whitespace so words aren't split
+
+        Args:
+            text (str):
+
+        Yields:
+            Generator[str, None, None]:
+        """
+        start = 0
+        while start < len(text):
+            end = start + self.chunk_size
+            if end < len(text):
+                cut = max(text.rfind(' ', start, end),
+                          text.rfind('\n', start, end))
+                if cut > start:
+                    end = cut
+            yield text[start:end]
+            start = end
+
+    def iter_file_chunks(self, fd):
+        """
+        Reads text file object in pieces of about chunk_size
+        characters, cut on whitespace so words aren't split
+
+        Args:
+            fd (TextIO):
+
+        Yields:
+            Generator[str, None, None]:
+        """
+        rest = ''
+        while True:
+            data = fd.read(self.chunk_size)
+            if not data:
+                break
+            data = rest + data
+            cut = max(data.rfind(' '), data.rfind('\n'))
+            if cut > 0:
+                rest = data[cut:]
+                data = data[:cut]
+            else:
+                rest = ''
+            yield data
+        if rest:
+            yield rest
+
+    def iter_df_chunks(self, df):
+        """
+        Serializes dataframe to csv chunk_rows rows at a time,
+        in memory instead of writing it to disk
+
+        Args:
+            df (pd.DataFrame):
+
+        Yields:
+            Generator[str, None, None]:
+        """
+        for start in range(0, max(len(df), 1), self.chunk_rows):
+            yield df.iloc[start:start + self.chunk_rows].to_csv(header=start == 0)
+
+    def scan_chunks(self, chunks):
+        """
+        Scans pieces of text one at a time with the re-used context
+
+        Args:
+            chunks (Iterable[str]):
+
+        Returns:
+            set: PiiTypes found
+        """
+        scanner = IO("api chunks", None)
+        context = self.get_context()
+        for chunk in chunks:
+            scanner.scan_data(chunk, context)
+        return scanner.get_pii_types()
+
     def extract_pii_from_text(self, text):
-        with tempfile.NamedTemporaryFile(mode='w+') as tmp:
-            tmp.write(text)
-            tmp.seek(0)
-            result = self.scan_file_object(tmp)
-            return self.summarize_scan_file_object_results(result)
+        result = self.scan_chunks(self.iter_text_chunks(text))
+        return self.summarize_scan_file_object_results(result)
 
-    @st.cache
     def extract_pii_from_df(self, df):
-        with tempfile.NamedTemporaryFile(mode='w+') as tmp:
-            df.to_csv(tmp)
-            tmp.seek(0)
-            result = self.scan_file_object(tmp)
-            return self.summarize_scan_file_object_results(result)
+        result = self.scan_chunks(self.iter_df_chunks(df))
+        return self.summarize_scan_file_object_results(result)
+
+    def extract_pii_from_doc(self, doc):
+        # same as IO.scan but using entities of the
+        # shared Doc instead of running NERScanner
+        pii = set()
+        for ent in doc.ents:
+            if ent.label_ in self.ner_label_to_pii_type:
+                pii.add(self.ner_label_to_pii_type[ent.label_])
+
+        pii.update(self.regex.scan(doc.text))
+
+        return self.summarize_scan_file_object_results(pii)
 
     def summarize_scan_file_object_results(self, results):
         summary = {}
@@ -55,15 +174,7 @@ class PIICatcherDetector(DetectorInterface):
     # This function was only available in v0.13.0 so
     # I ported it to the latest v0.14.0
     def scan_file_object(self, fd):
-        scanner = IO("api file object", fd)
-        context = {
-            "tokenizer": Tokenizer(),
-            "regex": RegexScanner(),
-            "ner": NERScanner(),
-        }
-
-        scanner.scan(context)
-        return scanner.get_pii_types()
+        return self.scan_chunks(self.iter_file_chunks(fd))
 
 
 class IO(NamedObject):
@@ -80,17 +191,18 @@ class IO(NamedObject):
         self._descriptor = fd
 
     def scan(self, context):
-        tokenizer = context["tokenizer"]
+        data = self._descriptor.read()
+        self.scan_data(data, context)
+
+    def scan_data(self, data, context):
         regex = context["regex"]
         ner = context["ner"]
 
-        data = self._descriptor.read()
         ner_results = ner.scan(data)
         [self._pii.add(pii) for pii in ner_results]
-        tokens = tokenizer.tokenize(data)
-        for t in tokens:
-            if not t.is_stop:
-                [self._pii.add(pii) for pii in regex.scan(t.text)]
+        # regex runs once over the whole text instead of once per
+        # token, stop words never matched any of the patterns
+        [self._pii.add(pii) for pii in regex.scan(data)]
 
 
 class File(IO):
@@ -113,12 +225,21 @@ class File(IO):
                 super().scan(context)
 
 
-class Tokenizer:
-    def __init__(self):
-        nlp = English()
-        # Create a Tokenizer with the default settings for English
-        # including punctuation rules and exceptions
-        self._tokenizer = nlp.tokenizer
-
-    def tokenize(self, data):
-        return self._tokenizer(data)
+class StructuredRegexScanner:
+    """
+    Same pii types as piicatcher's RegexScanner, found with
+    the shared single pass regex engine
+    """
+    structured_pii_to_pii_type = {
+        'PHONE_NUMBER': PiiTypes.PHONE,
+        'EMAIL_ADDRESS': PiiTypes.EMAIL,
+        'CREDIT_CARD': PiiTypes.CREDIT_CARD,
+        'ADDRESS': PiiTypes.ADDRESS,
+    }
+
+    def scan(self, text):
+        types = set()
+        for span in scan_structured_pii(text):
+            if span.pii_type in self.structured_pii_to_pii_type:
+                types.add(self.structured_pii_to_pii_type[span.pii_type])
+        return list(types)
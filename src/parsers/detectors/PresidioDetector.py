@@ -4,21 +4,44 @@
 
 import pandas as pd
 
-from presidio_analyzer import AnalyzerEngine
+from presidio_analyzer import AnalyzerEngine, EntityRecognizer
+from presidio_analyzer.nlp_engine import SpacyNlpEngine
 from presidio_analyzer.recognizer_result import RecognizerResult
-from presidio_analyzer import nlp_engine
 
 from parsers.detectors.DetectorInterface import DetectorInterface
+from parsers.detectors.SharedNlp import get_shared_nlp
+
+
+class SharedSpacyNlpEngine(SpacyNlpEngine):
+    """
+    SpacyNlpEngine using the shared spaCy model instead of loading its own
+    """
+
+    def __init__(self):
+        self.nlp = {'en': get_shared_nlp()}
 
-import streamlit as st
 
 class PresidioDetector(DetectorInterface):
     """
     Detector for Presidio
     """
 
-    def __init__(self):
-        self.analyzer = AnalyzerEngine()
+    uses_doc = True
+
+    def __init__(self, batch_size=256, chunk_size=None, chunk_overlap=200, chunk_batch_size=4):
+        if chunk_size is not None and chunk_size <= chunk_overlap:
+            raise ValueError(f'chunk_size ({chunk_size}) must be larger than chunk_overlap ({chunk_overlap})')
+        self.analyzer = AnalyzerEngine(nlp_engine=SharedSpacyNlpEngine())
+        # number of texts spaCy processes at once in nlp.pipe
+        self.batch_size = batch_size
+        # texts longer than chunk_size characters are analyzed in overlapping
+        # windows, None only splits texts which are too long for spaCy
+        self.chunk_size = chunk_size
+        # characters shared by neighbouring windows so pii cut by
+        # a window boundary is still found whole in one of them
+        self.chunk_overlap = chunk_overlap
+        # windows spaCy processes at once, kept small to bound memory
+        self.chunk_batch_size = chunk_batch_size
 
     def get_pii_entities(self):
         return [
@@ -46,17 +69,127 @@ class PresidioDetector(DetectorInterface):
             'AU_MEDICARE',
         ]
 
-    @st.cache(hash_funcs={
-        nlp_engine.spacy_nlp_engine.SpacyNlpEngine: lambda x: 0,
-    })
-    def extract_pii_from_text(self, text):
+    def get_chunk_size(self, text):
+        """
+        Returns size of windows text should be split in, None
+        if text can be analyzed in one go
+
+        Args:
+            text (str):
+
+        Returns:
+            int:
+        """
+        chunk_size = self.chunk_size
+        max_length = self.analyzer.nlp_engine.nlp['en'].max_length
+        if chunk_size is None and len(text) >= max_length:
+            chunk_size = max_length // 10
+        if chunk_size is None or len(text) <= chunk_size:
+            return None
+        return chunk_size
+
+    def split_text(self, text, chunk_size):
+        """
+        Splits text in windows of at most chunk_size characters overlapping
+        by chunk_overlap characters. Windows end on a sentence boundary
+        or whitespace when possible so words aren't cut
+
+        Args:
+            text (str):
+            chunk_size (int):
+
+        Returns:
+            List[Tuple[int, int]]: (start, end) offsets of windows
+        """
+        overlap = min(self.chunk_overlap, chunk_size // 2)
+        windows = []
+        start = 0
+        while True:
+            end = min(start + chunk_size, len(text))
+            if end < len(text):
+                # prefer end of a sentence in the second half of the window
+                cut = text.rfind('. ', start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + 1
+                else:
+                    cut = text.rfind(' ', start + chunk_size // 2, end)
+                    if cut != -1:
+                        end = cut
+            windows.append((start, end))
+            if end >= len(text):
+                return windows
+
+            next_start = end - overlap
+            # start next window at a word
+            space = text.find(' ', next_start, end)
+            if space != -1:
+                next_start = space + 1
+            start = max(next_start, start + 1)
+
+    def analyze_text(self, text, score_threshold=None):
+        """
+        Same as AnalyzerEngine.analyze, analyzing long texts in
+        overlapping windows so spaCy never sees more than a window
+
+        Args:
+            text (str):
+            score_threshold (float):
+
+        Returns:
+            List[RecognizerResult]: results with offsets in text
+        """
+        chunk_size = self.get_chunk_size(text)
+        if chunk_size is None:
+            return self.analyzer.analyze(
+                text=text,
+                entities=self.get_pii_entities(),
+                language='en',
+                score_threshold=score_threshold
+            )
+
+        windows = self.split_text(text, chunk_size)
+        window_texts = (text[start:end] for start, end in windows)
+        nlp_artifacts_list = self.iter_nlp_artifacts(
+            window_texts, batch_size=self.chunk_batch_size)
+
+        results = {}
+        for index, nlp_artifacts in enumerate(nlp_artifacts_list):
+            start, end = windows[index]
+            # each window owns offsets up to the middle of the overlaps
+            # with its neighbours, pii found in the rest of the window is
+            # reported by the neighbour which sees it with more context
+            own_start = start
+            if index > 0:
+                own_start = (windows[index - 1][1] + start) // 2
+            own_end = end
+            if index < len(windows) - 1:
+                own_end = (end + windows[index + 1][0]) // 2
+
+            window_results = self.analyze_nlp_artifacts(
+                text[start:end], nlp_artifacts, score_threshold)
+            for result in window_results:
+                result.start += start
+                result.end += start
+                if not own_start <= result.start < own_end:
+                    continue
+                key = (result.entity_type, result.start, result.end)
+                if key not in results or results[key].score < result.score:
+                    results[key] = result
+
+        return sorted(results.values(), key=lambda result: result.start)
+
+    def summarize_results(self, text, results):
+        """
+        Groups analyzer results by pii type
+
+        Args:
+            text (str): analyzed text
+            results (List[RecognizerResult]):
+
+        Returns:
+            dict: pii type -> count and values
+        """
         summary = {}
-        results = self.analyzer.analyze(
-            text=text,
-            entities=self.get_pii_entities(),
-            language='en',
-            score_threshold=0.80
-        )
         for result in results:
             if result.entity_type not in summary:
                 summary[result.entity_type] = {
@@ -70,19 +203,107 @@ class PresidioDetector(DetectorInterface):
 
         return summary
 
-    @st.cache(hash_funcs={
-        nlp_engine.spacy_nlp_engine.SpacyNlpEngine: lambda x: 0,
-    })
+    def extract_pii_from_text(self, text):
+        results = self.analyze_text(text, score_threshold=0.80)
+        return self.summarize_results(text, results)
+
+    def extract_pii_from_doc(self, doc):
+        text = doc.text
+        if self.get_chunk_size(text) is not None:
+            return self.extract_pii_from_text(text)
+
+        nlp_artifacts = self.analyzer.nlp_engine._doc_to_nlp_artifact(doc, 'en')
+        results = self.analyze_nlp_artifacts(
+            text, nlp_artifacts, score_threshold=0.80)
+        return self.summarize_results(text, results)
+
+    def iter_nlp_artifacts(self, texts, batch_size=None):
+        """
+        Runs spaCy over texts in batches using nlp.pipe
+        instead of one nlp() call per text
+
+        Args:
+            texts (Iterable[str]):
+            batch_size (int): defaults to self.batch_size
+
+        Yields:
+            Generator[NlpArtifacts, None, None]: artifacts in order of texts
+        """
+        nlp_engine = self.analyzer.nlp_engine
+        nlp = nlp_engine.nlp['en']
+        for doc in nlp.pipe(texts, batch_size=batch_size or self.batch_size):
+            yield nlp_engine._doc_to_nlp_artifact(doc, 'en')
+
+    def analyze_nlp_artifacts(self, text, nlp_artifacts, score_threshold=None):
+        """
+        Same as AnalyzerEngine.analyze but with nlp artifacts
+        which were already computed, this version of presidio
+        doesn't let us pass them to analyze
+
+        Args:
+            text (str):
+            nlp_artifacts (NlpArtifacts): see iter_nlp_artifacts
+            score_threshold (float):
+
+        Returns:
+            List[RecognizerResult]:
+        """
+        entities = self.get_pii_entities()
+        recognizers = self.analyzer.registry.get_recognizers(
+            language='en',
+            entities=entities,
+        )
+
+        results = []
+        for recognizer in recognizers:
+            if not recognizer.is_loaded:
+                recognizer.load()
+                recognizer.is_loaded = True
+            current_results = recognizer.analyze(
+                text=text, entities=entities, nlp_artifacts=nlp_artifacts)
+            if current_results:
+                results.extend(current_results)
+
+        results = EntityRecognizer.remove_duplicates(results)
+
+        if score_threshold is None:
+            score_threshold = self.analyzer.default_score_threshold
+        return [result for result in results if result.score >= score_threshold]
+
+    def analyze_batch(self, texts):
+        """
+        Analyzes many texts, running spaCy over them in batches
+
+        Args:
+            texts (List[str]):
+
+        Returns:
+            List[List[RecognizerResult]]: results in order of texts
+        """
+        return [
+            self.analyze_nlp_artifacts(text, nlp_artifacts)
+            for text, nlp_artifacts in zip(texts, self.iter_nlp_artifacts(texts))
+        ]
+
     def extract_pii_from_df(self, df):
         summary = {}
 
-        def analyze_cell(t):
-            result_list = self.analyzer.analyze(
-                text=str(t),
-                entities=self.get_pii_entities(),
-                language='en',
-            )
-            if result_list:
+        # every distinct cell value is only analyzed once,
+        # grouped by column since values in a column tend to repeat
+        texts = list(dict.fromkeys(
+            str(t)
+            for column_index in range(df.shape[1])
+            for t in df.iloc[:, column_index]
+        ))
+        results_by_text = dict(zip(texts, self.analyze_batch(texts)))
+
+        # fan results back out to every cell, in the same
+        # column by column order applymap used to visit cells
+        pii_columns = {}
+        for column_index in range(df.shape[1]):
+            pii_column = []
+            for t in df.iloc[:, column_index]:
+                result_list = results_by_text[str(t)]
                 for result in result_list:
                     if result.entity_type not in summary:
                         summary[result.entity_type] = {
@@ -93,19 +314,12 @@ class PresidioDetector(DetectorInterface):
                     summary[result.entity_type]['count'] += 1
                     summary[result.entity_type]['values'].append(t)
 
-            if len(result_list) == 0:
-                return ''
-
-            pii_types = ''
-            for result in result_list:
-                pii_types += f'{result.entity_type},'
-
-            # remove last comma
-            return pii_types[:-1]
+                pii_column.append(
+                    ','.join([result.entity_type for result in result_list]))
+            pii_columns[column_index] = pii_column
 
-        df_pii = df \
-            .copy(deep=True) \
-            .applymap(analyze_cell)
+        df_pii = pd.DataFrame(pii_columns, index=df.index)
+        df_pii.columns = df.columns
 
         summary['df_pii'] = df_pii
 
@@ -0,0 +1,42 @@
+from parsers.detectors.DetectorInterface import DetectorInterface
+from parsers.detectors.RegexEngine import scan_structured_pii
+
+
+class RegexDetector(DetectorInterface):
+    """
+    Detector for structured pii (emails, phones, SSNs, credit cards,
+    IBANs, IPs and street addresses) using only the single pass regex
+    engine. Much cheaper than NER, used as first tier of the cascade
+    """
+
+    # bumped when RegexEngine matching changes, see DetectorInterface
+    version = '2'
+
+    def summarize_spans(self, spans):
+        """
+        Groups spans found by pii type, same format as presidio results
+
+        Args:
+            spans (Iterable[StructuredPii]):
+
+        Returns:
+            dict: pii type -> count and values
+        """
+        summary = {}
+        for span in spans:
+            if span.pii_type not in summary:
+                summary[span.pii_type] = {
+                    'count': 0,
+                    'values': [],
+                }
+            summary[span.pii_type]['count'] += 1
+            summary[span.pii_type]['values'].append(span.value)
+        return summary
+
+    def extract_pii_from_text(self, text):
+        return self.summarize_spans(scan_structured_pii(text))
+
+    def extract_pii_from_df(self, df):
+        # one cell per line so matches don't span cells
+        text = '\n'.join(df.astype(str).to_numpy().ravel())
+        return self.summarize_spans(scan_structured_pii(text))
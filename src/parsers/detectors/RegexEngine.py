@@ -0,0 +1,175 @@
+# Single pass detection of structured pii
+#
+# Every pattern is compiled into one alternation of named groups so the
+# text is scanned once instead of once per pattern.
+# Patterns for emails, phones, credit cards, ips and street addresses are
+# the ones from commonregex (used by PIIAnalyzer and PIICatcher) with
+# boundaries added, so results stay close to what the detectors found.
+
+import re
+
+from collections import namedtuple
+
+StructuredPii = namedtuple('StructuredPii', ['pii_type', 'start', 'end', 'value'])
+
+# order matters: at a given position the first pattern which
+# matches wins, so more specific patterns come first
+structured_pii_patterns = [
+    ('EMAIL_ADDRESS', r"[a-z0-9!#$%&'*+/=?^_`{|.}~-]+@(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9](?:[a-z0-9-]*[a-z0-9])?"),
+    ('IBAN_CODE', r'\b[a-z]{2}\d{2}(?: ?[a-z0-9]{4}){2,7}(?: ?[a-z0-9]{1,4})?\b'),
+    ('CREDIT_CARD', r'(?<!\d)(?:(?:\d{4}[- ]?){3}\d{4}|\d{15,16})(?!\d)'),
+    ('US_SSN', r'(?<![\d-])(?!000|666|9\d\d)\d{3}(?P<ssn_separator>[- ])(?!00)\d{2}(?P=ssn_separator)(?!0000)\d{4}(?![\d-])'),
+    ('IP_ADDRESS', r'(?<![\d.])(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)(?![\d.])'),
+    ('ADDRESS', r'\b\d{1,4} [\w\s]{1,20}(?:street|st|avenue|ave|road|rd|highway|hwy|square|sq|trail|trl|drive|dr|court|ct|parkway|pkwy|circle|cir)\W?(?=\s|$)'),
+    ('PHONE_NUMBER', r'(?:(?<![\d-])(?:\+?\d{1,3}[-.\s*]?)?(?:\(?\d{3}\)?[-.\s*]?)?\d{3}[-.\s*]?\d{4}(?![\d-]))|(?:(?<![\d-])(?:(?:\(\+?\d{2}\))|(?:\+?\d{2}))\s*\d{2}\s*\d{3}\s*\d{4}(?![\d-]))'),
+]
+
+structured_pii_regex = re.compile(
+    '|'.join([f'(?P<{pii_type}>{pattern})' for pii_type, pattern in structured_pii_patterns]),
+    re.IGNORECASE
+)
+
+# each pattern on its own, tried where a match of an earlier
+# pattern failed its check, see scan_structured_pii
+structured_pii_regexes = [
+    (pii_type, re.compile(pattern, re.IGNORECASE)) for pii_type, pattern in structured_pii_patterns
+]
+
+
+def is_luhn_valid(number):
+    """
+    Returns True if digits of number pass the Luhn checksum
+    used by credit card numbers
+
+    Args:
+        number (str):
+
+    Returns:
+        bool:
+    """
+    digits = [int(c) for c in number if c.isdigit()]
+    checksum = 0
+    for index, digit in enumerate(reversed(digits)):
+        if index % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        checksum += digit
+    return checksum % 10 == 0
+
+
+def is_iban_valid(iban):
+    """
+    Returns True if iban passes the mod 97 check
+
+    Args:
+        iban (str):
+
+    Returns:
+        bool:
+    """
+    iban = iban.replace(' ', '').upper()
+    rearranged = iban[4:] + iban[:4]
+    digits = ''.join([str(int(c, 36)) for c in rearranged])
+    return int(digits) % 97 == 1
+
+
+# checks run on matches, matches failing them are dropped
+structured_pii_validators = {
+    'CREDIT_CARD': is_luhn_valid,
+    'IBAN_CODE': is_iban_valid,
+}
+
+
+def get_valid_span(pii_type, match, group=0):
+    """
+    Returns span of a match, None if it fails the check of its pii type
+
+    Args:
+        pii_type (str):
+        match (re.Match):
+        group (int|str): group holding the pii
+
+    Returns:
+        StructuredPii:
+    """
+    value = match.group(group).strip()
+    validator = structured_pii_validators.get(pii_type)
+    if validator is not None and not validator(value):
+        return None
+    return StructuredPii(pii_type, match.start(group), match.end(group), value)
+
+
+def match_later_patterns(text, pos, failed_pii_type):
+    """
+    Matches patterns which come after a pattern whose match failed its
+    check, at the position of that match. Patterns coming before it
+    didn't match there, the alternation tries them first
+
+    Args:
+        text (str):
+        pos (int): start of the match which failed its check
+        failed_pii_type (str):
+
+    Returns:
+        StructuredPii: first valid span starting at pos, None if there is none
+    """
+    pii_types = [pii_type for pii_type, _ in structured_pii_regexes]
+    for pii_type, regex in structured_pii_regexes[pii_types.index(failed_pii_type) + 1:]:
+        match = regex.match(text, pos)
+        if match is None:
+            continue
+        span = get_valid_span(pii_type, match)
+        if span is not None:
+            return span
+    return None
+
+
+def scan_structured_pii(text):
+    """
+    Scans text once for every structured pii pattern. When a match fails
+    its check, the patterns after it are tried at the same position, and
+    scanning resumes right after its start, so a valid pii overlapping it,
+    e.g. a card number after a year, is still found. Of two overlapping
+    spans the longer one is kept
+
+    Args:
+        text (str):
+
+    Returns:
+        List[StructuredPii]: typed spans in order of appearance
+    """
+    spans = []
+    pos = 0
+    while True:
+        match = structured_pii_regex.search(text, pos)
+        if match is None:
+            return spans
+        span = get_valid_span(match.lastgroup, match, match.lastgroup)
+        if span is not None:
+            pos = span.end
+        else:
+            span = match_later_patterns(text, match.start(), match.lastgroup)
+            pos = match.start() + 1
+        if span is None:
+            continue
+        # only spans found where a check failed can be overlapped
+        if len(spans) > 0 and span.start < spans[-1].end:
+            if span.end - span.start <= spans[-1].end - spans[-1].start:
+                continue
+            spans.pop()
+        spans.append(span)
+
+
+def get_structured_pii_values(text, pii_type):
+    """
+    Returns values of one type of structured pii found in text
+
+    Args:
+        text (str):
+        pii_type (str): e.g. EMAIL_ADDRESS
+
+    Returns:
+        list:
+    """
+    return [span.value for span in scan_structured_pii(text) if span.pii_type == pii_type]
@@ -0,0 +1,41 @@
+# Need to run
+# python -m spacy download en_core_web_lg
+
+# model shared by every detector which can work from a spaCy Doc
+SHARED_SPACY_MODEL = 'en_core_web_lg'
+
+# global model to be re-used
+_nlp = None
+
+
+def get_shared_nlp():
+    """
+    Returns shared spaCy model, loading it on first call.
+    The dependency parser isn't used by any detector so it is disabled
+
+    Returns:
+        spacy.language.Language:
+    """
+    global _nlp
+    if _nlp is None:
+        # imported here so spaCy is only loaded by detectors using it
+        import spacy
+        _nlp = spacy.load(SHARED_SPACY_MODEL, disable=['parser'])
+    return _nlp
+
+
+def parse_doc(text):
+    """
+    Tokenizes and runs NER over text once so every detector
+    can use the same Doc
+
+    Args:
+        text (str):
+
+    Returns:
+        spacy.tokens.Doc: None if text is too long for spaCy
+    """
+    nlp = get_shared_nlp()
+    if len(text) >= nlp.max_length:
+        return None
+    return nlp(text)
@@ -0,0 +1,209 @@
+# Long-lived Stanford NER backend
+#
+# nltk's StanfordNERTagger starts a new `java` process on every tag() call,
+# which reloads the CRF model (several seconds) for every single file.
+# This module keeps one NERServer JVM alive for the whole scan and talks to it
+# over a local socket instead.
+
+import atexit
+import os
+import socket
+import subprocess
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+STANFORD_NER_DIR = 'stanford-ner-2020-11-17'
+STANFORD_NER_CLASSIFIER = os.path.join(
+    STANFORD_NER_DIR, 'classifiers', 'english.conll.4class.distsim.crf.ser.gz')
+STANFORD_NER_JAR = os.path.join(STANFORD_NER_DIR, 'stanford-ner.jar')
+
+
+class StanfordNERService():
+    """
+    Stanford NER server process which is started lazily on first use
+    and re-used until close() is called (or the interpreter exits)
+
+    Tokens are sent whitespace separated and tagged with the same
+    tokenizer options nltk uses, so results match StanfordNERTagger.
+    """
+
+    def __init__(self, model_filename=STANFORD_NER_CLASSIFIER, path_to_jar=STANFORD_NER_JAR,
+                 java_options='-mx1000m', host='127.0.0.1', port=None,
+                 startup_timeout=120, max_connections=4):
+        self.model_filename = model_filename
+        self.path_to_jar = path_to_jar
+        self.java_options = java_options
+        self.host = host
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.max_connections = max_connections
+        self._process = None
+        self._lock = threading.Lock()
+
+    def is_running(self):
+        """
+        Returns True if a server is accepting connections on host:port
+
+        Returns:
+            bool:
+        """
+        if self.port is None:
+            return False
+        try:
+            with socket.create_connection((self.host, self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def start(self):
+        """
+        Starts the NER server if it is not already running.
+        If a port was given and a server already listens on it,
+        that server is re-used instead of spawning a new one.
+        """
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            if self._process is None and self.is_running():
+                return
+
+            if self.port is None:
+                self.port = self._find_free_port()
+
+            classpath = os.pathsep.join([
+                self.path_to_jar,
+                os.path.join(os.path.dirname(self.path_to_jar), 'lib', '*'),
+            ])
+            cmd = ['java'] + self.java_options.split() + [
+                '-cp', classpath,
+                'edu.stanford.nlp.ie.NERServer',
+                '-loadClassifier', self.model_filename,
+                '-port', str(self.port),
+                '-outputFormat', 'slashTags',
+                '-tokenizerFactory', 'edu.stanford.nlp.process.WhitespaceTokenizer',
+                '-tokenizerOptions', 'tokenizeNLs=false',
+            ]
+            self._process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            atexit.register(self.close)
+
+            # loading the classifier takes a few seconds
+            deadline = time.time() + self.startup_timeout
+            while not self.is_running():
+                if self._process.poll() is not None:
+                    raise RuntimeError(
+                        f'Stanford NER server exited with code {self._process.returncode}')
+                if time.time() > deadline:
+                    self.close()
+                    raise RuntimeError('Timed out waiting for Stanford NER server')
+                time.sleep(0.2)
+
+    def close(self):
+        """
+        Stops the NER server if it was started by this object
+        """
+        process = self._process
+        self._process = None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def tag(self, tokens):
+        """
+        Tags a list of tokens
+
+        Args:
+            tokens (Iterable[str]): tokens to be tagged
+
+        Returns:
+            List[Tuple[str, str]]: (token, tag) pairs
+        """
+        tokens = [token for token in tokens if token]
+        if len(tokens) == 0:
+            return []
+        self.start()
+        return self._parse_output(self._request(' '.join(tokens)))
+
+    def tag_documents(self, documents):
+        """
+        Tags several token lists over concurrent connections.
+        The server handles every connection on its own thread so
+        this keeps all of the JVM's cores busy.
+
+        Args:
+            documents (List[Iterable[str]]): one token list per document
+
+        Returns:
+            List[List[Tuple[str, str]]]: (token, tag) pairs per document
+        """
+        documents = [list(tokens) for tokens in documents]
+        if len(documents) == 0:
+            return []
+        self.start()
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            return list(executor.map(self.tag, documents))
+
+    def _request(self, line):
+        # NERServer reads a single line per connection and
+        # closes the connection after writing the tagged output
+        with socket.create_connection((self.host, self.port)) as conn:
+            conn.sendall(line.replace('\n', ' ').encode('utf-8') + b'\n')
+            conn.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b''.join(chunks).decode('utf-8', errors='ignore')
+
+    def _parse_output(self, output):
+        tagged = []
+        for item in output.split():
+            word, _, tag = item.rpartition('/')
+            if word:
+                tagged.append((word, tag))
+        return tagged
+
+    def _find_free_port(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((self.host, 0))
+            return sock.getsockname()[1]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# global service to be re-used by every PiiAnalyzer
+_ner_service = None
+
+
+def get_ner_service():
+    """
+    Returns process-wide StanfordNERService, creating it on first call.
+    The server itself is only started when something needs tagging.
+
+    Set STANFORD_NER_PORT to re-use a server which is already running.
+
+    Returns:
+        StanfordNERService:
+    """
+    global _ner_service
+    if _ner_service is None:
+        port = os.environ.get('STANFORD_NER_PORT')
+        _ner_service = StanfordNERService(port=int(port) if port else None)
+    return _ner_service
@@ -0,0 +1,171 @@
+import importlib
+
+from collections.abc import Mapping
+
+
+class LazyRegistry(Mapping):
+    """
+    Read-only dict of enabled parsers or detectors by name.
+
+    Classes are only imported, and instances only created, the first time
+    they are looked up, so models of parsers and detectors which are never
+    used are never loaded.
+    """
+
+    def __init__(self, classes, defaults=None):
+        # name -> 'module:ClassName'
+        self.classes = classes
+        # names enabled when none are selected
+        self.defaults = list(classes) if defaults is None else defaults
+        self.enabled = list(self.defaults)
+        self.options = {}
+        self._instances = {}
+
+    def configure(self, names=None, options=None):
+        """
+        Selects enabled entries and their constructor options.
+        Instances created so far are dropped
+
+        Args:
+            names (List[str]): enabled names, None to enable defaults
+            options (dict): name -> constructor keyword arguments
+        """
+        if names is None:
+            names = list(self.defaults)
+        unknown = [name for name in names if name not in self.classes]
+        if len(unknown) > 0:
+            raise ValueError(
+                f'Unknown name(s) {", ".join(unknown)}, choose from {", ".join(self.classes)}')
+
+        self.enabled = list(names)
+        self.options = dict(options or {})
+        self._instances = {}
+
+    def get_class(self, name):
+        """
+        Imports and returns class registered under name
+
+        Args:
+            name (str):
+
+        Returns:
+            type:
+        """
+        module_name, class_name = self.classes[name].split(':')
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def __getitem__(self, name):
+        if name not in self.enabled:
+            raise KeyError(name)
+        if name not in self._instances:
+            cls = self.get_class(name)
+            self._instances[name] = cls(**self.options.get(name, {}))
+        return self._instances[name]
+
+    def __contains__(self, name):
+        # Mapping would look up the item, creating the instance
+        return name in self.enabled
+
+    def __iter__(self):
+        return iter(self.enabled)
+
+    def __len__(self):
+        return len(self.enabled)
+
+
+detector_registry = LazyRegistry({
+    'pii_analyzer': 'parsers.detectors.PIIAnalyzerDetector:PIIAnalyzerDetector',
+    'pii_catcher': 'parsers.detectors.PIICatcherDetector:PIICatcherDetector',
+    'presidio': 'parsers.detectors.PresidioDetector:PresidioDetector',
+    'regex': 'parsers.detectors.RegexDetector:RegexDetector',
+}, defaults=['pii_analyzer', 'pii_catcher', 'presidio'])
+
+# tiers of detectors run in order by the cascade, cheapest first:
+# regex only, then detectors sharing one spaCy parse, then Stanford NER
+cascade_tiers = [
+    ['regex'],
+    ['pii_catcher', 'presidio'],
+    ['pii_analyzer'],
+]
+
+parser_registry = LazyRegistry({
+    'sheet': 'parsers.SheetParser:SheetParser',
+    'pdf': 'parsers.PdfParser:PdfParser',
+    'image': 'parsers.ImageParser:ImageParser',
+    'default': 'parsers.DefaultParser:DefaultParser',
+})
+
+# parser used for each file extension, other extensions use default
+parser_extensions = {
+    '.csv': 'sheet',
+    '.xls': 'sheet',
+    '.xlsx': 'sheet',
+    '.pdf': 'pdf',
+    '.jpeg': 'image',
+    '.png': 'image',
+    '.jpg': 'image',
+}
+
+# bytes read from the start of a file to sniff its type
+SNIFF_SIZE = 4096
+
+# (leading bytes, file type, extensions) of binary formats parsers can read.
+# Formats like zip or ole are containers for many file types, they are only
+# trusted with the listed extensions. None trusts the leading bytes alone
+file_signatures = [
+    (b'%PDF-', '.pdf', None),
+    (b'\x89PNG\r\n\x1a\n', '.png', None),
+    (b'\xff\xd8\xff', '.jpg', None),
+    (b'PK\x03\x04', '.xlsx', ['.xlsx']),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', '.xls', ['.xls']),
+]
+
+# extensions of formats which are never plain text
+binary_extensions = ['.pdf', '.png', '.jpg', '.jpeg', '.xlsx', '.xls']
+
+# bytes found in text, anything else is a control character
+text_bytes = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+
+def is_text(header):
+    """
+    Guesses whether file is text from its first bytes: it has
+    no null bytes and few control characters
+
+    Args:
+        header (bytes):
+
+    Returns:
+        bool:
+    """
+    if b'\x00' in header:
+        return False
+    control_bytes = header.translate(None, text_bytes)
+    return len(control_bytes) <= len(header) * 0.1
+
+
+def sniff_file_type(header, file_extension):
+    """
+    Returns file type deciding which parser reads the file, from its
+    first bytes and extension
+
+    Args:
+        header (bytes): first SNIFF_SIZE bytes of the file
+        file_extension (str): may be empty
+
+    Returns:
+        str: extension of the parser to use, None if no parser can read the file
+    """
+    for signature, file_type, extensions in file_signatures:
+        if not header.startswith(signature):
+            continue
+        if extensions is not None:
+            return file_type if file_extension in extensions else None
+        # keep extension if it already picks the right parser, e.g. .jpeg
+        if parser_extensions.get(file_extension) == parser_extensions[file_type]:
+            return file_extension
+        return file_type
+
+    if file_extension in binary_extensions or not is_text(header):
+        return None
+    return file_extension
@@ -0,0 +1,127 @@
+# dict converting pii to score value
+# scores were assigned arbitrarily based on
+# which pii we felt had more risk than others
+# e.g. credit card info is worse than first name
+pii_name_to_score = {
+    'CREDIT_CARD': 1,
+    'CRYPTO': 1,
+    'DATE_TIME': 0.1,
+    'DOMAIN_NAME': 0.1,
+    'EMAIL': 0.3,
+    'EMAIL_ADDRESS': 0.3,
+    'IBAN_CODE': 0.3,
+    'IP_ADDRESS': 0.5,
+    'NRP': 0.7,
+    'ADDRESS': 0.7,
+    'LOCATION': 0.7,
+    'PERSON': 0.7,
+    'PHONE': 0.7,
+    'PHONE_NUMBER': 0.7,
+    'MEDICAL_LICENSE': 1,
+    'US_BANK_NUMBER': 1,
+    'US_DRIVER_LICENSE': 1,
+    'US_ITIN': 1,
+    'US_PASSPORT': 1,
+    'SSN': 1,
+    'US_SSN': 1,
+    'UK_NHS': 1,
+    'AU_ABN': 1,
+    'AU_ACN': 1,
+    'AU_TFN': 1,
+    'AU_MEDICARE': 1,
+    'ORGANIZATION': 0.2,
+    'NONE': 0,
+    'UNSUPPORTED': 0,
+    'BIRTH_DATE': 0.7,
+    'GENDER': 0.7,
+    'NATIONALITY': 0.7,
+    'USER_NAME': 0.7,
+    'PASSWORD': 1,
+}
+
+
+# detectors whose results count towards the pii score, in the order
+# their findings are reported
+scored_detectors = [
+    'presidio',
+    'pii_analyzer',
+    'pii_catcher',
+    'regex',
+]
+
+
+def get_pii_count(pii_value):
+    """
+    Returns number of times a pii was found from the value a detector
+    reports for it: presidio and estimated results report a dict with
+    a count, pii_analyzer a list of values and pii_catcher a number
+
+    Args:
+        pii_value (dict|list|int):
+
+    Returns:
+        int:
+    """
+    if isinstance(pii_value, dict):
+        return pii_value['count']
+    if isinstance(pii_value, list):
+        return len(pii_value)
+    return pii_value
+
+
+def get_pii_values(pii_value):
+    """
+    Returns values found for a pii, see get_pii_count
+
+    Args:
+        pii_value (dict|list|int):
+
+    Returns:
+        list:
+    """
+    if isinstance(pii_value, dict):
+        return pii_value.get('values', [])
+    if isinstance(pii_value, list):
+        return pii_value
+    return []
+
+
+def iter_findings(result):
+    """
+    Yields pii found by every detector in the result of a file
+
+    Args:
+        result (dict):
+
+    Yields:
+        Generator[Tuple[str, str, int], None, None]: detector name,
+        pii name and count, counts are above 0
+    """
+    for detector_name in scored_detectors:
+        if detector_name not in result['pii']:
+            continue
+        detector_results = result['pii'][detector_name]
+        for pii_name in detector_results:
+            # ignoring dataframe for presidio analysis
+            if pii_name == 'df_pii':
+                continue
+            count = get_pii_count(detector_results[pii_name])
+            if count > 0:
+                yield detector_name, pii_name, count
+
+
+def calculate_overall_pii_score(result):
+    """
+    Returns overall pii score of a result using
+    dictionary pii_name_to_score
+
+    Args:
+        result (dict):
+
+    Returns:
+        int: pii score
+    """
+    score = 0
+    for _, pii_name, count in iter_findings(result):
+        score += pii_name_to_score.get(pii_name, 0) * count
+    return score
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+# bump when the layout of the cache database changes
+CACHE_SCHEMA_VERSION = 1
+
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """
+    Returns sha256 hex digest of file contents
+
+    Args:
+        filepath (str):
+        chunk_size (int): bytes read at a time
+
+    Returns:
+        str:
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_bytes(data):
+    """
+    Returns sha256 hex digest of file contents already read,
+    the same as hash_file of the file
+
+    Args:
+        data (bytes):
+
+    Returns:
+        str:
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache():
+    """
+    On-disk cache of detection results backed by sqlite
+
+    Results are keyed by the sha256 of the file contents plus a version
+    string describing the parser, detectors and their configuration, so
+    copies of a file share a cache entry and upgrading a detector
+    invalidates old entries.
+
+    A (path, size, mtime) table avoids re-hashing files which haven't
+    changed since the last scan.
+
+    Total size of cached results is bounded by max_size_bytes, least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, path, max_size_bytes=1024 * 1024 * 1024, commit_every=100):
+        self.path = str(path)
+        self.max_size_bytes = max_size_bytes
+        self.commit_every = commit_every
+        self._pending_writes = 0
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+        self.total_size = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def _create_tables(self):
+        user_version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if user_version != CACHE_SCHEMA_VERSION:
+            self.conn.execute('DROP TABLE IF EXISTS files')
+            self.conn.execute('DROP TABLE IF EXISTS results')
+            self.conn.execute(f'PRAGMA user_version={CACHE_SCHEMA_VERSION}')
+
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+        self.conn.commit()
+
+    def get_content_hash(self, filepath, stat_info=None):
+        """
+        Returns content hash of file, only reading the file
+        if its size or mtime changed since it was last hashed
+
+        Args:
+            filepath (str):
+            stat_info (os.stat_result): re-used instead of calling os.stat if given
+
+        Returns:
+            str:
+        """
+        filepath = str(filepath)
+        if stat_info is None:
+            stat_info = os.stat(filepath)
+
+        hashed_file = self.get_hashed_file(filepath)
+        if hashed_file is not None and hashed_file[:2] == (stat_info.st_size, stat_info.st_mtime):
+            return hashed_file[2]
+
+        content_hash = hash_file(filepath)
+        self.set_content_hash(filepath, stat_info.st_size, stat_info.st_mtime, content_hash)
+        return content_hash
+
+    def get_hashed_file(self, filepath):
+        """
+        Returns size, mtime and content hash of file when it was last hashed,
+        the file is unchanged if its size and mtime are the same
+
+        Args:
+            filepath (str):
+
+        Returns:
+            Tuple[int, float, str]: None if the file was never hashed
+        """
+        return self.conn.execute(
+            'SELECT size, mtime, content_hash FROM files WHERE path = ?',
+            (str(filepath),)
+        ).fetchone()
+
+    def set_content_hash(self, filepath, size, mtime, content_hash):
+        """
+        Records content hash of file hashed outside the cache,
+        e.g. in a prefetch thread, see get_hashed_file
+
+        Args:
+            filepath (str):
+            size (int): file size when it was hashed
+            mtime (float): file mtime when it was hashed
+            content_hash (str): see hash_file
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO files (path, size, mtime, content_hash) VALUES (?, ?, ?, ?)',
+            (str(filepath), size, mtime, content_hash)
+        )
+        self._wrote()
+
+    def get_key(self, content_hash, version):
+        return hashlib.sha256(f'{content_hash}:{version}'.encode()).hexdigest()
+
+    def get(self, content_hash, version):
+        """
+        Returns cached result or None
+
+        Args:
+            content_hash (str): see get_content_hash
+            version (str): parser/detectors/config version
+
+        Returns:
+            dict:
+        """
+        key = self.get_key(content_hash, version)
+        row = self.conn.execute(
+            'SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        self.conn.execute(
+            'UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+        self._wrote()
+        return pickle.loads(row[0])
+
+    def put(self, content_hash, version, result):
+        """
+        Stores result, evicting least recently used results
+        if the cache grows over max_size_bytes
+
+        Args:
+            content_hash (str): see get_content_hash
+            version (str): parser/detectors/config version
+            result (dict):
+        """
+        key = self.get_key(content_hash, version)
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+        row = self.conn.execute(
+            'SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            self.total_size -= row[0]
+
+        self.conn.execute(
+            'INSERT OR REPLACE INTO results (key, result, size, last_access) VALUES (?, ?, ?, ?)',
+            (key, blob, len(blob), time.time())
+        )
+        self.total_size += len(blob)
+        self._wrote()
+
+        if self.total_size > self.max_size_bytes:
+            self.evict()
+
+    def evict(self, target_ratio=0.9):
+        """
+        Deletes least recently used results until the cache
+        is below target_ratio * max_size_bytes
+        """
+        target = self.max_size_bytes * target_ratio
+        cursor = self.conn.execute(
+            'SELECT key, size FROM results ORDER BY last_access')
+        keys = []
+        for key, size in cursor:
+            if self.total_size <= target:
+                break
+            keys.append((key,))
+            self.total_size -= size
+        cursor.close()
+
+        self.conn.executemany('DELETE FROM results WHERE key = ?', keys)
+        self.conn.commit()
+        self._pending_writes = 0
+
+    def _wrote(self):
+        # committing every write is very slow on big scans
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.conn.commit()
+            self._pending_writes = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
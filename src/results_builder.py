@@ -1,80 +1,310 @@
 import pandas as pd
 
-# dict converting pii to score value
-# scores were assigned arbitrarily based on
-# which pii we felt had more risk than others
-# e.g. credit card info is worse than first name
-pii_name_to_score = {
-    'CREDIT_CARD': 1,
-    'CRYPTO': 1,
-    'DATE_TIME': 0.1,
-    'DOMAIN_NAME': 0.1,
-    'EMAIL': 0.3,
-    'EMAIL_ADDRESS': 0.3,
-    'IBAN_CODE': 0.3,
-    'IP_ADDRESS': 0.5,
-    'NRP': 0.7,
-    'ADDRESS': 0.7,
-    'LOCATION': 0.7,
-    'PERSON': 0.7,
-    'PHONE': 0.7,
-    'PHONE_NUMBER': 0.7,
-    'MEDICAL_LICENSE': 1,
-    'US_BANK_NUMBER': 1,
-    'US_DRIVER_LICENSE': 1,
-    'US_ITIN': 1,
-    'US_PASSPORT': 1,
-    'SSN': 1,
-    'US_SSN': 1,
-    'UK_NHS': 1,
-    'AU_ABN': 1,
-    'AU_ACN': 1,
-    'AU_TFN': 1,
-    'AU_MEDICARE': 1,
-    'ORGANIZATION': 0.2,
-    'NONE': 0,
-    'UNSUPPORTED': 0,
-    'BIRTH_DATE': 0.7,
-    'GENDER': 0.7,
-    'NATIONALITY': 0.7,
-    'USER_NAME': 0.7,
-    'PASSWORD': 1,
+from metrics import measure_stage, recorder
+from pii_scores import calculate_overall_pii_score, iter_findings, pii_name_to_score
+
+# column prefix used in summary for each detector
+detector_column_prefixes = {
+    'presidio': 'p',
+    'pii_analyzer': 'pa',
+    'pii_catcher': 'pc',
+    'regex': 'r',
+}
+
+# pii names each detector can report, used to build a summary schema
+# which doesn't depend on which pii happened to be found
+detector_pii_names = {
+    'presidio': [
+        'CREDIT_CARD',
+        'CRYPTO',
+        'DATE_TIME',
+        'DOMAIN_NAME',
+        'EMAIL_ADDRESS',
+        'IBAN_CODE',
+        'IP_ADDRESS',
+        'NRP',
+        'LOCATION',
+        'PERSON',
+        'PHONE_NUMBER',
+        'MEDICAL_LICENSE',
+        'US_BANK_NUMBER',
+        'US_DRIVER_LICENSE',
+        'US_ITIN',
+        'US_PASSPORT',
+        'US_SSN',
+        'UK_NHS',
+        'AU_ABN',
+        'AU_ACN',
+        'AU_TFN',
+        'AU_MEDICARE',
+    ],
+    'pii_analyzer': [
+        'PERSON',
+        'LOCATION',
+        'ORGANIZATION',
+        'EMAIL_ADDRESS',
+        'PHONE_NUMBER',
+        'CREDIT_CARD',
+        'IP_ADDRESS',
+    ],
+    'pii_catcher': [
+        'PHONE_NUMBER',
+        'EMAIL_ADDRESS',
+        'CREDIT_CARD',
+        'ADDRESS',
+        'PERSON',
+        'LOCATION',
+        'BIRTH_DATE',
+        'GENDER',
+        'NATIONALITY',
+        'IP_ADDRESS',
+        'US_SSN',
+        'USER_NAME',
+        'PASSWORD',
+    ],
+    'regex': [
+        'EMAIL_ADDRESS',
+        'IBAN_CODE',
+        'CREDIT_CARD',
+        'US_SSN',
+        'IP_ADDRESS',
+        'ADDRESS',
+        'PHONE_NUMBER',
+    ],
 }
 
+summary_base_columns = [
+    'filepath',
+    'has_pii',
+    'pii_score',
+    'size_bytes',
+    'owner',
+    'group',
+    'cascade_tier',
+    'duplicate_group',
+]
+
+
+# weight of each pii in the pii score, pii missing from
+# pii_name_to_score don't count towards it
+pii_weights = pd.Series(pii_name_to_score, name='weight', dtype='float64')
+
+# columns of findings table, one row per pii found by a detector in a file.
+# file_id is the index of the file in results, and its row in the summary
+findings_columns = [
+    'file_id',
+    'detector',
+    'pii_type',
+    'count',
+]
+
+
+def get_summary_columns():
+    """
+    Returns fixed list of summary columns, covering
+    every pii each detector can report
+
+    Returns:
+        list:
+    """
+    columns = list(summary_base_columns)
+    for detector_name in detector_column_prefixes:
+        prefix = detector_column_prefixes[detector_name]
+        for pii_name in detector_pii_names[detector_name]:
+            columns.append(f'{prefix}_{pii_name.lower()}')
+    return columns
+
 
-def calculate_overall_pii_score(result):
+def get_cascade_tier(result):
     """
-    Returns overall pii score of a result using
-    dictionary pii_name_to_score
+    Returns detectors of the cascade tier which decided a file
 
     Args:
         result (dict):
 
     Returns:
-        int: pii score
+        str: empty without cascade
+    """
+    cascade = result['pii'].get('cascade')
+    return '+'.join(cascade['detectors']) if cascade else ''
+
+
+def build_summary_row(filepath, result):
+    """
+    Flattens result of a single file into a summary row
+
+    Args:
+        filepath (str):
+        result (dict):
+
+    Returns:
+        dict:
+    """
+    with measure_stage('score', filepath):
+        flattened_result = flatten_result(filepath, result)
+    recorder.flush(filepath)
+    return flattened_result
+
+
+def flatten_result(filepath, result):
+    """
+    Flattens result of a single file, see build_summary_row.
+    Used when rows are written one at a time, build_summary_df_from_results
+    builds every row at once
+
+    Args:
+        filepath (str):
+        result (dict):
+
+    Returns:
+        dict:
+    """
+    pii_score = calculate_overall_pii_score(result)
+
+    metadata = result['metadata']
+    flattened_result = {
+        'filepath': filepath,
+        'has_pii': pii_score > 0,
+        'pii_score': pii_score,
+        'size_bytes': metadata['size_bytes'],
+        'owner': metadata['owner'],
+        'group': metadata['group'],
+        'cascade_tier': get_cascade_tier(result),
+        'duplicate_group': result.get('duplicate_group', ''),
+    }
+
+    for detector_name, pii_name, count in iter_findings(result):
+        prefix = detector_column_prefixes[detector_name]
+        flattened_result[f'{prefix}_{pii_name.lower()}'] = count
+
+    return flattened_result
+
+
+def build_results_tables(results):
+    """
+    Splits results into a table of files and a long table of findings,
+    in a single pass over results
+
+    Args:
+        results (dict): filepath -> result
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: files indexed by file_id, with
+        base summary columns but the score, and findings, see findings_columns
+    """
+    filepaths = []
+    sizes = []
+    owners = []
+    groups = []
+    cascade_tiers = []
+    duplicate_groups = []
+    file_ids = []
+    detectors = []
+    pii_types = []
+    counts = []
+
+    for file_id, filepath in enumerate(results):
+        result = results[filepath]
+        metadata = result['metadata']
+        filepaths.append(filepath)
+        sizes.append(metadata['size_bytes'])
+        owners.append(metadata['owner'])
+        groups.append(metadata['group'])
+        cascade_tiers.append(get_cascade_tier(result))
+        duplicate_groups.append(result.get('duplicate_group', ''))
+        for detector_name, pii_name, count in iter_findings(result):
+            file_ids.append(file_id)
+            detectors.append(detector_name)
+            pii_types.append(pii_name)
+            counts.append(count)
+
+    files_df = pd.DataFrame({
+        'filepath': filepaths,
+        'size_bytes': pd.Series(sizes, dtype='int64'),
+        'owner': pd.Categorical(owners),
+        'group': pd.Categorical(groups),
+        'cascade_tier': pd.Categorical(cascade_tiers),
+        'duplicate_group': pd.Categorical(duplicate_groups),
+    })
+    files_df.index.name = 'file_id'
+
+    findings_df = pd.DataFrame({
+        'file_id': pd.Series(file_ids, dtype='int64'),
+        'detector': pd.Categorical(detectors, categories=list(detector_column_prefixes)),
+        'pii_type': pd.Categorical(pii_types),
+        'count': pd.Series(counts, dtype='int64'),
+    })
+    return files_df, findings_df
+
+
+def score_findings(findings_df, file_count):
+    """
+    Returns pii score of every file, joining findings
+    with the weight of their pii, see pii_weights
+
+    Args:
+        findings_df (pd.DataFrame): see build_results_tables
+        file_count (int):
+
+    Returns:
+        pd.Series: score by file_id
     """
-    score = 0
+    # mapping a categorical only looks up each distinct pii once
+    weights = findings_df['pii_type'].map(pii_weights).astype('float64').fillna(0)
+    scores = (findings_df['count'] * weights).groupby(findings_df['file_id']).sum()
+    return scores.reindex(range(file_count), fill_value=0)
 
-    if 'presidio' in result['pii']:
-        presidio_results = result['pii']['presidio']
-        for pii_name in presidio_results:
-            if pii_name in pii_name_to_score:
-                score += (pii_name_to_score[pii_name]
-                          * presidio_results[pii_name]['count'])
 
-    if 'pii_analyzer' in result['pii']:
-        pii_analyzer_results = result['pii']['pii_analyzer']
-        for pii_name in pii_analyzer_results:
-            score += (pii_name_to_score[pii_name]
-                      * len(pii_analyzer_results[pii_name]))
+def pivot_findings(findings_df, file_count):
+    """
+    Returns wide counts, one column per detector and pii, e.g. p_person
 
-    if 'pii_catcher' in result['pii']:
-        pii_catcher_results = result['pii']['pii_catcher']
-        for pii_name in pii_catcher_results:
-            score += (pii_name_to_score[pii_name]
-                      * pii_catcher_results[pii_name])
+    Args:
+        findings_df (pd.DataFrame): see build_results_tables
+        file_count (int):
 
-    return score
+    Returns:
+        pd.DataFrame: counts by file_id, columns ordered like get_summary_columns
+        followed by pii no detector lists in detector_pii_names
+    """
+    counts = findings_df.pivot_table(
+        index='file_id',
+        columns=['detector', 'pii_type'],
+        values='count',
+        aggfunc='sum',
+        fill_value=0,
+        observed=True,
+    )
+    counts.columns = [
+        f'{detector_column_prefixes[detector_name]}_{pii_name.lower()}'
+        for detector_name, pii_name in counts.columns
+    ]
+    known_columns = get_summary_columns()[len(summary_base_columns):]
+    columns = [column for column in known_columns if column in counts.columns]
+    columns += sorted([column for column in counts.columns if column not in known_columns])
+    return counts[columns].reindex(range(file_count), fill_value=0).astype('int64')
+
+
+def build_summary_df_from_tables(files_df, findings_df):
+    """
+    Builds summary dataframe from files and findings tables:
+    scores are a vectorized join and counts a pivot of findings
+
+    Args:
+        files_df (pd.DataFrame): see build_results_tables
+        findings_df (pd.DataFrame): see build_results_tables
+
+    Returns:
+        pd.DataFrame:
+    """
+    file_count = len(files_df)
+    scores = score_findings(findings_df, file_count)
+
+    df = files_df.assign(has_pii=scores > 0, pii_score=scores)
+    df = df[summary_base_columns]
+    df = df.join(pivot_findings(findings_df, file_count))
+    df.index.name = None
+    return df
 
 
 def build_summary_df_from_results(results):
@@ -87,43 +317,98 @@ def build_summary_df_from_results(results):
     Returns:
         pd.DataFrame:
     """
-    data = []
-    for filepath in results:
-        pii_score = calculate_overall_pii_score(results[filepath])
-        has_pii = pii_score > 0
+    df, _ = build_summary_and_findings(results)
+    return df
 
-        flattened_result = {}
 
-        flattened_result['filepath'] = filepath
-        flattened_result['has_pii'] = has_pii
-        flattened_result['pii_score'] = pii_score
+def build_summary_and_findings(results):
+    """
+    Builds summary dataframe and findings table from results dict
 
-        metadata = results[filepath]['metadata']
-        flattened_result['size_bytes'] = metadata['size_bytes']
-        flattened_result['owner'] = metadata['owner']
-        flattened_result['group'] = metadata['group']
+    Args:
+        results (dict):
 
-        if 'presidio' in results[filepath]['pii']:
-            presidio_results = results[filepath]['pii']['presidio']
-            for pii_name in presidio_results:
-                # ignoring dataframe for presidio analysis
-                if pii_name != 'df_pii':
-                    flattened_result[f'p_{pii_name.lower()}'] = presidio_results[pii_name]['count']
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: summary and findings,
+        see build_results_tables
+    """
+    filepaths = list(results)
+    with measure_stage('score', filepaths):
+        files_df, findings_df = build_results_tables(results)
+        df = build_summary_df_from_tables(files_df, findings_df)
+    if recorder.enabled:
+        for filepath in filepaths:
+            recorder.flush(filepath)
+    return df, findings_df
 
-        if 'pii_analyzer' in results[filepath]['pii']:
-            pii_analyzer_results = results[filepath]['pii']['pii_analyzer']
-            for pii_name in pii_analyzer_results:
-                flattened_result[f'pa_{pii_name.lower()}'] = len(
-                    pii_analyzer_results[pii_name])
 
-        if 'pii_catcher' in results[filepath]['pii']:
-            pii_catcher_results = results[filepath]['pii']['pii_catcher']
-            for pii_name in pii_catcher_results:
-                flattened_result[f'pc_{pii_name.lower()}'] = pii_catcher_results[pii_name]
+def get_typed_summary_df(df):
+    """
+    Returns summary with a fixed schema: file_id from the index of df, then
+    every column of get_summary_columns, in order, with compact dtypes.
+    Counts of pii no detector lists in detector_pii_names are dropped,
+    they are kept in the findings table
 
-        data.append(flattened_result)
+    Args:
+        df (pd.DataFrame): see build_summary_df_from_results
 
-    df = pd.DataFrame(data)
-    df.fillna(0, inplace=True)
+    Returns:
+        pd.DataFrame:
+    """
+    columns = get_summary_columns()
+    df = df.reindex(columns=columns)
+    df.insert(0, 'file_id', df.index.astype('int64'))
 
-    return df
+    count_columns = columns[len(summary_base_columns):]
+    df[count_columns] = df[count_columns].fillna(0).astype('int32')
+    return df.astype({
+        'filepath': 'str',
+        'has_pii': 'bool',
+        'pii_score': 'float64',
+        'size_bytes': 'int64',
+        # few distinct values repeated on millions of rows
+        'owner': 'category',
+        'group': 'category',
+        'cascade_tier': 'category',
+        'duplicate_group': 'category',
+    })
+
+
+def build_findings_rows(file_id, result):
+    """
+    Returns one row per pii found by a detector in a file
+
+    Args:
+        file_id (int): row of the file in the summary
+        result (dict):
+
+    Returns:
+        List[dict]: rows with findings_columns
+    """
+    return [
+        {
+            'file_id': file_id,
+            'detector': detector_name,
+            'pii_type': pii_name,
+            'count': count,
+        }
+        for detector_name, pii_name, count in iter_findings(result)
+    ]
+
+
+def get_typed_findings_df(df):
+    """
+    Returns findings table with compact dtypes
+
+    Args:
+        df (pd.DataFrame): see findings_columns
+
+    Returns:
+        pd.DataFrame:
+    """
+    return df.reindex(columns=findings_columns).astype({
+        'file_id': 'int64',
+        'detector': 'category',
+        'pii_type': 'category',
+        'count': 'int32',
+    })
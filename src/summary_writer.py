@@ -0,0 +1,375 @@
+import csv
+import json
+import os
+
+import pandas as pd
+
+from results_builder import (build_findings_rows, build_summary_and_findings, build_summary_row,
+                             findings_columns, get_summary_columns,
+                             get_typed_findings_df, get_typed_summary_df, summary_base_columns)
+
+# extensions of results written with pyarrow, with a typed schema
+columnar_extensions = ['.parquet', '.arrow', '.feather']
+
+
+class SummaryWriter():
+    """
+    Writes one summary row per file as soon as the file is scanned,
+    so results don't need to be kept in memory until the scan is done
+    and a crash only loses files which weren't finished yet.
+
+    Every row has the columns from get_summary_columns, missing
+    counts are written as 0 like build_summary_df_from_results does.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = get_summary_columns()
+        self.rows_written = 0
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+
+    def write_result(self, filepath, result):
+        """
+        Writes summary row of a single file
+
+        Args:
+            filepath (str):
+            result (dict): result of scan_file
+        """
+        flattened_result = build_summary_row(str(filepath), result)
+        row = {}
+        for column in self.columns:
+            row[column] = flattened_result.get(column, 0)
+        self.write_row(row)
+        self.rows_written += 1
+        # flush so rows survive a crash
+        self.file.flush()
+
+    def write_row(self, row):
+        pass
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CsvSummaryWriter(SummaryWriter):
+    """
+    Writes summary rows as csv, in the same layout as
+    build_summary_df_from_results(...).to_csv(path)
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer = csv.writer(self.file)
+        # first column is the index like pandas writes it
+        self.writer.writerow([''] + self.columns)
+
+    def write_row(self, row):
+        self.writer.writerow(
+            [self.rows_written] + [row[column] for column in self.columns])
+
+
+class JsonlSummaryWriter(SummaryWriter):
+    """
+    Writes summary rows as json lines
+    """
+
+    def write_row(self, row):
+        self.file.write(json.dumps(row) + '\n')
+
+
+class ParquetSummaryWriter(SummaryWriter):
+    """
+    Writes summary rows as parquet with the fixed schema of get_typed_summary_df,
+    and pii found in a findings table next to it, see get_findings_path.
+
+    Rows are buffered and written row_group_size at a time, parquet files are
+    only readable once closed so a crash loses the whole file.
+    """
+
+    def __init__(self, path, row_group_size=10000):
+        # parquet writers open the files once the schema is known
+        self.path = path
+        self.columns = get_summary_columns()
+        self.rows_written = 0
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.findings = []
+        self.summary_writer = None
+        self.findings_writer = None
+
+    def write_result(self, filepath, result):
+        self.rows.append(build_summary_row(str(filepath), result))
+        self.findings.extend(build_findings_rows(self.rows_written, result))
+        self.rows_written += 1
+        if len(self.rows) >= self.row_group_size:
+            self.write_row_group()
+
+    def write_row_group(self):
+        import pyarrow.parquet as pq
+
+        # file_id is the number of the row in the whole file
+        first_id = self.rows_written - len(self.rows)
+        summary_df = get_typed_summary_df(pd.DataFrame(
+            self.rows, index=range(first_id, self.rows_written)))
+        findings_df = get_typed_findings_df(pd.DataFrame(self.findings, columns=findings_columns))
+        if self.summary_writer is None:
+            self.summary_schema = get_arrow_schema(summary_df)
+            self.findings_schema = get_arrow_schema(findings_df)
+            self.summary_writer = pq.ParquetWriter(self.path, self.summary_schema)
+            self.findings_writer = pq.ParquetWriter(
+                get_findings_path(self.path), self.findings_schema)
+
+        self.summary_writer.write_table(to_arrow_table(summary_df, self.summary_schema))
+        self.findings_writer.write_table(to_arrow_table(findings_df, self.findings_schema))
+        self.rows = []
+        self.findings = []
+
+    def close(self):
+        # files of empty scans still get the schema
+        if len(self.rows) > 0 or self.summary_writer is None:
+            self.write_row_group()
+        self.summary_writer.close()
+        self.findings_writer.close()
+
+
+def is_columnar(path):
+    """
+    Returns whether results at path are written with pyarrow
+
+    Args:
+        path (str):
+
+    Returns:
+        bool:
+    """
+    return os.path.splitext(str(path))[1] in columnar_extensions
+
+
+def get_findings_path(path):
+    """
+    Returns path of findings table written next to results,
+    e.g. results.findings.parquet for results.parquet
+
+    Args:
+        path (str):
+
+    Returns:
+        str:
+    """
+    root, extension = os.path.splitext(str(path))
+    return f'{root}.findings{extension}'
+
+
+def get_arrow_schema(df):
+    """
+    Returns arrow schema of a typed dataframe. Categories are stored as
+    dictionaries with int32 indices, whatever their number in df
+
+    Args:
+        df (pd.DataFrame): see get_typed_summary_df
+
+    Returns:
+        pyarrow.Schema:
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for index, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(index, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+
+def to_arrow_table(df, schema=None):
+    """
+    Converts typed dataframe to an arrow table
+
+    Args:
+        df (pd.DataFrame):
+        schema (pyarrow.Schema): see get_arrow_schema, None to use the schema of df
+
+    Returns:
+        pyarrow.Table:
+    """
+    import pyarrow as pa
+
+    if schema is None:
+        schema = get_arrow_schema(df)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def write_table(df, path):
+    """
+    Writes typed dataframe as parquet, or as an arrow file for
+    .arrow and .feather
+
+    Args:
+        df (pd.DataFrame):
+        path (str):
+    """
+    table = to_arrow_table(df)
+    if str(path).endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(table, str(path))
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, str(path))
+
+
+def open_summary_writer(path):
+    """
+    Returns summary writer for path, jsonl if path ends
+    with .jsonl, parquet for .parquet, csv otherwise
+
+    Args:
+        path (str):
+
+    Returns:
+        SummaryWriter:
+    """
+    if str(path).endswith('.jsonl'):
+        return JsonlSummaryWriter(path)
+    if str(path).endswith('.parquet'):
+        return ParquetSummaryWriter(path)
+    return CsvSummaryWriter(path)
+
+
+def read_summary(path):
+    """
+    Reads summary written by cli.py, as csv, json lines, parquet or arrow
+
+    Args:
+        path (str):
+
+    Returns:
+        pd.DataFrame:
+    """
+    if str(path).endswith('.parquet'):
+        return pd.read_parquet(path)
+    if is_columnar(path):
+        return pd.read_feather(path)
+    if str(path).endswith('.jsonl'):
+        return pd.read_json(path, lines=True, dtype={'owner': str, 'group': str})
+    return pd.read_csv(path, index_col=0, dtype={'owner': str, 'group': str})
+
+
+def merge_summaries(paths):
+    """
+    Merges partial summaries, e.g. of shards scanned on different machines.
+    Columns are the union of get_summary_columns and the columns of every
+    partial summary, counts missing from a partial summary are 0
+
+    Args:
+        paths (List[str]):
+
+    Returns:
+        pd.DataFrame:
+    """
+    df = pd.concat([read_summary(path) for path in paths], ignore_index=True)
+    # ids of columnar summaries only hold within their shard
+    df = df.drop(columns=['file_id'], errors='ignore')
+
+    # a file scanned by two shards, e.g. when shard counts didn't match
+    duplicated = df['filepath'].duplicated(keep='last')
+    if duplicated.any():
+        print(f'{duplicated.sum()} file(s) found in more than one partial summary, keeping the last')
+        df = df[~duplicated].reset_index(drop=True)
+
+    columns = get_summary_columns()
+    columns += [column for column in df.columns if column not in columns]
+    df = df.reindex(columns=columns)
+
+    count_columns = [column for column in columns if column not in summary_base_columns]
+    df[count_columns] = df[count_columns].fillna(0).astype('int64')
+    df['has_pii'] = df['has_pii'].fillna(False).astype(bool)
+    df['pii_score'] = df['pii_score'].fillna(0)
+    for column in ['cascade_tier', 'duplicate_group']:
+        df[column] = df[column].astype(object).fillna('')
+    return df
+
+
+def merge_findings(paths, df):
+    """
+    Merges findings tables written next to partial summaries,
+    file ids are changed to rows of the merged summary. Like
+    merge_summaries, a file found in more than one partial summary
+    keeps the findings of the last one only
+
+    Args:
+        paths (List[str]): paths of partial summaries
+        df (pd.DataFrame): merged summary, see merge_summaries
+
+    Returns:
+        pd.DataFrame: None if no partial summary has a findings table
+    """
+    partials = []
+    missing = []
+    for path in paths:
+        partial_df = read_summary(path)
+        findings_df = None
+        if is_columnar(path) and os.path.exists(get_findings_path(path)):
+            findings_df = read_summary(get_findings_path(path))
+            filepaths = pd.Series(partial_df['filepath'].to_numpy(), index=partial_df['file_id'])
+            findings_df['filepath'] = findings_df['file_id'].map(filepaths)
+        else:
+            missing.append(str(path))
+        partials.append((set(partial_df['filepath']), findings_df))
+
+    if len(missing) > 0:
+        print(f'{len(missing)} partial summary(ies) without a findings table, findings of their '
+              f'files are missing from the merged findings: {", ".join(missing)}')
+
+    partial_findings = []
+    # files of partial summaries after the current one
+    superseded = set()
+    for filepaths, findings_df in reversed(partials):
+        if findings_df is not None:
+            partial_findings.append(findings_df[~findings_df['filepath'].isin(superseded)])
+        superseded |= filepaths
+    if len(partial_findings) == 0:
+        return None
+
+    findings_df = pd.concat(reversed(partial_findings), ignore_index=True)
+    file_ids = pd.Series(df.index, index=df['filepath'])
+    findings_df['file_id'] = findings_df['filepath'].map(file_ids)
+    return get_typed_findings_df(findings_df.reset_index(drop=True))
+
+
+def write_summary_df(df, path):
+    """
+    Writes summary dataframe, as json lines if path ends with .jsonl,
+    with the typed schema of get_typed_summary_df for .parquet, .arrow
+    and .feather, and csv otherwise
+
+    Args:
+        df (pd.DataFrame):
+        path (str):
+    """
+    if is_columnar(path):
+        write_table(get_typed_summary_df(df), path)
+    elif str(path).endswith('.jsonl'):
+        df.to_json(path, orient='records', lines=True)
+    else:
+        df.to_csv(path)
+
+
+def write_results(results, path):
+    """
+    Writes summary of results, see write_summary_df. Columnar
+    results also get the findings table of every file
+
+    Args:
+        results (dict): see parse_files
+        path (str):
+    """
+    df, findings_df = build_summary_and_findings(results)
+    write_summary_df(df, path)
+    if is_columnar(path):
+        write_table(get_typed_findings_df(findings_df), get_findings_path(path))
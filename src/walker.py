@@ -0,0 +1,193 @@
+import fnmatch
+import os
+
+# folders holding no documents worth scanning (version control, dependencies,
+# caches), skipped with everything in them
+noise_dirs = [
+    '.git',
+    '.hg',
+    '.svn',
+    'node_modules',
+    '__pycache__',
+    '.cache',
+    '.mypy_cache',
+    '.pytest_cache',
+    '.tox',
+    '.venv',
+    '.ipynb_checkpoints',
+]
+
+# what the walk does with symbolic links: skip them, follow links to files
+# only, like os.walk, or follow links to files and folders
+symlink_policies = ['skip', 'files', 'follow']
+
+# options of every walk, see walk_files and configure_parsers
+walk_options = {
+    'include': None,
+    'exclude': None,
+    'max_depth': None,
+    'min_size': None,
+    'max_size': None,
+    'symlinks': 'files',
+    'prune': noise_dirs,
+}
+
+
+def matches_any(name, relative_path, patterns):
+    """
+    Returns whether a glob matches a file or folder. Globs without a slash
+    match its name, e.g. *.pdf, others its path relative to the walked
+    folder, e.g. hr/*/contracts
+
+    Args:
+        name (str):
+        relative_path (str): with / separators
+        patterns (List[str]):
+
+    Returns:
+        bool:
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatch(relative_path if '/' in pattern else name, pattern):
+            return True
+    return False
+
+
+def walk_files(path, include=None, exclude=None, max_depth=None, min_size=None,
+               max_size=None, symlinks='files', prune=None):
+    """
+    Yields files in folder and the directory entries os.scandir found them
+    with. Entries know whether they are files or folders without a stat on
+    most systems, and keep their stat once taken, so it is only taken when
+    size bounds are given or a caller asks for it
+
+    Args:
+        path (str): folder path
+        include (List[str]): globs of files to yield, None for every file
+        exclude (List[str]): globs of files and folders to skip, see matches_any
+        max_depth (int): levels of subfolders walked, 0 for files of path
+            only, None for no limit
+        min_size (int): smallest file size in bytes, None for no bound
+        max_size (int): largest file size in bytes, None for no bound
+        symlinks (str): see symlink_policies
+        prune (List[str]): names of folders skipped, see noise_dirs
+
+    Yields:
+        Generator[Tuple[str, os.DirEntry], None, None]: file path and its entry
+    """
+    if symlinks not in symlink_policies:
+        raise ValueError(f'Unknown symlink policy {symlinks}, choose from {", ".join(symlink_policies)}')
+    prune = set(prune or [])
+    follow_dirs = symlinks == 'follow'
+    # (device, inode) of walked folders, links can make cycles
+    visited = set()
+    # folders left to walk, depth first like os.walk
+    stack = [(str(path), '', 0)]
+
+    while stack:
+        folder, relative_folder, depth = stack.pop()
+        if follow_dirs:
+            try:
+                stat_info = os.stat(folder)
+            except OSError as e:
+                print(f'Error while reading {folder}: {e}. Skipping!')
+                continue
+            if (stat_info.st_dev, stat_info.st_ino) in visited:
+                continue
+            visited.add((stat_info.st_dev, stat_info.st_ino))
+
+        try:
+            with os.scandir(folder) as entries:
+                entries = list(entries)
+        except OSError as e:
+            print(f'Error while listing {folder}: {e}. Skipping!')
+            continue
+
+        subfolders = []
+        for entry in entries:
+            relative_path = f'{relative_folder}{entry.name}'
+            try:
+                is_symlink = entry.is_symlink()
+                if is_symlink and symlinks == 'skip':
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=follow_dirs)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+
+            if is_dir:
+                if entry.name in prune or (max_depth is not None and depth >= max_depth):
+                    continue
+                if exclude and matches_any(entry.name, relative_path, exclude):
+                    continue
+                subfolders.append((entry.path, f'{relative_path}/', depth + 1))
+                continue
+            if not is_file:
+                # broken link, socket, fifo...
+                continue
+
+            if exclude and matches_any(entry.name, relative_path, exclude):
+                continue
+            if include and not matches_any(entry.name, relative_path, include):
+                continue
+            if min_size is not None or max_size is not None:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if min_size is not None and size < min_size:
+                    continue
+                if max_size is not None and size > max_size:
+                    continue
+            yield entry.path, entry
+
+        stack.extend(reversed(subfolders))
+
+
+def is_walked(filepath, path, include=None, exclude=None, max_depth=None, min_size=None,
+              max_size=None, symlinks='files', prune=None):
+    """
+    Returns whether walk_files of a folder yields a file, e.g. for files
+    changed since the folder was walked. Links to folders on the way
+    to the file aren't checked
+
+    Args:
+        filepath (str):
+        path (str): walked folder path
+        include, exclude, max_depth, min_size, max_size, symlinks, prune: see walk_files
+
+    Returns:
+        bool:
+    """
+    relative_path = os.path.relpath(filepath, path).replace(os.sep, '/')
+    parts = relative_path.split('/')
+    if parts[0] == '..':
+        return False
+    if max_depth is not None and len(parts) - 1 > max_depth:
+        return False
+
+    prune = set(prune or [])
+    for index, name in enumerate(parts[:-1]):
+        if name in prune:
+            return False
+        if exclude and matches_any(name, '/'.join(parts[:index + 1]), exclude):
+            return False
+    if exclude and matches_any(parts[-1], relative_path, exclude):
+        return False
+    if include and not matches_any(parts[-1], relative_path, include):
+        return False
+
+    try:
+        if symlinks == 'skip' and os.path.islink(filepath):
+            return False
+        if not os.path.isfile(filepath):
+            return False
+        if min_size is not None or max_size is not None:
+            size = os.path.getsize(filepath)
+            if min_size is not None and size < min_size:
+                return False
+            if max_size is not None and size > max_size:
+                return False
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,327 @@
+import os
+import signal
+import threading
+import time
+
+from parse_files import iter_parse_entries, iter_parse_filepaths
+from summary_writer import write_results
+from walker import is_walked, walk_files, walk_options
+
+# files sqlite writes next to a database, e.g. the result cache
+sqlite_file_suffixes = ['-wal', '-shm', '-journal']
+
+
+class ChangeQueue():
+    """
+    Paths changed since they were last scanned, filled by a watcher thread.
+
+    A path is only handed out once no event was seen for it for debounce
+    seconds, so a file written in many chunks is scanned once.
+    """
+
+    def __init__(self, debounce=2.0):
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        # path -> time of last event
+        self.pending = {}
+
+    def add(self, path):
+        with self.lock:
+            self.pending[path] = time.monotonic()
+
+    def pop_ready(self):
+        """
+        Returns paths without events for debounce seconds, removing them
+
+        Returns:
+            List[str]:
+        """
+        now = time.monotonic()
+        with self.lock:
+            ready = [
+                path for path, last_event in self.pending.items()
+                if now - last_event >= self.debounce
+            ]
+            for path in ready:
+                del self.pending[path]
+        return ready
+
+
+class PollingWatcher(threading.Thread):
+    """
+    Finds created, modified and deleted files by comparing the size and
+    mtime of every file between walks of the folder, used when watchdog
+    isn't installed or can't watch the folder (e.g. network shares)
+    """
+
+    def __init__(self, path, changes, interval=5.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.changes = changes
+        self.interval = interval
+        self.stopped = threading.Event()
+        # taken now so changes made during the first scan are seen
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        """
+        Returns (size, mtime) of every file in folder
+
+        Returns:
+            dict: filepath -> (size, mtime)
+        """
+        snapshot = {}
+        for filepath, entry in walk_files(self.path, **walk_options):
+            try:
+                # taken once by the walk if it filters by size
+                stat_info = entry.stat()
+            except OSError:
+                # deleted during the walk
+                continue
+            snapshot[filepath] = (stat_info.st_size, stat_info.st_mtime_ns)
+        return snapshot
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            snapshot = self.take_snapshot()
+            for filepath in snapshot.keys() | self.snapshot.keys():
+                if snapshot.get(filepath) != self.snapshot.get(filepath):
+                    self.changes.add(filepath)
+            self.snapshot = snapshot
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_event_watcher(path, changes):
+    """
+    Starts a watchdog observer (inotify on Linux, FSEvents on macOS)
+    adding changed paths to changes
+
+    Args:
+        path (str): folder path
+        changes (ChangeQueue):
+
+    Returns:
+        watchdog.observers.Observer: started observer, None if watchdog
+        isn't installed or can't watch the folder
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class ChangeHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            # folders only matter when they appear or go away as a whole,
+            # they are modified by any change of a file inside them
+            if event.is_directory and event.event_type not in ['created', 'deleted', 'moved']:
+                return
+            changes.add(event.src_path)
+            if event.event_type == 'moved':
+                changes.add(event.dest_path)
+
+    try:
+        observer = Observer()
+        observer.schedule(ChangeHandler(), str(path), recursive=True)
+        observer.start()
+    except Exception as e:
+        print(f'Error while watching {path} for events: {e}. Polling instead!')
+        return None
+    return observer
+
+
+class FolderWatcher():
+    """
+    Keeps results of every file in a folder up to date: the folder is
+    scanned once, then only created and modified files are scanned again
+    and deleted files are dropped.
+
+    Changes are scanned in this process so models stay loaded between
+    changes, workers are only used for the first scan. The summary is
+    written after the first scan, on SIGUSR1 and on exit.
+    """
+
+    def __init__(self, path, results_path, workers=1, cache=None, dedup=False, debounce=2.0,
+                 poll_interval=None, ignored=None):
+        self.path = str(path)
+        self.results_path = results_path
+        self.workers = workers
+        self.cache = cache
+        # scan one file of each group of identical files, see iter_parse_filepaths
+        self.dedup = dedup
+        # seconds to poll the folder every, None to use watchdog events if possible
+        self.poll_interval = poll_interval
+        # files written by the scan itself, e.g. the summary or the cache
+        self.ignored = [os.path.abspath(ignored_path) for ignored_path in ignored or []]
+        self.changes = ChangeQueue(debounce)
+        # filepath -> results, see parse_files
+        self.results = {}
+        self.observer = None
+        self.summary_requested = False
+        self.stopped = False
+
+    def is_ignored(self, path):
+        path = os.path.abspath(path)
+        for ignored_path in self.ignored:
+            if path == ignored_path or path.startswith(os.path.join(ignored_path, '')):
+                return True
+            if path in [ignored_path + suffix for suffix in sqlite_file_suffixes]:
+                return True
+        return False
+
+    def start_watching(self):
+        if self.poll_interval is None:
+            self.observer = start_event_watcher(self.path, self.changes)
+        if self.observer is None:
+            self.observer = PollingWatcher(self.path, self.changes, self.poll_interval or 5.0)
+            self.observer.start()
+            print(f'Polling {self.path} for changes every {self.observer.interval}s')
+        else:
+            print(f'Watching {self.path} for changes')
+
+    def stop_watching(self):
+        if self.observer is None:
+            return
+        self.observer.stop()
+        self.observer.join()
+        self.observer = None
+
+    def scan_all(self):
+        entries = (
+            (filepath, entry) for filepath, entry in walk_files(self.path, **walk_options)
+            if not self.is_ignored(filepath))
+        for filepath, result in iter_parse_entries(
+                entries, workers=self.workers, cache=self.cache, dedup=self.dedup):
+            self.results[filepath] = result
+
+    def get_duplicate_copies(self, filepaths):
+        """
+        Returns scanned files sharing a duplicate group with any of filepaths,
+        their results came from a file which may have changed
+
+        Args:
+            filepaths (Iterable[str]):
+
+        Returns:
+            Set[str]: files not in filepaths
+        """
+        filepaths = set(filepaths)
+        groups = set([
+            self.results[filepath].get('duplicate_group')
+            for filepath in filepaths if filepath in self.results
+        ])
+        groups.discard(None)
+        if len(groups) == 0:
+            return set()
+        return set([
+            filepath for filepath, result in self.results.items()
+            if result.get('duplicate_group') in groups and filepath not in filepaths
+        ])
+
+    def process_changes(self):
+        """
+        Scans files changed for longer than debounce seconds and
+        drops results of deleted files. Files identical to a changed
+        or deleted file are scanned again with it
+
+        Returns:
+            Tuple[int, int]: number of files scanned and removed
+        """
+        ready = [path for path in self.changes.pop_ready() if not self.is_ignored(path)]
+        if len(ready) == 0:
+            return 0, 0
+
+        prefixes = tuple([os.path.join(path, '') for path in ready])
+        copies = self.get_duplicate_copies([
+            filepath for filepath in self.results
+            if filepath in ready or filepath.startswith(prefixes)
+        ])
+
+        filepaths = set()
+        removed = 0
+        for path in ready:
+            if os.path.isfile(path):
+                if is_walked(path, self.path, **walk_options):
+                    filepaths.add(path)
+                elif path in self.results:
+                    # e.g. grew above the largest size scanned
+                    del self.results[path]
+                    removed += 1
+                continue
+            if os.path.isdir(path):
+                # folder moved or copied in, filtered as part of the watched folder
+                filepaths.update([
+                    filepath for filepath, _ in walk_files(
+                        path, symlinks=walk_options['symlinks'], prune=walk_options['prune'])
+                    if not self.is_ignored(filepath) and is_walked(filepath, self.path, **walk_options)
+                ])
+                continue
+            # file or folder deleted or moved out
+            prefix = os.path.join(path, '')
+            for filepath in [
+                filepath for filepath in self.results
+                if filepath == path or filepath.startswith(prefix)
+            ]:
+                del self.results[filepath]
+                removed += 1
+
+        # copies got their results from a file which changed or is gone
+        filepaths.update([
+            filepath for filepath in copies
+            if filepath in self.results and os.path.isfile(filepath)
+        ])
+
+        # files which are now empty or unsupported lose their results
+        previous = [filepath for filepath in filepaths if filepath in self.results]
+        for filepath in previous:
+            del self.results[filepath]
+        scanned = 0
+        for filepath, result in iter_parse_filepaths(sorted(filepaths), cache=self.cache, dedup=self.dedup):
+            self.results[filepath] = result
+            scanned += 1
+        removed += len([filepath for filepath in previous if filepath not in self.results])
+        return scanned, removed
+
+    def write_summary(self):
+        write_results(self.results, self.results_path)
+        print(f'Wrote summary of {len(self.results)} file(s) to {self.results_path}')
+
+    def request_summary(self, signum, frame):
+        # only sets a flag, the summary is written by the main loop
+        self.summary_requested = True
+
+    def stop(self, signum=None, frame=None):
+        self.stopped = True
+
+    def run(self, tick=0.5):
+        """
+        Scans the folder and keeps results up to date until interrupted
+
+        Args:
+            tick (float): seconds between checks for changes ready to scan
+        """
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.request_summary)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        # changes made during the first scan are picked up after it
+        self.start_watching()
+        try:
+            self.scan_all()
+            self.write_summary()
+            while not self.stopped:
+                time.sleep(tick)
+                scanned, removed = self.process_changes()
+                if scanned > 0 or removed > 0:
+                    print(f'Scanned {scanned} changed file(s), removed {removed} file(s)')
+                if self.summary_requested:
+                    self.summary_requested = False
+                    self.write_summary()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop_watching()
+
+        self.write_summary()
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from parsers.DefaultParser import DefaultParser
+from parsers.detectors.DetectorInterface import DetectorInterface
+from parsers.detectors.RegexDetector import RegexDetector
+
+
+class FakeNerDetector(DetectorInterface):
+    """
+    Finds Jane as a person, and records the detectors which ran
+    """
+
+    def __init__(self, name, ran):
+        self.name = name
+        self.ran = ran
+
+    def extract_pii_from_text(self, text):
+        self.ran.append(self.name)
+        if 'Jane' not in text:
+            return {}
+        return {'PERSON': {'count': text.count('Jane'), 'values': ['Jane']}}
+
+
+@pytest.fixture
+def ran(monkeypatch):
+    ran = []
+    detectors = {'regex': RegexDetector()}
+    for detector_name in ['pii_catcher', 'presidio', 'pii_analyzer']:
+        detectors[detector_name] = FakeNerDetector(detector_name, ran)
+    monkeypatch.setattr(DefaultParser, 'detectors', detectors)
+    return ran
+
+
+def test_tiers_run_cheapest_first(ran):
+    assert DefaultParser(cascade_threshold=1.0).get_detector_tiers() == [
+        ['regex'], ['pii_catcher', 'presidio'], ['pii_analyzer']]
+    # without cascade every detector runs together
+    assert DefaultParser().get_detector_tiers() == [['regex', 'pii_catcher', 'presidio', 'pii_analyzer']]
+
+
+def test_stops_once_score_reaches_threshold(ran):
+    results = DefaultParser(cascade_threshold=1.0).detect_pii_in_text('ssn 123-45-6789', 'a.txt')
+    assert ran == []
+    assert results['cascade']['tier'] == 0
+    assert results['cascade']['reason'] == 'threshold'
+    assert results['cascade']['skipped'] == ['pii_catcher', 'presidio', 'pii_analyzer']
+
+
+def test_runs_next_tier_below_threshold(ran):
+    results = DefaultParser(cascade_threshold=1.0).detect_pii_in_text(
+        'Jane and Jane wrote to jane@example.com', 'a.txt')
+    # email (0.3) and two persons (0.7 each) reach the threshold after the second tier
+    assert ran == ['pii_catcher', 'presidio']
+    assert results['cascade']['detectors'] == ['pii_catcher', 'presidio']
+    assert results['cascade']['reason'] == 'threshold'
+    assert 'pii_analyzer' not in results
+
+
+def test_runs_every_tier_without_enough_pii(ran):
+    results = DefaultParser(cascade_threshold=1.0).detect_pii_in_text('nothing to see here', 'a.txt')
+    assert ran == ['pii_catcher', 'presidio', 'pii_analyzer']
+    assert results['cascade']['reason'] == 'last_tier'
+    assert results['cascade']['skipped'] == []
+
+
+def test_skips_ner_on_text_without_letters(ran):
+    results = DefaultParser(cascade_threshold=1.0).detect_pii_in_text('1234 5678', 'a.txt')
+    assert ran == []
+    assert results['cascade']['reason'] == 'no_letters'
+
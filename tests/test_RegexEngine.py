@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from parsers.detectors.RegexEngine import scan_structured_pii
+
+
+def test_finds_card_overlapping_rejected_match():
+    # 2027 4111 1111 1111 matches the card pattern but fails the Luhn check
+    spans = scan_structured_pii('exp 2027 4111 1111 1111 1111')
+    assert [(span.pii_type, span.value) for span in spans] == [('CREDIT_CARD', '4111 1111 1111 1111')]
+
+
+def test_drops_invalid_card():
+    spans = scan_structured_pii('order 4111 1111 1111 1112')
+    assert 'CREDIT_CARD' not in [span.pii_type for span in spans]
+
+
+def test_finds_spans_in_order():
+    spans = scan_structured_pii('mail jane@example.com, ssn 123-45-6789')
+    assert [(span.pii_type, span.value) for span in spans] == [
+        ('EMAIL_ADDRESS', 'jane@example.com'),
+        ('US_SSN', '123-45-6789'),
+    ]
+
+
+def test_tries_other_patterns_where_check_failed():
+    # 1234 5678 9012 3456 fails the Luhn check, a phone number starts at the same position
+    spans = scan_structured_pii('call 1234 5678 9012 3456')
+    assert (spans[0].pii_type, spans[0].start, spans[0].value) == ('PHONE_NUMBER', 5, '1234 5678')
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import dedup
+from dedup import PARTIAL_HASH_SIZE, find_duplicates
+from result_cache import ResultCache, hash_file
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    # files read by each stage
+    hashed = {'ends': [], 'full': []}
+
+    def hash_file_ends(filepath, size):
+        hashed['ends'].append(os.path.basename(filepath))
+        return real_hash_file_ends(filepath, size)
+
+    def count_hash_file(filepath):
+        hashed['full'].append(os.path.basename(filepath))
+        return hash_file(filepath)
+
+    real_hash_file_ends = dedup.hash_file_ends
+    monkeypatch.setattr(dedup, 'hash_file_ends', hash_file_ends)
+    monkeypatch.setattr(dedup, 'hash_file', count_hash_file)
+    return hashed
+
+
+def write_files(folder, contents):
+    files = []
+    for name, data in contents.items():
+        (folder / name).write_bytes(data)
+        files.append((str(folder / name), os.path.splitext(name)[1], None))
+    return files
+
+
+def test_files_of_different_sizes_are_never_read(tmp_path, hashed):
+    files = write_files(tmp_path, {'a.txt': b'one', 'b.txt': b'three', 'c.txt': b'seventeen'})
+    files_to_scan, duplicates = find_duplicates(files)
+    assert files_to_scan == files
+    assert duplicates == {}
+    assert hashed == {'ends': [], 'full': []}
+
+
+def test_files_with_different_ends_are_not_fully_hashed(tmp_path, hashed):
+    files = write_files(tmp_path, {'a.txt': b'first', 'b.txt': b'other'})
+    _, duplicates = find_duplicates(files)
+    assert duplicates == {}
+    assert hashed == {'ends': ['a.txt', 'b.txt'], 'full': []}
+
+
+def test_files_with_the_same_ends_are_fully_hashed(tmp_path, hashed):
+    ends = b'x' * PARTIAL_HASH_SIZE
+    files = write_files(tmp_path, {
+        'a.txt': ends + b'middle' + ends,
+        'b.txt': ends + b'MIDDLE' + ends,
+    })
+    _, duplicates = find_duplicates(files)
+    assert duplicates == {}
+    assert hashed == {'ends': ['a.txt', 'b.txt'], 'full': ['a.txt', 'b.txt']}
+
+
+def test_copies_are_grouped_under_the_first_file(tmp_path, hashed):
+    files = write_files(tmp_path, {
+        'a.txt': b'same contents',
+        'b.txt': b'other things!',
+        'c.txt': b'same contents',
+        'd.txt': b'same contents',
+    })
+    files_to_scan, duplicates = find_duplicates(files)
+    assert [filepath for filepath, _, _ in files_to_scan] == [str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt')]
+    assert duplicates == {
+        str(tmp_path / 'a.txt'): (
+            hash_file(tmp_path / 'a.txt')[:16], [str(tmp_path / 'c.txt'), str(tmp_path / 'd.txt')]),
+    }
+
+
+def test_copies_of_different_types_are_scanned_apart(tmp_path, hashed):
+    files = write_files(tmp_path, {'a.csv': b'name,ssn\n', 'a.txt': b'name,ssn\n'})
+    files_to_scan, duplicates = find_duplicates(files)
+    assert files_to_scan == files
+    assert duplicates == {}
+    assert hashed == {'ends': [], 'full': []}
+
+
+def test_hashes_of_unchanged_files_come_from_the_cache(tmp_path, hashed):
+    files = write_files(tmp_path, {'a.txt': b'same contents', 'b.txt': b'same contents'})
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        for filepath, _, _ in files:
+            cache.get_content_hash(filepath)
+        _, duplicates = find_duplicates(files, cache)
+    assert list(duplicates) == [str(tmp_path / 'a.txt')]
+    assert hashed['full'] == []
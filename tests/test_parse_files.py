@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from parse_files import configure_parsers, filter_shard, get_shard_index, parse_files, read_ahead
+from walker import walk_files
+
+
+@pytest.fixture
+def regex_only():
+    # regex needs no models, so workers start fast
+    configure_parsers({'detectors': ['regex'], 'parsers': ['default']})
+    yield
+    configure_parsers({})
+
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / 'contact.txt').write_text('mail jane@example.com, ssn 123-45-6789\n')
+    (tmp_path / 'notes.txt').write_text('nothing to see here\n')
+    (tmp_path / 'hr').mkdir()
+    (tmp_path / 'hr' / 'card.txt').write_text('card 4111 1111 1111 1111\n')
+    (tmp_path / 'empty.txt').write_text('')
+    return tmp_path
+
+
+def test_pool_finds_what_a_single_process_finds(regex_only, folder):
+    serial = parse_files(str(folder))
+    pooled = parse_files(str(folder), workers=2)
+    assert sorted(pooled) == sorted(serial) == sorted([
+        str(folder / 'contact.txt'), str(folder / 'notes.txt'), str(folder / 'hr' / 'card.txt')])
+    for filepath in serial:
+        assert pooled[filepath]['pii'] == serial[filepath]['pii']
+        assert pooled[filepath]['metadata']['size_bytes'] == os.path.getsize(filepath)
+    assert set(serial[str(folder / 'contact.txt')]['pii']['regex']) == set(['EMAIL_ADDRESS', 'US_SSN'])
+
+
+def test_shards_get_a_fair_share_of_files():
+    relative_paths = [f'folder{index % 7}/file{index}.txt' for index in range(200)]
+    shards = [get_shard_index(relative_path, 4) for relative_path in relative_paths]
+    assert set(shards) == set([1, 2, 3, 4])
+    assert min([shards.count(shard) for shard in [1, 2, 3, 4]]) > 20
+
+
+def test_shard_of_a_file_does_not_depend_on_the_mount_point():
+    entries = [(os.path.join(root, 'hr', f'file{index}.txt'), None) for index in range(50)
+               for root in ['/mnt/share', '/Volumes/share/scans']]
+    for shard in [(1, 3), (2, 3), (3, 3)]:
+        on_linux = [os.path.relpath(filepath, '/mnt/share')
+                    for filepath, _ in filter_shard(entries[0::2], '/mnt/share', shard)]
+        on_mac = [os.path.relpath(filepath, '/Volumes/share/scans')
+                  for filepath, _ in filter_shard(entries[1::2], '/Volumes/share/scans', shard)]
+        assert on_linux == on_mac
+
+
+def test_shard_scans_cover_the_folder_once(regex_only, folder):
+    scanned = []
+    for shard_index in [1, 2, 3]:
+        scanned.extend(parse_files(str(folder), shard=(shard_index, 3)))
+    assert sorted(scanned) == sorted(parse_files(str(folder)))
+
+
+def test_metadata_re_uses_the_stat_of_the_walk(folder, monkeypatch):
+    entries = list(walk_files(str(folder), min_size=1))
+    stats = []
+    real_stat = os.stat
+    monkeypatch.setattr(os, 'stat', lambda *args, **kwargs: stats.append(args) or real_stat(*args, **kwargs))
+
+    for filepath, entry in entries:
+        prefetched = read_ahead(filepath, entry)
+        assert prefetched['metadata']['size_bytes'] == entry.stat().st_size
+        assert prefetched['data'] == open(filepath, 'rb').read()
+    assert stats == []
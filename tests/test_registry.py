@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from parse_files import sniff_file
+from parsers.registry import sniff_file_type
+
+
+def test_binary_formats_are_found_by_leading_bytes():
+    assert sniff_file_type(b'%PDF-1.7\n...', '') == '.pdf'
+    assert sniff_file_type(b'%PDF-1.7\n...', '.txt') == '.pdf'
+    assert sniff_file_type(b'\x89PNG\r\n\x1a\n\x00\x00', '.bin') == '.png'
+    assert sniff_file_type(b'\xff\xd8\xff\xe0\x00\x10JFIF', '.dat') == '.jpg'
+
+
+def test_extension_of_the_same_parser_is_kept():
+    assert sniff_file_type(b'\xff\xd8\xff\xe0\x00\x10JFIF', '.jpeg') == '.jpeg'
+    # both read by the image parser
+    assert sniff_file_type(b'\x89PNG\r\n\x1a\n\x00\x00', '.jpg') == '.jpg'
+
+
+def test_containers_are_only_trusted_with_their_extension():
+    assert sniff_file_type(b'PK\x03\x04\x14\x00', '.xlsx') == '.xlsx'
+    # e.g. .docx or a zip archive
+    assert sniff_file_type(b'PK\x03\x04\x14\x00', '.docx') is None
+    assert sniff_file_type(b'PK\x03\x04\x14\x00', '') is None
+    assert sniff_file_type(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1\x00', '.xls') == '.xls'
+    assert sniff_file_type(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1\x00', '.doc') is None
+
+
+def test_text_keeps_its_extension():
+    assert sniff_file_type(b'name,ssn\njane,123-45-6789\n', '.csv') == '.csv'
+    assert sniff_file_type('café\tnaïve\r\n'.encode('utf-8'), '') == ''
+
+
+def test_binaries_are_skipped():
+    assert sniff_file_type(b'\x7fELF\x02\x01\x01\x00\x00\x00', '') is None
+    assert sniff_file_type(b'\x01\x02\x03\x04\x05\x06\x07', '.txt') is None
+    # a binary format without its leading bytes isn't read as text
+    assert sniff_file_type(b'plain text', '.pdf') is None
+
+
+def test_empty_files_are_skipped(tmp_path):
+    (tmp_path / 'empty.txt').write_bytes(b'')
+    (tmp_path / 'scan').write_bytes(b'%PDF-1.4\n')
+    assert sniff_file(str(tmp_path / 'empty.txt'), '.txt') is None
+    assert sniff_file(str(tmp_path / 'scan'), '') == '.pdf'
@@ -0,0 +1,79 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import result_cache
+from result_cache import ResultCache, hash_bytes, hash_file
+
+
+def test_results_are_keyed_by_content_and_version(tmp_path):
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        cache.put('hash', 'v1', {'pii': {'regex': {}}})
+        assert cache.get('hash', 'v1') == {'pii': {'regex': {}}}
+        assert cache.get('hash', 'v2') is None
+        assert cache.get('other', 'v1') is None
+
+
+def test_copies_share_a_content_hash(tmp_path):
+    (tmp_path / 'a.txt').write_text('same contents')
+    (tmp_path / 'b.txt').write_text('same contents')
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        content_hash = cache.get_content_hash(tmp_path / 'a.txt')
+        assert cache.get_content_hash(tmp_path / 'b.txt') == content_hash
+        assert content_hash == hash_file(tmp_path / 'a.txt') == hash_bytes(b'same contents')
+
+
+def test_unchanged_file_is_not_hashed_again(tmp_path, monkeypatch):
+    filepath = tmp_path / 'a.txt'
+    filepath.write_text('contents')
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        content_hash = cache.get_content_hash(filepath)
+        hashed = []
+        monkeypatch.setattr(result_cache, 'hash_file', lambda path: hashed.append(path) or 'new')
+        assert cache.get_content_hash(filepath) == content_hash
+        assert hashed == []
+
+        filepath.write_text('changed contents')
+        os.utime(filepath, (0, 0))
+        assert cache.get_content_hash(filepath) == 'new'
+        assert hashed == [str(filepath)]
+
+
+def test_results_survive_reopening(tmp_path):
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        cache.put('hash', 'v1', {'pii': {}})
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        assert cache.get('hash', 'v1') == {'pii': {}}
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    now = [0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(result_cache.time, 'time', tick)
+    result = {'values': 'x' * 1000}
+    size = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    with ResultCache(tmp_path / 'cache.sqlite', max_size_bytes=size * 3.5) as cache:
+        for content_hash in ['a', 'b', 'c']:
+            cache.put(content_hash, 'v1', result)
+        # a is used again, so b is now the least recently used
+        assert cache.get('a', 'v1') == result
+        cache.put('d', 'v1', result)
+
+        assert cache.get('b', 'v1') is None
+        for content_hash in ['a', 'c', 'd']:
+            assert cache.get(content_hash, 'v1') == result
+        assert cache.total_size <= cache.max_size_bytes
+
+
+def test_replacing_a_result_keeps_size_right(tmp_path):
+    with ResultCache(tmp_path / 'cache.sqlite') as cache:
+        cache.put('hash', 'v1', {'values': 'x' * 1000})
+        cache.put('hash', 'v1', {'values': 'x'})
+        stored = cache.conn.execute('SELECT SUM(size) FROM results').fetchone()[0]
+        assert cache.total_size == stored
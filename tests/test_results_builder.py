@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from pii_scores import calculate_overall_pii_score
+from results_builder import (build_results_tables, build_summary_and_findings, build_summary_row,
+                             get_summary_columns, get_typed_summary_df, summary_base_columns)
+
+
+def make_result(pii, size_bytes=100, owner='alice'):
+    return {
+        'pii': pii,
+        'metadata': {'owner': owner, 'group': 'staff', 'size_bytes': size_bytes, 'last_modified': 0},
+    }
+
+
+results = {
+    'a.txt': make_result({'regex': {'EMAIL_ADDRESS': {'count': 2, 'values': ['a@b.co', 'c@d.co']}}}),
+    'b.txt': make_result({'regex': {}}, size_bytes=5, owner='bob'),
+    'c.txt': make_result({
+        'presidio': {'PERSON': {'count': 1, 'values': ['Jane']}},
+        'regex': {'US_SSN': {'count': 1, 'values': ['123-45-6789']}},
+    }),
+    # pii_catcher only reports which pii were found
+    'd.txt': make_result({'pii_catcher': {'PERSON': ['Jane', 'John'], 'GENDER': []}}),
+    # pii no detector lists in detector_pii_names
+    'e.txt': make_result({'presidio': {'UK_NINO': {'count': 3, 'values': ['QQ123456C']}}}),
+}
+
+
+def test_findings_table_has_one_row_per_pii_found():
+    files_df, findings_df = build_results_tables(results)
+    assert files_df['filepath'].tolist() == list(results)
+    assert files_df['owner'].tolist() == ['alice', 'bob', 'alice', 'alice', 'alice']
+    findings = list(zip(
+        findings_df['file_id'], findings_df['detector'], findings_df['pii_type'], findings_df['count']))
+    assert findings == [
+        (0, 'regex', 'EMAIL_ADDRESS', 2),
+        (2, 'presidio', 'PERSON', 1),
+        (2, 'regex', 'US_SSN', 1),
+        (3, 'pii_catcher', 'PERSON', 2),
+        (4, 'presidio', 'UK_NINO', 3),
+    ]
+
+
+def test_vectorized_summary_matches_rows_built_one_at_a_time():
+    df, _ = build_summary_and_findings(results)
+    for file_id, filepath in enumerate(results):
+        row = build_summary_row(filepath, results[filepath])
+        assert df.loc[file_id, 'pii_score'] == pytest.approx(row['pii_score'])
+        assert df.loc[file_id, 'pii_score'] == pytest.approx(calculate_overall_pii_score(results[filepath]))
+        assert df.loc[file_id, 'has_pii'] == row['has_pii']
+        for column in df.columns[len(summary_base_columns):]:
+            assert df.loc[file_id, column] == row.get(column, 0)
+
+
+def test_summary_counts_are_pivoted_findings():
+    df, _ = build_summary_and_findings(results)
+    assert df['r_email_address'].tolist() == [2, 0, 0, 0, 0]
+    assert df['p_person'].tolist() == [0, 0, 1, 0, 0]
+    assert df['pc_person'].tolist() == [0, 0, 0, 2, 0]
+    assert df['has_pii'].tolist() == [True, False, True, True, False]
+    # pii no detector lists get their own column after the known ones
+    assert df.columns[-1] == 'p_uk_nino'
+    assert df['p_uk_nino'].tolist() == [0, 0, 0, 0, 3]
+
+
+def test_summary_of_no_files():
+    df, findings_df = build_summary_and_findings({})
+    assert len(df) == 0
+    assert len(findings_df) == 0
+
+
+def test_typed_summary_has_a_fixed_schema():
+    df, _ = build_summary_and_findings(results)
+    typed_df = get_typed_summary_df(df)
+    assert list(typed_df.columns) == ['file_id'] + get_summary_columns()
+    assert typed_df['file_id'].tolist() == [0, 1, 2, 3, 4]
+    assert str(typed_df['r_us_ssn'].dtype) == 'int32'
+    assert str(typed_df['owner'].dtype) == 'category'
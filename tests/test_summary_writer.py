@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from results_builder import build_summary_df_from_results, get_summary_columns
+from summary_writer import (CsvSummaryWriter, JsonlSummaryWriter, ParquetSummaryWriter, get_findings_path,
+                            merge_findings, merge_summaries, open_summary_writer, read_summary, write_results)
+
+
+def make_result(pii, size_bytes=100):
+    return {
+        'pii': pii,
+        'metadata': {'owner': 'alice', 'group': 'staff', 'size_bytes': size_bytes, 'last_modified': 0},
+    }
+
+
+results = {
+    'a.txt': make_result({'regex': {'EMAIL_ADDRESS': {'count': 2, 'values': ['a@b.co', 'c@d.co']}}}),
+    'b.txt': make_result({'regex': {}}, size_bytes=5),
+    'c.txt': make_result({
+        'presidio': {'PERSON': {'count': 1, 'values': ['Jane']}},
+        'regex': {'US_SSN': {'count': 1, 'values': ['123-45-6789']}},
+    }),
+}
+
+
+def write_all(writer):
+    with writer:
+        for filepath, result in results.items():
+            writer.write_result(filepath, result)
+
+
+def test_csv_rows_match_summary_of_all_results(tmp_path):
+    path = tmp_path / 'results.csv'
+    write_all(CsvSummaryWriter(path))
+
+    expected = build_summary_df_from_results(results).reindex(columns=get_summary_columns()).fillna(0)
+    df = read_summary(path)
+    assert list(df.columns) == get_summary_columns()
+    assert df['filepath'].tolist() == list(results)
+    for column in ['has_pii', 'pii_score', 'size_bytes', 'r_email_address', 'r_us_ssn', 'p_person']:
+        assert df[column].tolist() == expected[column].tolist()
+
+
+def test_jsonl_rows_have_every_column(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_all(JsonlSummaryWriter(path))
+
+    rows = [json.loads(line) for line in open(path)]
+    assert [row['filepath'] for row in rows] == list(results)
+    for row in rows:
+        assert list(row) == get_summary_columns()
+    assert rows[0]['r_email_address'] == 2
+    # counts which weren't found are 0, not missing
+    assert rows[1]['r_email_address'] == 0
+    assert rows[1]['has_pii'] is False
+
+
+def test_rows_are_readable_before_close(tmp_path):
+    path = tmp_path / 'results.csv'
+    with CsvSummaryWriter(path) as writer:
+        writer.write_result('a.txt', results['a.txt'])
+        assert read_summary(path)['filepath'].tolist() == ['a.txt']
+
+
+def test_writer_is_picked_by_extension(tmp_path):
+    for name, writer_class in [('r.csv', CsvSummaryWriter), ('r.jsonl', JsonlSummaryWriter)]:
+        with open_summary_writer(tmp_path / name) as writer:
+            assert type(writer) is writer_class
+    assert type(open_summary_writer(tmp_path / 'r.parquet')) is ParquetSummaryWriter
+
+
+def test_parquet_writes_typed_summary_and_findings(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'results.parquet'
+    # several row groups, file ids keep counting across them
+    write_all(ParquetSummaryWriter(path, row_group_size=2))
+
+    df = read_summary(path)
+    assert df['file_id'].tolist() == [0, 1, 2]
+    assert df['filepath'].tolist() == list(results)
+    assert list(df.columns) == ['file_id'] + get_summary_columns()
+    assert str(df['r_email_address'].dtype) == 'int32'
+    assert str(df['owner'].dtype) == 'category'
+
+    findings_df = pd.read_parquet(get_findings_path(path))
+    findings = sorted(
+        zip(findings_df['file_id'], findings_df['detector'], findings_df['pii_type'], findings_df['count']))
+    assert findings == [
+        (0, 'regex', 'EMAIL_ADDRESS', 2),
+        (2, 'presidio', 'PERSON', 1),
+        (2, 'regex', 'US_SSN', 1),
+    ]
+
+
+def test_parquet_of_empty_scan_has_schema(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'results.parquet'
+    ParquetSummaryWriter(path).close()
+
+    df = read_summary(path)
+    assert len(df) == 0
+    assert list(df.columns) == ['file_id'] + get_summary_columns()
+    assert len(pd.read_parquet(get_findings_path(path))) == 0
+
+
+def test_merge_fills_counts_missing_from_a_shard(tmp_path):
+    write_results({'a.txt': results['a.txt']}, tmp_path / 'results.1-of-2.csv')
+    write_results({'c.txt': results['c.txt']}, tmp_path / 'results.2-of-2.jsonl')
+
+    df = merge_summaries([tmp_path / 'results.1-of-2.csv', tmp_path / 'results.2-of-2.jsonl'])
+    assert df['filepath'].tolist() == ['a.txt', 'c.txt']
+    assert list(df.columns[:len(get_summary_columns())]) == get_summary_columns()
+    assert df['r_email_address'].tolist() == [2, 0]
+    assert df['p_person'].tolist() == [0, 1]
+    assert df['has_pii'].tolist() == [True, True]
+
+
+def test_merge_keeps_the_last_row_of_a_file(tmp_path):
+    write_results({'a.txt': results['a.txt'], 'b.txt': results['b.txt']}, tmp_path / 'first.csv')
+    write_results({'a.txt': results['b.txt']}, tmp_path / 'second.csv')
+
+    df = merge_summaries([tmp_path / 'first.csv', tmp_path / 'second.csv'])
+    assert df['filepath'].tolist() == ['b.txt', 'a.txt']
+    assert df['r_email_address'].tolist() == [0, 0]
+
+
+def test_merge_findings_follow_merged_rows(tmp_path):
+    pytest.importorskip('pyarrow')
+    paths = [tmp_path / 'first.parquet', tmp_path / 'second.parquet']
+    write_results({'a.txt': results['a.txt'], 'c.txt': results['c.txt']}, paths[0])
+    # a.txt was scanned again and has no pii anymore
+    write_results({'b.txt': results['b.txt'], 'a.txt': results['b.txt']}, paths[1])
+
+    df = merge_summaries(paths)
+    findings_df = merge_findings(paths, df)
+    file_ids = dict(zip(df['filepath'], df.index))
+    findings = sorted(zip(findings_df['file_id'], findings_df['detector'], findings_df['pii_type']))
+    assert findings == sorted([
+        (file_ids['c.txt'], 'presidio', 'PERSON'),
+        (file_ids['c.txt'], 'regex', 'US_SSN'),
+    ])
+
+
+def test_merge_findings_warns_about_shards_without_them(tmp_path, capsys):
+    pytest.importorskip('pyarrow')
+    paths = [tmp_path / 'first.parquet', tmp_path / 'second.csv']
+    write_results({'a.txt': results['a.txt']}, paths[0])
+    write_results({'c.txt': results['c.txt']}, paths[1])
+
+    df = merge_summaries(paths)
+    findings_df = merge_findings(paths, df)
+    assert findings_df['file_id'].tolist() == [0]
+    assert str(paths[1]) in capsys.readouterr().out
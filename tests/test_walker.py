@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from walker import is_walked, noise_dirs, walk_files
+
+
+@pytest.fixture
+def folder(tmp_path):
+    files = {
+        'a.txt': b'a',
+        'big.pdf': b'x' * 1000,
+        'hr/contracts/jane.pdf': b'pdf',
+        'hr/notes.txt': b'notes',
+        'hr/old/2019/archive.txt': b'old',
+        '.git/config': b'git',
+        'app/node_modules/lib/readme.txt': b'readme',
+    }
+    for name, data in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return tmp_path
+
+
+def walk(folder, **options):
+    options.setdefault('prune', noise_dirs)
+    return sorted([
+        os.path.relpath(filepath, folder).replace(os.sep, '/')
+        for filepath, _ in walk_files(folder, **options)
+    ])
+
+
+def test_noise_folders_are_pruned(folder):
+    assert walk(folder) == [
+        'a.txt', 'big.pdf', 'hr/contracts/jane.pdf', 'hr/notes.txt', 'hr/old/2019/archive.txt']
+    assert 'app/node_modules/lib/readme.txt' in walk(folder, prune=[])
+
+
+def test_globs_without_a_slash_match_names(folder):
+    assert walk(folder, include=['*.pdf']) == ['big.pdf', 'hr/contracts/jane.pdf']
+    assert walk(folder, exclude=['*.pdf']) == ['a.txt', 'hr/notes.txt', 'hr/old/2019/archive.txt']
+
+
+def test_globs_with_a_slash_match_relative_paths(folder):
+    assert walk(folder, exclude=['hr/old']) == ['a.txt', 'big.pdf', 'hr/contracts/jane.pdf', 'hr/notes.txt']
+    assert walk(folder, include=['hr/*/*.pdf']) == ['hr/contracts/jane.pdf']
+
+
+def test_depth_and_size_bounds(folder):
+    assert walk(folder, max_depth=0) == ['a.txt', 'big.pdf']
+    assert walk(folder, max_depth=1) == ['a.txt', 'big.pdf', 'hr/notes.txt']
+    assert walk(folder, min_size=100) == ['big.pdf']
+    assert walk(folder, max_size=3) == ['a.txt', 'hr/contracts/jane.pdf', 'hr/old/2019/archive.txt']
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink') or os.name == 'nt', reason='needs symlinks')
+def test_symlink_policies(folder):
+    os.symlink(folder / 'a.txt', folder / 'link.txt')
+    os.symlink(folder / 'hr', folder / 'hr_link')
+    # a link back to the folder must not loop
+    os.symlink(folder, folder / 'hr' / 'loop')
+
+    assert 'link.txt' not in walk(folder, symlinks='skip')
+    assert 'link.txt' in walk(folder, symlinks='files')
+    assert 'hr_link/notes.txt' not in walk(folder, symlinks='files')
+    followed = walk(folder, symlinks='follow')
+    # each folder is walked once, through the first path reaching it
+    assert followed.count('hr/notes.txt') + followed.count('hr_link/notes.txt') == 1
+
+
+def test_unknown_symlink_policy_is_an_error(folder):
+    with pytest.raises(ValueError):
+        walk(folder, symlinks='sometimes')
+
+
+def test_is_walked_agrees_with_the_walk(folder):
+    options = {'exclude': ['hr/old'], 'max_size': 500, 'prune': noise_dirs}
+    walked = walk(folder, **options)
+    for relative_path in [
+            'a.txt', 'big.pdf', 'hr/contracts/jane.pdf', 'hr/notes.txt', 'hr/old/2019/archive.txt',
+            '.git/config', 'app/node_modules/lib/readme.txt']:
+        assert is_walked(str(folder / relative_path), str(folder), **options) == (relative_path in walked)
+    assert not is_walked(str(folder.parent / 'elsewhere.txt'), str(folder), **options)